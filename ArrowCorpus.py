@@ -0,0 +1,136 @@
+import pyarrow as pa
+import pyarrow.ipc
+from collections.abc import Sequence
+class ArrowCorpus(Sequence):
+    """
+    List-like corpus that keeps the sentences in an Arrow string array (one utf-8 buffer and an offsets buffer) instead of a list of
+    python strings, to be used as DataLoader.data (see DataLoader(backend="arrow")). A sentence only costs its bytes and a 4 byte offset,
+    slices and shards share the buffers of the corpus they come from, corpora can be memory-mapped from disk and converted to and from
+    HuggingFace datasets without creating python strings.
+    The buffers are never changed, assigning sentences replaces the array of this corpus only, so copies made with copy() are unaffected.
+    Assigning a whole slice (corpus[:] = sentences) builds one new array, assigning a single sentence rebuilds the array and is slow.
+    Every assignment counts as a change in version, like SentenceList, so a DataLoader knows its tokenized corpus is out of date
+    without turning the corpus into python strings to compare it.
+    ...
+    Attributes
+    ----------
+    array: pyarrow.ChunkedArray
+        The sentences
+    version: int
+        Number of assignments made to the corpus
+    ...
+    Methods
+    -------
+    from_list(sentences)
+        Returns a corpus with the sentences of a list
+    from_dataset(dataset, column="text")
+        Returns a corpus with a column of a HuggingFace Dataset, sharing its buffers unless the dataset was selected or shuffled
+    load(path, mmap=True)
+        Loads a corpus saved with save, memory-mapped unless mmap is False
+    save(path)
+        Saves the corpus as an Arrow IPC file
+    to_dataset(column="text")
+        Returns a HuggingFace Dataset with the sentences in a column, sharing the buffers
+    to_list()
+        Returns the sentences as a list of python strings
+    copy()
+        Returns a corpus that shares the buffers but can be assigned to independently
+    shard(num_shards, index)
+        Returns one of num_shards contiguous parts of the corpus without copying
+    get_nbytes()
+        Returns the number of bytes used by the buffers
+
+    Usage
+    -------
+    >>> corpus = ArrowCorpus.from_list(loader.get_data())
+    >>> corpus.save("wmt14_en.arrow")
+    >>> loader = DataLoader(data=ArrowCorpus.load("wmt14_en.arrow"), dataset_name="wmt14_en")
+    """
+    def __init__(self, array):
+        if isinstance(array, pa.Array):
+            array = pa.chunked_array([array], type=array.type)
+        if not (pa.types.is_string(array.type) or pa.types.is_large_string(array.type)):
+            raise Exception("ArrowCorpus needs a string array")
+        self.array = array
+        self.version = 0
+
+    @staticmethod
+    def from_list(sentences):
+        return ArrowCorpus(pa.array(list(sentences), type=pa.string()))
+
+    @staticmethod
+    def from_dataset(dataset, column="text"):
+        #the table of a selected or shuffled dataset still has the old rows, its indices mapping says which rows are in it and in what order
+        if dataset._indices is not None:
+            dataset = dataset.select_columns([column]).flatten_indices(keep_in_memory=True)
+        return ArrowCorpus(dataset.data.table.column(column))
+
+    @staticmethod
+    def load(path, mmap=True):
+        source = pa.memory_map(path, "r") if mmap else pa.OSFile(path, "rb")
+        table = pa.ipc.open_file(source).read_all()
+        return ArrowCorpus(table.column("text"))
+
+    def save(self, path):
+        table = pa.table({"text": self.array})
+        with pa.OSFile(path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+    def to_dataset(self, column="text"):
+        from datasets import Dataset
+        from datasets.table import InMemoryTable
+        return Dataset(InMemoryTable(pa.table({column: self.array})))
+
+    def to_list(self):
+        return self.array.to_pylist()
+
+    def copy(self):
+        return ArrowCorpus(self.array)
+
+    def shard(self, num_shards, index):
+        #contiguous shards, the first len % num_shards shards get one sentence more
+        size, rest = divmod(len(self), num_shards)
+        start = index * size + min(index, rest)
+        return ArrowCorpus(self.array.slice(start, size + (index < rest)))
+
+    def get_nbytes(self):
+        return self.array.nbytes
+
+    def __len__(self):
+        return len(self.array)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            if step == 1:
+                return ArrowCorpus(self.array.slice(start, max(stop - start, 0)))
+            return ArrowCorpus(self.array.take(pa.array(range(start, stop, step), type=pa.int64())))
+        if i < 0:
+            i += len(self)
+        if i < 0 or i >= len(self):
+            raise IndexError("ArrowCorpus index out of range")
+        return self.array[i].as_py()
+
+    def __iter__(self):
+        for chunk in self.array.iterchunks():
+            yield from chunk.to_pylist()
+
+    def __setitem__(self, i, value):
+        self.version += 1
+        if isinstance(i, slice) and i == slice(None):
+            self.array = pa.chunked_array([pa.array(list(value), type=self.array.type)], type=self.array.type)
+            return
+        sentences = self.to_list()
+        sentences[i] = value
+        self.array = pa.chunked_array([pa.array(sentences, type=self.array.type)], type=self.array.type)
+
+    def __eq__(self, other):
+        if isinstance(other, ArrowCorpus):
+            return len(self) == len(other) and self.array.equals(other.array)
+        if isinstance(other, (list, tuple)):
+            return len(self) == len(other) and self.to_list() == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return f"ArrowCorpus({len(self)} sentences, {self.get_nbytes()} bytes)"
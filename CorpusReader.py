@@ -0,0 +1,150 @@
+import os
+import re
+import hashlib
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+class CorpusReader:
+    """
+    Reads and normalizes txt and csv corpora for DataLoader. Files are read in large chunks, every sentence is normalized with
+    precompiled patterns in one pass (see normalize), big files can be normalized by several processes, and the normalized corpus can
+    be saved in a binary cache keyed by the sha256 of the file, its file type and the version of the normalizer, so loading the same file again
+    only has to read the cache.
+    Sentences of txt files have always been formatted twice (once while parsing and once more in DataLoader), which is kept so the
+    loaded data does not change.
+    ...
+    Attributes
+    ----------
+    version: int
+        Version of the normalizer, it is part of the cache key and has to be increased whenever normalize changes its output
+    cache_dir: str
+        Folder of the cache, None to not cache
+    workers: int
+        Number of processes that normalize the chunks of a file
+    chunk_size: int
+        Number of characters (txt) or rows (csv) read at a time
+    ...
+    Methods
+    -------
+    normalize(sentence)
+        Formats a sentence in one pass, same as DataLoader.fix_format
+    normalize_formatted(sentence)
+        Formats a sentence twice, same as DataLoader.fix_format(DataLoader.fix_format(sentence))
+    read_chunks(path)
+        Yields the raw lines of a txt or csv file chunk by chunk
+    read(path)
+        Returns the normalized sentences of a txt or csv file, from the cache if it is there
+    stream(path)
+        Yields the normalized sentences of a txt or csv file chunk by chunk, the same sentences as read without keeping them all
+    get_checksum(path)
+        Returns the sha256 of a file
+    get_cache_path(path)
+        Returns the path of the cache of a file
+
+    Usage
+    -------
+    >>> reader = CorpusReader(cache_dir=".corpus_cache", workers=4)
+    >>> sentences = reader.read("wmt14_en.txt")
+    """
+    version = 1
+    space_before_punctuation = re.compile(r'\s([?.!,"](?:\s|$))')
+    quotes = str.maketrans({"«": '"', "»": '"', "„": '"', "“": '"', "‘": "'", "’": "'", "‹": '"', "›": '"'})
+
+    def __init__(self, cache_dir=None, workers=1, chunk_size=1 << 22):
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self.chunk_size = chunk_size
+
+    @staticmethod
+    def strip_quotes(sentence):
+        #if sentence begins and ends with quotes and there are only two, remove them
+        if len(sentence) == 0:
+            return sentence
+        if sentence[0] == '"' and sentence[-1] == '"' and sentence.count('"') == 2:
+            sentence = sentence[1:-1]
+        elif sentence[0] == "'" and sentence[-1] == "'" and sentence.count("'") == 2:
+            sentence = sentence[1:-1]
+        return sentence
+
+    @staticmethod
+    def normalize(sentence):
+        #remove spacing before punctuation
+        sentence = CorpusReader.space_before_punctuation.sub(r'\1', sentence)
+        #single spaces between words and none at the ends, str.split splits on the same characters as \s
+        sentence = " ".join(sentence.split())
+        #make all quotes (german and french) and guillemets english quotes
+        sentence = sentence.translate(CorpusReader.quotes)
+        return CorpusReader.strip_quotes(sentence)
+
+    @staticmethod
+    def normalize_formatted(sentence):
+        #a second pass can still change a sentence, e.g. '" a "' becomes ' a' and then 'a'
+        return CorpusReader.normalize(CorpusReader.normalize(sentence))
+
+    def read_chunks(self, path):
+        file_type = path.split(".")[-1]
+        if file_type == "txt":
+            #text mode turns \r\n and \r into \n, like iterating over the lines of the file
+            with open(path, "r", encoding="utf-8") as f:
+                rest = ""
+                for block in iter(lambda: f.read(self.chunk_size), ""):
+                    lines = (rest + block).split("\n")
+                    rest = lines.pop()
+                    yield lines
+                if rest != "":
+                    yield [rest]
+        elif file_type == "csv":
+            for df in pd.read_csv(path, header=None, chunksize=self.chunk_size, dtype=str, na_filter=False):
+                yield df[0].tolist()
+        else:
+            raise Exception("Invalid file type, only txt and csv files can be read")
+
+    @staticmethod
+    def get_checksum(path):
+        sha256 = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                sha256.update(block)
+        return sha256.hexdigest()
+
+    def get_cache_path(self, path):
+        #the same bytes are parsed and normalized differently as txt and csv
+        file_type = path.split(".")[-1]
+        return os.path.join(self.cache_dir, f"{self.get_checksum(path)}_{file_type}_v{self.version}.npz")
+
+    def stream(self, path):
+        twice = path.split(".")[-1] == "txt"
+        for lines in self.read_chunks(path):
+            yield _normalize_chunk((lines, twice))
+
+    def read(self, path):
+        cache_path = None
+        if self.cache_dir is not None:
+            cache_path = self.get_cache_path(path)
+            if os.path.exists(cache_path):
+                with np.load(cache_path) as cache:
+                    if int(cache["count"]) == 0:
+                        return []
+                    #formatted sentences never contain a new line
+                    return cache["text"].tobytes().decode("utf-8").split("\n")
+        twice = path.split(".")[-1] == "txt"
+        chunks = self.read_chunks(path)
+        if self.workers > 1:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                sentences = [sentence for chunk in executor.map(_normalize_chunk, ((chunk, twice) for chunk in chunks)) for sentence in chunk]
+        else:
+            sentences = [sentence for chunk in chunks for sentence in _normalize_chunk((chunk, twice))]
+        if cache_path is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            text = np.frombuffer("\n".join(sentences).encode("utf-8"), dtype=np.uint8)
+            #written under a temporary name so readers never see half a cache
+            temporary_path = f"{cache_path}.{os.getpid()}.npz"
+            np.savez(temporary_path, text=text, count=len(sentences))
+            os.replace(temporary_path, cache_path)
+        return sentences
+
+def _normalize_chunk(args):
+    lines, twice = args
+    if twice:
+        return [CorpusReader.normalize_formatted(line) for line in lines]
+    return [CorpusReader.normalize(line) for line in lines]
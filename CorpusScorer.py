@@ -0,0 +1,280 @@
+import re
+import numpy as np
+import pandas as pd
+from functools import lru_cache
+from WordAligner import WordAligner
+class CorpusScorer:
+    """
+    Scores translations against one reference with BLEU, chrF and WER without evaluate. The reference is tokenized and its word and
+    character n-grams are counted once, as sorted tables of integer n-gram ids, and every corpus of translations is scored against these
+    tables with numpy: its n-grams get the ids of the reference (an n-gram id is looked up from the id of its first n-1 words and its last
+    word, n-grams that are not in the reference get -1) and the clipped matches of all sentences and orders are counted at once.
+    One reference sentence per translation is supported, like the rest of the package.
+    The numbers follow the implementations behind evaluate: "bleu" (tokenizer_13a and compute_bleu of tensorflow nmt, max_order=4,
+    smooth=False), "chrf" (sacrebleu CHRF, char_order=6, word_order=0, beta=2, whitespace removed, no eps smoothing) and "wer" (jiwer,
+    words split on spaces, Levenshtein distance over the number of reference words). The n-gram and edit counts are the same integers,
+    so scores only differ by floating point summation order, well below 1e-9 (BLEU and WER on a 0-1 scale, chrF on a 0-100 scale).
+    ...
+    Attributes
+    ----------
+    reference: list
+        The reference sentences
+    max_order: int
+        Largest word n-gram of BLEU
+    char_order: int
+        Largest character n-gram of chrF
+    beta: float
+        Weight of recall in chrF
+    vocabulary: dict
+        Integer id of every word of the reference, the tables of every metric are built on first use
+    characters: np.ndarray
+        Sorted code points of the characters of the reference, the id of a character is its index
+    word_tables: list
+        (n-gram keys, sentence n-gram keys, sentence n-gram counts, n-grams per sentence) of every word n-gram order of the reference
+    char_tables: list
+        The same for every character n-gram order
+    ...
+    Methods
+    -------
+    tokenize(sentence)
+        Splits a sentence with tokenizer_13a, like the evaluate bleu metric
+    tokenize_wer(sentence)
+        Splits a sentence on spaces, like the evaluate wer metric
+    build_word_tables(), build_char_tables(), build_aligner()
+        Count the word n-grams, character n-grams and words of the reference, called on first use
+    get_word_statistics(candidates)
+        Returns the word n-gram counts, matches and lengths of every sentence
+    get_char_statistics(candidates)
+        Returns the character n-gram counts and matches of every sentence
+    get_distances(candidates)
+        Returns the word level Levenshtein distance of every sentence
+    bleu(candidates)
+        Returns the corpus BLEU in the format of the evaluate bleu metric
+    chrf(candidates)
+        Returns the corpus chrF in the format of the evaluate chrf metric
+    wer(candidates)
+        Returns the corpus WER, same as the evaluate wer metric
+    score(candidates)
+        Returns corpus BLEU, chrF and WER and a DataFrame with the sentence level scores
+
+    Usage
+    -------
+    >>> scorer = CorpusScorer(DataLoader(path="wmt14_fr.txt").get_data())
+    >>> for path in paths:
+    >>>     scores = scorer.score(DataLoader(path=path).get_data())
+    >>>     print(scores["bleu"]["bleu"], scores["chrf"]["score"], scores["wer"])
+    """
+    #tokenizer_13a of sacrebleu, as used by the evaluate bleu metric
+    regexes = [(re.compile(r"([\{-\~\[-\` -\&\(-\+\:-\@\/])"), r" \1 "),
+               (re.compile(r"([^0-9])([\.,])"), r"\1 \2 "),
+               (re.compile(r"([\.,])([^0-9])"), r" \1 \2"),
+               (re.compile(r"([0-9])(-)"), r"\1 \2 ")]
+    multiple_spaces = re.compile(r"\s\s+")
+
+    def __init__(self, reference, max_order=4, char_order=6, beta=2):
+        self.reference = list(reference)
+        self.max_order = max_order
+        self.char_order = char_order
+        self.beta = beta
+        #the tables of every metric are built on first use, so a worker that only computes one metric only builds its tables
+        self.vocabulary = None
+        self.reference_lengths = None
+        self.word_tables = None
+        self.characters = None
+        self.char_tables = None
+        self.aligner = None
+        self.wer_lengths = None
+
+    def build_word_tables(self):
+        #word n-grams for BLEU
+        tokens = [self.tokenize(sentence) for sentence in self.reference]
+        self.vocabulary = {}
+        for sentence_tokens in tokens:
+            for token in sentence_tokens:
+                self.vocabulary.setdefault(token, len(self.vocabulary))
+        ids, index = self.get_word_ids(tokens)
+        self.reference_lengths = np.bincount(index, minlength=len(self.reference))
+        self.word_tables = self.build_tables(ids, index, self.max_order, len(self.vocabulary))
+
+    def build_char_tables(self):
+        #character n-grams for chrF
+        codes, index = self.get_characters(self.reference)
+        self.characters = np.unique(codes)
+        self.char_tables = self.build_tables(np.searchsorted(self.characters, codes), index, self.char_order, len(self.characters))
+
+    def build_aligner(self):
+        #words for WER, the aligner caches the reference sentences
+        self.aligner = WordAligner(tokenizer=self.tokenize_wer)
+        self.wer_lengths = np.array([len(self.tokenize_wer(sentence)) for sentence in self.reference], dtype=np.int64)
+
+    @staticmethod
+    @lru_cache(maxsize=1 << 16)
+    def tokenize(sentence):
+        sentence = sentence.replace("<skipped>", "").replace("-\n", "").replace("\n", " ")
+        if "&" in sentence:
+            sentence = sentence.replace("&quot;", '"').replace("&amp;", "&").replace("&lt;", "<").replace("&gt;", ">")
+        sentence = f" {sentence} "
+        for regex, replacement in CorpusScorer.regexes:
+            sentence = regex.sub(replacement, sentence)
+        return tuple(sentence.split())
+
+    @staticmethod
+    def tokenize_wer(sentence):
+        return [word for word in CorpusScorer.multiple_spaces.sub(" ", sentence).strip().split(" ") if word]
+
+    def get_word_ids(self, tokens):
+        #ids of the reference vocabulary, -1 for words that are not in the reference
+        vocabulary = self.vocabulary
+        lengths = np.fromiter((len(sentence_tokens) for sentence_tokens in tokens), dtype=np.int64, count=len(tokens))
+        ids = np.fromiter((vocabulary.get(token, -1) for sentence_tokens in tokens for token in sentence_tokens), dtype=np.int64, count=int(lengths.sum()))
+        return ids, np.repeat(np.arange(len(tokens)), lengths)
+
+    @staticmethod
+    def get_characters(sentences):
+        #code points of every sentence without whitespace, like sacrebleu with whitespace=False
+        stripped = ["".join(sentence.split()) for sentence in sentences]
+        lengths = np.fromiter((len(sentence) for sentence in stripped), dtype=np.int64, count=len(stripped))
+        codes = np.frombuffer("".join(stripped).encode("utf-32-le"), dtype=np.uint32).astype(np.int64)
+        return codes, np.repeat(np.arange(len(sentences)), lengths)
+
+    @staticmethod
+    def get_keys(previous, ids, n, size):
+        #key of every n-gram from the id of its first n-1 tokens and the id of its last token, -1 if either is unknown
+        last = ids[n-1:]
+        if n == 1:
+            return last
+        prefix = previous[:len(last)]
+        return np.where((prefix >= 0) & (last >= 0), prefix * size + last, -1)
+
+    def build_tables(self, ids, index, max_order, size):
+        tables = []
+        n_sentences = len(self.reference)
+        previous = None
+        for n in range(1, max_order + 1):
+            keys = self.get_keys(previous, ids, n, size)
+            #n-grams may not cross the end of a sentence
+            valid = index[n-1:] == index[:len(keys)]
+            ngram_keys = np.unique(keys[valid])
+            current = np.where(valid, np.searchsorted(ngram_keys, keys), -1)
+            sentence_keys, sentence_counts = np.unique(index[:len(keys)][valid] * max(len(ngram_keys), 1) + current[valid], return_counts=True)
+            tables.append((ngram_keys, sentence_keys, sentence_counts, np.bincount(index[:len(keys)][valid], minlength=n_sentences)))
+            previous = current
+        return tables
+
+    def count_matches(self, ids, index, tables, size):
+        #n-grams of the candidates (hypothesis), of the reference and clipped matches of every sentence and order
+        n_sentences = len(self.reference)
+        hypothesis = np.zeros((n_sentences, len(tables)), dtype=np.int64)
+        matches = np.zeros((n_sentences, len(tables)), dtype=np.int64)
+        reference = np.stack([table[3] for table in tables], axis=1)
+        previous = None
+        for n, (ngram_keys, sentence_keys, sentence_counts, _) in enumerate(tables, 1):
+            if len(ids) < n:
+                break
+            keys = self.get_keys(previous, ids, n, size)
+            starts = index[:len(keys)]
+            valid = index[n-1:] == starts
+            hypothesis[:, n-1] = np.bincount(starts[valid], minlength=n_sentences)
+            position = np.minimum(np.searchsorted(ngram_keys, keys), max(len(ngram_keys) - 1, 0))
+            found = valid & (keys >= 0) & (ngram_keys[position] == keys) if len(ngram_keys) > 0 else np.zeros(len(keys), dtype=bool)
+            current = np.where(found, position, -1)
+            if len(sentence_keys) > 0:
+                #an n-gram only matches if it is in the same reference sentence, so it is counted at the position of that (sentence, n-gram) pair
+                candidate_keys = starts[found] * max(len(ngram_keys), 1) + current[found]
+                position = np.minimum(np.searchsorted(sentence_keys, candidate_keys), len(sentence_keys) - 1)
+                pairs = position[sentence_keys[position] == candidate_keys]
+                clipped = np.minimum(np.bincount(pairs, minlength=len(sentence_keys)), sentence_counts)
+                matches[:, n-1] = np.bincount(sentence_keys // max(len(ngram_keys), 1), weights=clipped, minlength=n_sentences).astype(np.int64)
+            previous = current
+        return hypothesis, reference, matches
+
+    def check(self, candidates):
+        candidates = list(candidates)
+        if len(candidates) != len(self.reference):
+            raise Exception(f"There are {len(candidates)} translations and {len(self.reference)} reference sentences")
+        return candidates
+
+    def get_word_statistics(self, candidates):
+        candidates = self.check(candidates)
+        if self.word_tables is None:
+            self.build_word_tables()
+        ids, index = self.get_word_ids([self.tokenize(sentence) for sentence in candidates])
+        hypothesis, _, matches = self.count_matches(ids, index, self.word_tables, len(self.vocabulary))
+        return {"matches": matches, "possible": hypothesis, "translation_lengths": np.bincount(index, minlength=len(candidates)),
+                "reference_lengths": self.reference_lengths}
+
+    def get_char_statistics(self, candidates):
+        candidates = self.check(candidates)
+        if self.char_tables is None:
+            self.build_char_tables()
+        codes, index = self.get_characters(candidates)
+        position = np.minimum(np.searchsorted(self.characters, codes), len(self.characters) - 1)
+        ids = np.where(self.characters[position] == codes, position, -1)
+        hypothesis, reference, matches = self.count_matches(ids, index, self.char_tables, len(self.characters))
+        return {"hypothesis": hypothesis, "reference": reference, "matches": matches}
+
+    def get_distances(self, candidates):
+        candidates = self.check(candidates)
+        if self.aligner is None:
+            self.build_aligner()
+        return np.fromiter((self.aligner.distance(reference_sentence, sentence) for reference_sentence, sentence in zip(self.reference, candidates)),
+                           dtype=np.int64, count=len(candidates))
+
+    def get_bleu(self, matches, possible, translation_length, reference_length, smooth=False):
+        #compute_bleu of every row, a single row gives the corpus score
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if smooth:
+                precisions = (matches + 1.0) / (possible + 1.0)
+            else:
+                precisions = np.where(possible > 0, matches / np.maximum(possible, 1), 0.0)
+            positive = np.all(precisions > 0, axis=-1)
+            geo_mean = np.where(positive, np.exp(np.sum(np.log(np.where(positive[..., None], precisions, 1.0)), axis=-1) / self.max_order), 0.0)
+            ratio = translation_length / reference_length
+            brevity_penalty = np.where(ratio > 1.0, 1.0, np.exp(1 - 1.0 / ratio))
+        return geo_mean * brevity_penalty, precisions, brevity_penalty, ratio
+
+    def get_chrf(self, hypothesis, reference, matches):
+        #sacrebleu CHRF._compute_f_score of every row
+        eps = 1e-16
+        factor = self.beta ** 2
+        precision = np.where(hypothesis > 0, matches / np.maximum(hypothesis, 1), eps)
+        recall = np.where(reference > 0, matches / np.maximum(reference, 1), eps)
+        effective_order = np.sum((hypothesis > 0) & (reference > 0), axis=-1)
+        average_precision = np.where(effective_order > 0, np.sum(precision, axis=-1) / np.maximum(effective_order, 1), 0.0)
+        average_recall = np.where(effective_order > 0, np.sum(recall, axis=-1) / np.maximum(effective_order, 1), 0.0)
+        denominator = factor * average_precision + average_recall
+        return np.where(denominator > 0, 100 * (1 + factor) * average_precision * average_recall / np.where(denominator > 0, denominator, 1), 0.0)
+
+    def bleu(self, candidates, statistics=None):
+        statistics = statistics or self.get_word_statistics(candidates)
+        translation_length = int(statistics["translation_lengths"].sum())
+        reference_length = int(statistics["reference_lengths"].sum())
+        bleu, precisions, brevity_penalty, ratio = self.get_bleu(statistics["matches"].sum(axis=0), statistics["possible"].sum(axis=0),
+                                                                 translation_length, reference_length)
+        return {"bleu": float(bleu), "precisions": [float(precision) for precision in precisions], "brevity_penalty": float(brevity_penalty),
+                "length_ratio": float(ratio), "translation_length": translation_length, "reference_length": reference_length}
+
+    def chrf(self, candidates, statistics=None):
+        statistics = statistics or self.get_char_statistics(candidates)
+        score = self.get_chrf(statistics["hypothesis"].sum(axis=0), statistics["reference"].sum(axis=0), statistics["matches"].sum(axis=0))
+        return {"score": float(score), "char_order": self.char_order, "word_order": 0, "beta": self.beta}
+
+    def wer(self, candidates, distances=None):
+        distances = self.get_distances(candidates) if distances is None else distances
+        return float(distances.sum() / self.wer_lengths.sum())
+
+    def score(self, candidates, smooth=True):
+        """
+        Returns the corpus BLEU, chrF and WER in the formats of evaluate and a DataFrame with the BLEU, chrF and WER of every sentence.
+        Sentence BLEU uses add one smoothing unless smooth is False, since most sentences have no matching 4-grams.
+        """
+        candidates = self.check(candidates)
+        words = self.get_word_statistics(candidates)
+        characters = self.get_char_statistics(candidates)
+        distances = self.get_distances(candidates)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            sentence_bleu = self.get_bleu(words["matches"], words["possible"], words["translation_lengths"], words["reference_lengths"], smooth=smooth)[0]
+            sentence_wer = distances / self.wer_lengths
+        sentences = pd.DataFrame({"bleu": np.nan_to_num(sentence_bleu), "chrf": self.get_chrf(characters["hypothesis"], characters["reference"], characters["matches"]),
+                                  "wer": sentence_wer, "edit_distance": distances})
+        return {"bleu": self.bleu(candidates, words), "chrf": self.chrf(candidates, characters), "wer": self.wer(candidates, distances), "sentences": sentences}
@@ -0,0 +1,105 @@
+import re
+import numpy as np
+import pandas as pd
+from TokenizedCorpus import TokenizedCorpus
+class CorpusStatistics:
+    """
+    Per-sentence statistics of a corpus, built once per DataLoader (see DataLoader.get_statistics) so the totals used for the percentages
+    of injection_swap and the analysis notebooks do not have to scan the corpus again. Counts of the words that can be injected are
+    only filled in if an injector is given, they use the same lookups as DyslexiaInjector.batch_injector.
+    ...
+    Attributes
+    ----------
+    sentences: list
+        The sentences the statistics were built from, a copy that shares the buffers for an ArrowCorpus
+    words: np.ndarray
+        Number of words of every sentence, as counted by DataLoader.get_number_of_words
+    letters: np.ndarray
+        Number of characters of every sentence without punctuation, as counted by DataLoader.get_number_of_letters
+    homophone_eligible: np.ndarray
+        Number of words of every sentence that have homophones, None without injector
+    confusing_word_eligible: np.ndarray
+        Number of words of every sentence that have confusing words, None without injector
+    confusing_letter_eligible: np.ndarray
+        Number of words of every sentence with at least one letter that has confusing letters, None without injector
+    injector: DyslexiaInjector
+        The injector whose dictionaries the eligible counts were built with, None without injector
+    totals: dict
+        The sum of every column
+    ...
+    Methods
+    -------
+    add_eligibility(injector, tokenized=None)
+        Counts the words of every sentence that can be injected with the dictionaries of an injector
+    get_total(column)
+        Returns the sum of a column over the corpus
+    to_frame()
+        Returns the statistics as a DataFrame with one row per sentence
+    select(column, min=None, max=None)
+        Returns the indices of the sentences with min <= column <= max
+    query(expression)
+        Returns the indices of the sentences that match a pandas query, e.g. "words > 30 and homophone_eligible >= 3"
+    matches(sentences)
+        Returns True if the statistics were built from these sentences, this compares every sentence so DataLoader uses its data version instead
+
+    Usage
+    -------
+    >>> statistics = loader.get_statistics(injector=dyslexia_injector)
+    >>> statistics.get_total("words")
+    >>> long_sentences = statistics.query("words > 30")
+    """
+    punctuation = re.compile(r'[^\w\s]')
+    columns = ["words", "letters", "homophone_eligible", "confusing_word_eligible", "confusing_letter_eligible"]
+
+    def __init__(self, sentences, injector=None, tokenized=None):
+        #a copy, so later changes to the data of a DataLoader do not change it
+        self.sentences = TokenizedCorpus.snapshot(sentences)
+        self.words = np.fromiter((len(sentence.split()) for sentence in self.sentences), dtype=np.int64, count=len(self.sentences))
+        self.letters = np.fromiter((len(self.punctuation.sub('', sentence)) for sentence in self.sentences), dtype=np.int64, count=len(self.sentences))
+        self.homophone_eligible = None
+        self.confusing_word_eligible = None
+        self.confusing_letter_eligible = None
+        self.injector = None
+        if injector is not None:
+            self.add_eligibility(injector, tokenized)
+        self.totals = {column: int(getattr(self, column).sum()) for column in self.columns if getattr(self, column) is not None}
+
+    def add_eligibility(self, injector, tokenized=None):
+        if tokenized is None or not tokenized.matches(self.sentences):
+            tokenized = TokenizedCorpus(self.sentences)
+        n_sentences = len(self.sentences)
+        self.injector = injector
+        homophone_mask, confusing_word_mask = injector.get_eligibility(tokenized.vocabulary)
+        self.homophone_eligible = np.bincount(tokenized.sentence_index[homophone_mask[tokenized.key_ids]], minlength=n_sentences)
+        self.confusing_word_eligible = np.bincount(tokenized.sentence_index[confusing_word_mask[tokenized.key_ids]], minlength=n_sentences)
+        #same letters as the letter decisions of batch_injector
+        codes = np.array([ord(letter) for letter in injector.confusing_letters_dict.keys() if len(letter) == 1], dtype=np.uint32)
+        letter_tokens = tokenized.letter_token[np.isin(tokenized.letter_codes, codes)]
+        token_mask = np.bincount(letter_tokens, minlength=len(tokenized.tokens)) > 0
+        self.confusing_letter_eligible = np.bincount(tokenized.sentence_index[token_mask], minlength=n_sentences)
+        self.totals = {column: int(getattr(self, column).sum()) for column in self.columns if getattr(self, column) is not None}
+
+    def get_total(self, column):
+        if column not in self.totals:
+            raise Exception(f"No {column} statistics, the eligible counts need an injector")
+        return self.totals[column]
+
+    def to_frame(self):
+        return pd.DataFrame({column: getattr(self, column) for column in self.columns if getattr(self, column) is not None})
+
+    def select(self, column, min=None, max=None):
+        values = getattr(self, column)
+        if values is None:
+            raise Exception(f"No {column} statistics, the eligible counts need an injector")
+        mask = np.ones(len(values), dtype=bool)
+        if min is not None:
+            mask &= values >= min
+        if max is not None:
+            mask &= values <= max
+        return np.flatnonzero(mask)
+
+    def query(self, expression):
+        return self.to_frame().query(expression).index.to_numpy()
+
+    def matches(self, sentences):
+        return self.sentences == sentences
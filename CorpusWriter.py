@@ -0,0 +1,159 @@
+import io
+import os
+import csv
+import gzip
+import hashlib
+from docx import Document
+from CorpusReader import CorpusReader
+try:
+    import zstandard
+except ImportError:
+    #zstd compression is optional, gzip works without extra packages
+    zstandard = None
+class CorpusWriter:
+    """
+    Writes a corpus to txt, csv and docx in one pass. Every format is serialized once in memory (optionally compressed with gzip or zstd)
+    and written with a single buffered write. If dedup is True, a file whose bytes are identical to a file this writer already wrote
+    is saved as a hard link to that file instead of a new copy, so identical cells of a sweep only take up disk space once.
+    The file that would be linked to is hashed again first, if it was changed since it was written the new file is written as a copy.
+    Existing files are replaced rather than overwritten in place, so writing a file never changes the files it is linked to.
+    DyslexiaInjector uses one writer per sweep folder, so files are only linked within a sweep.
+    ...
+    Attributes
+    ----------
+    formats: list
+        The formats that are written, any of "txt", "csv" and "docx"
+    compression: str
+        None, "gzip" or "zstd", the extension .gz or .zst is added to txt and csv files. docx files are zip files and are not compressed
+    dedup: bool
+        Whether identical files are linked instead of copied
+    buffer_size: int
+        Buffer size used for writing files
+    index: dict
+        The paths of the written files for every sha256 checksum, used to find identical files
+    checksums: dict
+        The sha256 checksum of every written file by path
+    ...
+    Methods
+    -------
+    get_formats(save_format)
+        Returns the formats for a save_format of DyslexiaInjector.saver
+    serialize(sentences, format)
+        Returns the bytes of the sentences in a format, compressed if needed
+    get_path(name, format)
+        Returns the path a format is saved to
+    add(path, checksum)
+        Adds a file that already exists to the index, so later identical files are linked to it
+    deduplicate(path, checksum)
+        Replaces a file written by another writer (e.g. in a sweep worker process) with a link to an identical file in the index, or adds it
+    write(sentences, name)
+        Writes the sentences to name + the extension of every format, returns the sha256 checksum of every written file by path
+
+    Usage
+    -------
+    >>> writer = CorpusWriter(formats=["txt", "csv"], compression="gzip")
+    >>> writer.write(loader.get_data(), "data/wmt14_en")
+    This saves data/wmt14_en.txt.gz and data/wmt14_en.csv.gz
+    """
+    extensions = {"gzip": ".gz", "zstd": ".zst"}
+
+    def __init__(self, formats=("csv", "txt"), compression=None, dedup=True, buffer_size=1 << 20):
+        for format in formats:
+            if format not in ["txt", "csv", "docx"]:
+                raise Exception("Invalid format, please use txt, csv or docx")
+        if compression not in [None, "gzip", "zstd"]:
+            raise Exception("Invalid compression, please use None, gzip or zstd")
+        if compression == "zstd" and zstandard is None:
+            raise Exception("zstd compression needs the zstandard package, please install it or use gzip")
+        self.formats = list(formats)
+        self.compression = compression
+        self.dedup = dedup
+        self.buffer_size = buffer_size
+        self.index = {}
+        self.checksums = {}
+
+    @staticmethod
+    def get_formats(save_format):
+        if save_format == "both":
+            return ["csv", "txt"]
+        if save_format == "all":
+            return ["csv", "txt", "docx"]
+        return save_format.split(",")
+
+    def serialize(self, sentences, format):
+        if format == "txt":
+            data = "".join(f"{sentence}\n" for sentence in sentences).encode("utf-8")
+        elif format == "csv":
+            #same output as DataLoader.save_as_csv
+            buffer = io.StringIO()
+            csv.writer(buffer, lineterminator=os.linesep).writerows([sentence] for sentence in sentences)
+            data = buffer.getvalue().encode("utf-8")
+        else:
+            document = Document()
+            for sentence in sentences:
+                document.add_paragraph(sentence)
+            buffer = io.BytesIO()
+            document.save(buffer)
+            return buffer.getvalue()
+        if self.compression == "gzip":
+            #no timestamp in the header, so the same data always gives the same bytes
+            return gzip.compress(data, mtime=0)
+        if self.compression == "zstd":
+            return zstandard.ZstdCompressor().compress(data)
+        return data
+
+    def get_path(self, name, format):
+        if format == "docx" or self.compression is None:
+            return f"{name}.{format}"
+        return f"{name}.{format}{self.extensions[self.compression]}"
+
+    def add(self, path, checksum):
+        if os.path.exists(path):
+            self.checksums[path] = checksum
+            self.index.setdefault(checksum, []).append(path)
+
+    def get_source(self, checksum):
+        #a written file with the same bytes that is still unchanged, it is read again since anything may have written to it
+        for path in self.index.get(checksum, []):
+            if self.checksums.get(path) == checksum and os.path.exists(path):
+                if CorpusReader.get_checksum(path) == checksum:
+                    return path
+                self.checksums.pop(path)
+        return None
+
+    def link(self, source, path):
+        try:
+            os.link(source, path)
+            return True
+        except OSError:
+            #file systems without hard links get a copy
+            return False
+
+    def deduplicate(self, path, checksum):
+        source = self.get_source(checksum) if self.dedup else None
+        if source is not None and not os.path.samefile(source, path):
+            #the link is made next to the file and moved over it, so the file is never missing
+            if self.link(source, path + ".link"):
+                os.replace(path + ".link", path)
+        self.add(path, checksum)
+
+    def write(self, sentences, name):
+        checksums = {}
+        for format in self.formats:
+            path = self.get_path(name, format)
+            data = self.serialize(sentences, format)
+            checksum = hashlib.sha256(data).hexdigest()
+            if self.checksums.get(path) == checksum and os.path.exists(path):
+                #the file was already written with the same bytes
+                checksums[path] = checksum
+                continue
+            if os.path.exists(path):
+                os.remove(path)
+            self.checksums.pop(path, None)
+            source = self.get_source(checksum) if self.dedup else None
+            if source is None or not self.link(source, path):
+                with open(path, "wb", buffering=self.buffer_size) as f:
+                    f.write(data)
+            self.add(path, checksum)
+            checksums[path] = checksum
+        return checksums
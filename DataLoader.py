@@ -5,8 +5,19 @@ import numpy as np
 import evaluate
 from docx import Document
 import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 import unittest
 from datasets import load_dataset
+from TokenizedCorpus import TokenizedCorpus
+from SentenceList import SentenceList
+from CorpusStatistics import CorpusStatistics
+from WordAligner import WordAligner
+from CorpusScorer import CorpusScorer
+from CorpusReader import CorpusReader
+from ArrowCorpus import ArrowCorpus
+from MetricRegistry import metric_registry
+from SentenceEmbedder import SentenceEmbedder
 class DataLoader:
     """
     Loader for benchmarking datasets to ensure universal formatting. To be used in conjunction with DyslexiaInjector.
@@ -16,9 +27,21 @@ class DataLoader:
     path: str
         Path to csv, txt or docx file of the data. In the case of CSV there should only be 1 column
     data: list
-        A list of striings
+        A SentenceList of striings, or an ArrowCorpus if backend is "arrow", both count the changes made to them
     dataset_name: str
         Name of the dataset that is used when saving the data
+    fix_formatting: bool
+        If False the sentences in data are used as is, to be used when the data is already formatted
+    tokenized: TokenizedCorpus
+        Tokenized version of the data, see get_tokenized
+    statistics: CorpusStatistics
+        Per-sentence word, letter and eligible word counts of the data, see get_statistics
+    cache_dir: str
+        Folder where txt and csv files are cached after formatting, None to not cache (see CorpusReader)
+    workers: int
+        Number of processes that format the chunks of a txt or csv file
+    backend: str
+        "list" keeps the data as a list of strings, "arrow" as an ArrowCorpus which needs much less memory and shares its buffers with copies
     ...
     Methods
     -------
@@ -26,6 +49,8 @@ class DataLoader:
         Parses a txt file and returns a list of strings
     fix_format(sentence)
         Fixes the formatting of a sentence
+    stream(path, chunk_size=10000)
+        Reads a txt or csv file lazily and yields lists of at most chunk_size formatted sentences
     save_as_txt(path)
         Saves the data as a txt file
     save_as_csv(path)
@@ -36,6 +61,16 @@ class DataLoader:
         Returns the data
     create_deepcopy()
         Returns a deepcopy of the DataLoader instance
+    get_state()
+        Returns the data and its version, the version goes up with every change so the caches below never compare the sentences
+    is_current(state)
+        Returns True if the data is the same object and has the same version as when state was returned by get_state
+    get_tokenized()
+        Returns the TokenizedCorpus of the data, it is only built again when the data changed
+    get_statistics(injector=None)
+        Returns the CorpusStatistics of the data, with the eligible word counts of the injector if one is given. It is only built again when the data changed
+    get_subset(indices)
+        Returns a DataLoader with the sentences at the given indices, e.g. the result of get_statistics().query("words > 30")
     get_name()
         Returns the dataset name
     get_number_of_sentences()
@@ -44,27 +79,43 @@ class DataLoader:
         Returns the number of words in the data
     get_number_of_letters()
         Returns the number of letters in the data
-    edit_distance(reference_sentence, sentence)
+    edit_distance(reference_sentence, sentence, engine="bit")
         Returns the number of edits required to transform reference_sentence into sentence at word level
         edits include insertions, deletions and substitutions
         based on levenshtein distance
         also returns a dictionary of substitutions, insertions and deletions
-    get_edit_distance(reference, manual_wer=False)
+    word_distance(reference_sentence, sentence, max_distance=None)
+        Returns only the word level levenshtein distance, with an early exit once it is larger than max_distance
+    get_edit_distance(reference, manual_wer=False, engine="bit", workers=1, chunk_size=500)
         Returns the number of edits required to transform data into reference at word level, substitutions, insertions and deletions the associated dictionaries
         and the WER (withouth alignment) if manual_wer is set to True
-    get_individual_edit_distance(reference)
+    get_individual_edit_distance(reference, engine="bit", workers=1, chunk_size=500)
         Returns the number of edits required to transform data into reference at word level for each individual sentence
+    iter_edit_distance(reference, engine="bit", workers=1, chunk_size=500)
+        Yields the edit distance of every sentence in order while the chunks are computed in parallel
     combine_nested_dict(dict1, dict2)
         Combines two nested dictionaries
     combine_dicts(dict1, dict2)
         Combines two dictionaries
-    get_bleue_score(reference)
-        Returns bleu score of the data against a reference
-    get_wer(reference)
+    get_scorer(reference)
+        Returns the CorpusScorer of a reference, it is built once and shared by all DataLoaders scored against the same reference
+    get_bleue_score(reference, engine="evaluate")
+        Returns bleu score of the data against a reference, engine "native" scores with CorpusScorer instead of evaluate
+    get_chrf_score(reference, engine="evaluate")
+        Returns the chrF score of the data against a reference
+    get_wer(reference, engine="evaluate")
         Returns the Word Error Rate (WER) of the data against a reference. With word alignment
-    get_bert_score(reference)
+    get_sentence_scores(reference, compute, metric="score", model="", sources=None, baseline=None, baseline_scores=None, baseline_sources=None, cache=None)
+        Returns the score of every sentence with a sentence level metric, only scoring sentences that are not cached or differ from a baseline
+    get_bert_score(reference, cache=None, baseline=None, baseline_scores=None)
         Returns the BERTScore similarity score of the data against a reference
-    get_LaBSE(reference, model=None, tokenizer=None)
+    get_bert_hashcode(lang)
+        Returns the hashcode of BERTScore for a language, it identifies the model the scores are cached for
+    get_bleurt_score(reference, cache=None, baseline=None, baseline_scores=None)
+        Returns the BLEURT score of every sentence of the data against a reference
+    get_comet_score(reference, sources, cache=None, baseline=None, baseline_scores=None, baseline_sources=None)
+        Returns the COMET score of every sentence of the data against a reference and the translated sources
+    get_LaBSE(reference, model=None, tokenizer=None, batch_size=64, max_tokens=None, device=None, prefetch=True, threads=None, cache=None, baseline=None, baseline_scores=None)
         Returns the LaBSE similarity score of the data against a reference which is a l2 norm between the reference and target sentences score.
         Score of 1 means the sentences are identical, closer to 0 means they are less similar semantically.
     ...
@@ -83,33 +134,47 @@ class DataLoader:
     >>> loader2 = DataLoader(path="wmt14_enfr.txt", dataset_name="wmt14_enfr")
     """
     # Constructor
-    def __init__(self, path=None, data=None, dataset_name=""):
+    def __init__(self, path=None, data=None, dataset_name="", fix_formatting=True, cache_dir=None, workers=1, backend="list"):
         self.dataset_name = dataset_name
+        #tokenized version of the data, built on first use by get_tokenized, and the data and version it was built from
+        self.tokenized = None
+        self.tokenized_state = None
+        #per-sentence counts of the data, built on first use by get_statistics, and the data and version they were built from
+        self.statistics = None
+        self.statistics_state = None
         if data is None and path is not None:
             #check path to see if file is txt or csv
             file_type = path.split(".")[-1]
-            if file_type == "txt":
-                self.data = self.parse_txt(path)
-                self.data = [self.fix_format(sentence) for sentence in self.data]
-            elif file_type == "csv":
-                self.data = pd.read_csv(path, header=None)
-                self.data = self.data[0].tolist()
-                #fix any formatting issues
-                self.data = [self.fix_format(sentence) for sentence in self.data]
+            if file_type == "txt" or file_type == "csv":
+                #read in large chunks and formatted in one pass, or loaded from the cache if the file was read before
+                self.data = SentenceList(CorpusReader(cache_dir=cache_dir, workers=workers).read(path))
             elif file_type == "docx":
                 doc = Document(path)
-                self.data = [self.fix_format(paragraph.text) for paragraph in doc.paragraphs]
+                self.data = SentenceList(self.fix_format(paragraph.text) for paragraph in doc.paragraphs)
             else:
                 raise Exception("Invalid file type")
         elif data is not None:
             #check if data is a list or a df
-            if isinstance(data, list):
-                #format each sentence in data
-                self.data = [self.fix_format(sentence) for sentence in data]
+            if isinstance(data, ArrowCorpus):
+                if fix_formatting:
+                    self.data = ArrowCorpus.from_list([self.fix_format(sentence) for sentence in data])
+                else:
+                    #the buffers are shared, nothing is copied
+                    self.data = data.copy()
+            elif isinstance(data, list):
+                #format each sentence in data, unless it is already formatted
+                if fix_formatting:
+                    self.data = SentenceList(self.fix_format(sentence) for sentence in data)
+                else:
+                    self.data = SentenceList(data)
             else:
                 raise Exception("Invalid data type, please pass in a list of sentences")
         else:
             raise Exception("Please pass in a path or data")
+        if backend == "arrow" and not isinstance(self.data, ArrowCorpus):
+            self.data = ArrowCorpus.from_list(self.data)
+        elif backend != "arrow" and backend != "list":
+            raise Exception("Invalid backend, please use list or arrow")
 
     def parse_txt(self, path):
         output = []
@@ -118,25 +183,32 @@ class DataLoader:
                 output.append(self.fix_format(line))
         return output
                 
-    def fix_format(self, sentence):
-        #remove spacing before punctuation
-        sentence = re.sub(r'\s([?.!,"](?:\s|$))', r'\1', sentence)
-        #replace any double spaces with single space
-        sentence = re.sub(r'\s+', ' ', sentence)
-        #remove any leading or trailing spaces
-        sentence = sentence.strip()
-        #make all quotes (german and french) english double quotes
-        sentence = re.sub(r'«|»|„|“', '"', sentence)
-        #make all single quotes english single quotes
-        sentence = re.sub(r'‘|’', "'", sentence)
-        #make all french guillemets english double quotes
-        sentence = re.sub(r'‹|›', '"', sentence)
-        #if sentence begins and ends with quotes and there are only two, remove them
-        if sentence[0] == '"' and sentence[-1] == '"' and sentence.count('"') == 2:
-            sentence = sentence[1:-1]
-        elif sentence[0] == "'" and sentence[-1] == "'" and sentence.count("'") == 2:
-            sentence = sentence[1:-1]
-        return sentence
+    @staticmethod
+    def stream(path, chunk_size=10000):
+        """
+        Reads a txt or csv file lazily and yields lists of at most chunk_size formatted sentences, so files that do not fit in memory can be processed.
+        The sentences are read and formatted by CorpusReader like DataLoader(path=path), so they are the same as the data of the loader
+        """
+        file_type = path.split(".")[-1]
+        if file_type != "txt" and file_type != "csv":
+            raise Exception("Invalid file type, only txt and csv files can be streamed")
+        #txt files are read in blocks of characters and csv files in blocks of rows, see CorpusReader.read_chunks
+        reader = CorpusReader(chunk_size=chunk_size) if file_type == "csv" else CorpusReader()
+        chunk = []
+        for sentences in reader.stream(path):
+            chunk.extend(sentences)
+            full = len(chunk) - len(chunk) % chunk_size
+            for i in range(0, full, chunk_size):
+                yield chunk[i:i+chunk_size]
+            chunk = chunk[full:]
+        if len(chunk) > 0:
+            yield chunk
+
+    @staticmethod
+    def fix_format(sentence):
+        #removes spacing before punctuation, double and leading or trailing spaces, makes all quotes english quotes
+        #and removes the quotes around the sentence, see CorpusReader.normalize
+        return CorpusReader.normalize(sentence)
 
     def save_as_txt(self, path):
         with open(path, "w", encoding="utf-8") as f:
@@ -146,7 +218,7 @@ class DataLoader:
         return
     
     def save_as_csv(self, path):
-        df = pd.DataFrame(self.data)
+        df = pd.DataFrame(list(self.data))
         df.to_csv(path, index=False, header=False, encoding='utf-8')
         print(f"Saved {self.dataset_name} to {path}")
         return
@@ -163,7 +235,45 @@ class DataLoader:
         return self.data
 
     def create_deepcopy(self):
-        return DataLoader(data=copy.deepcopy(self.data), dataset_name=self.dataset_name)
+        #the data is already formatted and strings are immutable, so a copy of the list is enough
+        loader = DataLoader(data=self.data, dataset_name=self.dataset_name, fix_formatting=False)
+        #the copy has the same data so it can share the tokenized corpus until it is changed
+        if self.is_current(self.tokenized_state):
+            loader.tokenized, loader.tokenized_state = self.tokenized, loader.get_state()
+        if self.is_current(self.statistics_state):
+            loader.statistics, loader.statistics_state = self.statistics, loader.get_state()
+        return loader
+
+    def get_state(self):
+        #lists assigned to data directly are wrapped, so changes made to them in place are counted from then on
+        if not isinstance(self.data, (SentenceList, ArrowCorpus)):
+            self.data = SentenceList(self.data)
+        return self.data, self.data.version
+
+    def is_current(self, state):
+        #the data object is kept in the state, so its id cannot be reused by new data
+        return state is not None and state[0] is self.data and state[1] == self.get_state()[1]
+
+    def get_tokenized(self):
+        if self.tokenized is None or not self.is_current(self.tokenized_state):
+            self.tokenized = TokenizedCorpus(self.data)
+            self.tokenized_state = self.get_state()
+        return self.tokenized
+
+    def get_statistics(self, injector=None):
+        if self.statistics is None or not self.is_current(self.statistics_state):
+            #the eligible counts reuse the tokenized corpus, the word and letter counts do not need it
+            self.statistics = CorpusStatistics(self.data)
+            self.statistics_state = self.get_state()
+        if injector is not None and self.statistics.injector is not injector:
+            self.statistics.add_eligibility(injector, self.get_tokenized())
+        return self.statistics
+
+    def get_subset(self, indices):
+        data = [self.data[int(i)] for i in indices]
+        if isinstance(self.data, ArrowCorpus):
+            data = ArrowCorpus.from_list(data)
+        return DataLoader(data=data, dataset_name=self.dataset_name, fix_formatting=False)
         
     def get_name(self):
         return self.dataset_name
@@ -172,19 +282,25 @@ class DataLoader:
         return len(self.data)
     
     def get_number_of_words(self):
-        return sum([len(sentence.split()) for sentence in self.data])
+        return self.get_statistics().get_total("words")
     
     def get_number_of_letters(self):
-        #need to ensure we only count letters and not punctuation
-        return sum([len(re.sub(r'[^\w\s]','',sentence)) for sentence in self.data])
+        #need to ensure we only count letters and not punctuation, see CorpusStatistics
+        return self.get_statistics().get_total("letters")
 
-    def edit_distance(reference_sentence, sentence):
+    @staticmethod
+    def edit_distance(reference_sentence, sentence, engine="bit"):
         """
         Returns the number of edits required to transform reference_sentence into sentence at word level
         edits include insertions, deletions and substitutions
         based on levenshtein distance
         also returns a dictionary of substitutions, insertions and deletions
+        engine "bit" uses the bit-parallel WordAligner, "matrix" fills the whole distance matrix in python. Both give the same results
         """
+        if engine == "bit":
+            return _aligner.align(reference_sentence, sentence)
+        elif engine != "matrix":
+            raise Exception("Invalid engine, please use bit or matrix")
         substitutions = 0
         insertions = 0
         deletions = 0
@@ -257,51 +373,72 @@ class DataLoader:
             j -= 1
         distance = substitutions+insertions+deletions
         return substitutions, insertions, deletions, substitution_dict, insertion_dict, deletion_dict, distance
-        
-    def get_edit_distance(self, reference, manual_wer=False):
+
+    @staticmethod
+    def word_distance(reference_sentence, sentence, max_distance=None):
+        """
+        Returns the word level levenshtein distance between reference_sentence and sentence without the alignment.
+        If max_distance is given, max_distance + 1 is returned as soon as the distance is certain to be larger than max_distance
+        """
+        return _aligner.distance(reference_sentence, sentence, max_distance=max_distance)
+
+    def get_reference_chunks(self, reference, chunk_size=500):
+        #splits the sentence pairs into chunks that are sent to the workers
+        if type(reference) == DataLoader:
+            reference = reference.get_data()
+        elif not isinstance(reference, list):
+            raise Exception("Invalid reference type, please pass in a list or DataLoader instance")
+        #pairs are made by position, extra sentences on either side would be dropped without a word
+        if len(reference) != len(self.data):
+            raise ValueError(f"There are {len(self.data)} sentences and {len(reference)} reference sentences")
+        return reference, [(reference[i:i+chunk_size], self.data[i:i+chunk_size]) for i in range(0, len(self.data), chunk_size)]
+
+    def get_edit_distance(self, reference, manual_wer=False, engine="bit", workers=1, chunk_size=500):
         """
         Returns the number of edits required to transform data into reference at word level, substitutions, insertions and deletions the associated dictionaries
         and the WER (withouth alignment) if manual_wer is set to True
+        The sentences are aligned in chunks of chunk_size, every chunk is summed into counters and the counters of all chunks are merged
+        pairwise at the end. If workers > 1 the chunks are aligned in that many processes
         """
-        if type(reference) == list:
-            substitutions = 0
-            insertions = 0
-            deletions = 0
-            all_sub = {}
-            all_ins = {}
-            all_del = {}
-            distance = 0
-            for i in range(len(self.data)):
-                sub, ins, dele, substitution_dict, insertion_dict, deletion_dict, dist = DataLoader.edit_distance(reference[i], self.data[i], )
-                all_sub = self.combine_nested_dict(all_sub, substitution_dict)
-                all_ins = self.combine_dicts(all_ins, insertion_dict)
-                all_del = self.combine_dicts(all_del, deletion_dict)
-                substitutions += sub
-                insertions += ins
-                deletions += dele
-                distance += dist
-            if manual_wer:
-                return substitutions, insertions, deletions, all_sub, all_ins, all_del, distance, distance/(sum([len(sentence.split()) for sentence in reference]))
-            return substitutions, insertions, deletions, all_sub, all_ins, all_del, distance
-        elif type(reference) == DataLoader:
-            return self.get_edit_distance(reference.get_data(), manual_wer=manual_wer)
+        reference, chunks = self.get_reference_chunks(reference, chunk_size)
+        tasks = [(references, sentences, engine) for references, sentences in chunks]
+        if workers > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                partials = list(executor.map(_edit_distance_counts, tasks))
         else:
-            raise Exception("Invalid reference type, please pass in a list or DataLoader instance")
+            partials = [_edit_distance_counts(task) for task in tasks]
+        counts, substitution_counter, insertion_counter, deletion_counter = _merge_edit_distance_counts(partials)
+        substitutions, insertions, deletions, distance = (int(count) for count in counts)
+        #back to the nested dict of substitutions
+        all_sub = {}
+        for (reference_word, word), count in substitution_counter.items():
+            all_sub.setdefault(reference_word, {})[word] = count
+        all_ins = dict(insertion_counter)
+        all_del = dict(deletion_counter)
+        if manual_wer:
+            return substitutions, insertions, deletions, all_sub, all_ins, all_del, distance, distance/(sum([len(sentence.split()) for sentence in reference]))
+        return substitutions, insertions, deletions, all_sub, all_ins, all_del, distance
 
-    def get_individual_edit_distance(self, reference):
+    def get_individual_edit_distance(self, reference, engine="bit", workers=1, chunk_size=500):
         """
         Returns the number of edits required to transform data into reference at word level for each individual sentence
         """
-        if type(reference) == list:
-            output = []
-            for i in range(len(self.data)):
-                sub, ins, dele, substitution_dict, insertion_dict, deletion_dict, distance = DataLoader.edit_distance(reference[i], self.data[i], )
-                output.append((sub, ins, dele, substitution_dict, insertion_dict, deletion_dict, distance))
-            return output
-        elif type(reference) == DataLoader:
-            return self.get_individual_edit_distance(reference.get_data())
+        return list(self.iter_edit_distance(reference, engine=engine, workers=workers, chunk_size=chunk_size))
+
+    def iter_edit_distance(self, reference, engine="bit", workers=1, chunk_size=500):
+        """
+        Yields the edit distance of every sentence (see edit_distance) in the order of the data. If workers > 1 the chunks are aligned
+        in that many processes and the results of a chunk are yielded as soon as it and all chunks before it are done
+        """
+        _, chunks = self.get_reference_chunks(reference, chunk_size)
+        tasks = [(references, sentences, engine) for references, sentences in chunks]
+        if workers > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                for results in executor.map(_edit_distance_chunk, tasks):
+                    yield from results
         else:
-            raise Exception("Invalid reference type, please pass in a list or DataLoader instance")       
+            for task in tasks:
+                yield from _edit_distance_chunk(task)
 
     def combine_nested_dict(self, dict1, dict2):
         for key in dict2:
@@ -323,22 +460,59 @@ class DataLoader:
                 dict1[key] += dict2[key]
         return dict1
 
-    def get_bleue_score(self, reference):
-        #returns bleu score of the data against a reference
-        bleu = evaluate.load("bleu")
-        if type(reference) == list:
+    @staticmethod
+    def get_scorer(reference):
+        if type(reference) == DataLoader:
+            reference = reference.get_data()
+        elif not isinstance(reference, list):
+            raise Exception("Invalid reference type, please pass in a list or DataLoader instance")
+        #list comparison checks identity first, so this is fast when the same reference is used again
+        for scorer in _scorers:
+            if scorer.reference == reference:
+                return scorer
+        scorer = CorpusScorer(reference)
+        if len(_scorers) >= 4:
+            _scorers.pop(0)
+        _scorers.append(scorer)
+        return scorer
+
+    def get_bleue_score(self, reference, engine="evaluate"):
+        #returns bleu score of the data against a reference, the metric is loaded once for all DataLoaders (see MetricRegistry)
+        if engine == "native":
+            return self.get_scorer(reference).bleu(self.data)
+        elif engine != "evaluate":
+            raise Exception("Invalid engine, please use evaluate or native")
+        bleu = metric_registry.get("bleu")
+        if isinstance(reference, list):
             return bleu.compute(predictions=self.data, references=reference)
         elif type(reference) == DataLoader:
             return bleu.compute(predictions=self.data, references=reference.get_data())
         else:
             raise Exception("Invalid reference type, please pass in a list or DataLoader instance")
 
-    def get_wer(self, reference):
+    def get_chrf_score(self, reference, engine="evaluate"):
+        if engine == "native":
+            return self.get_scorer(reference).chrf(self.data)
+        elif engine != "evaluate":
+            raise Exception("Invalid engine, please use evaluate or native")
+        chrf = metric_registry.get("chrf")
+        if isinstance(reference, list):
+            return chrf.compute(predictions=self.data, references=[[sentence] for sentence in reference])
+        elif type(reference) == DataLoader:
+            return chrf.compute(predictions=self.data, references=[[sentence] for sentence in reference.get_data()])
+        else:
+            raise Exception("Invalid reference type, please pass in a list or DataLoader instance")
+
+    def get_wer(self, reference, engine="evaluate"):
         """
         Returns the Word Error Rate (WER) of the data against a reference. With word alignment
         """
-        wer = evaluate.load("wer")
-        if type(reference) == list:
+        if engine == "native":
+            return self.get_scorer(reference).wer(self.data)
+        elif engine != "evaluate":
+            raise Exception("Invalid engine, please use evaluate or native")
+        wer = metric_registry.get("wer")
+        if isinstance(reference, list):
             return wer.compute(predictions=self.data, references=reference)
         elif type(reference) == DataLoader:
             return wer.compute(predictions=self.data, references=reference.get_data())
@@ -346,39 +520,172 @@ class DataLoader:
             raise Exception("Invalid reference type, please pass in a list or DataLoader instance")
 
 
-    def get_bert_score(self, reference):
+    def get_sentence_scores(self, reference, compute, metric="score", model="", sources=None, baseline=None, baseline_scores=None,
+                            baseline_sources=None, cache=None):
         """
-        Returns the BERTScore similarity score of the data against a reference.
+        Returns a list with the score of every sentence of the data against a reference, computed with compute(candidates, references)
+        or compute(candidates, references, sources) if sources are given. This is the entry point for sentence level metrics like BLEURT and COMET.
+        If baseline (the translations of the baseline file) and baseline_scores are given, only the sentences whose translation or source
+        differs from the baseline are scored and the baseline scores are reused for the rest. With sources and a baseline the sources of
+        the baseline have to be given as baseline_sources as well.
+        If a ScoreCache is given the scores are looked up in it by metric and model and only the missing ones are computed.
         """
-        bert = evaluate.load("bertscore")
-        if type(reference) == list:
-            return bert.compute(predictions=self.data, references=reference, lang="fr")
-        elif type(reference) == DataLoader:
-            return bert.compute(predictions=self.data, references=reference.get_data(), lang="fr")
+        if type(reference) == DataLoader:
+            reference = reference.get_data()
+        elif not isinstance(reference, list):
+            raise Exception("Invalid reference type, please pass in a list or DataLoader instance")
+        if baseline_sources is not None and sources is None:
+            raise ValueError("baseline_sources were given without sources, please pass in the sources of the data as well")
+        if baseline is not None and sources is not None and baseline_sources is None:
+            raise ValueError("sources were given with a baseline but without baseline_sources, please pass in the sources of the baseline as well")
+        if type(baseline) == DataLoader:
+            baseline = baseline.get_data()
+        if baseline is None:
+            changed = list(range(len(self.data)))
+        else:
+            if baseline_scores is None or len(baseline) != len(self.data) or len(baseline_scores) != len(self.data):
+                raise Exception("baseline and baseline_scores should have a score for every sentence of the data")
+            changed = [i for i in range(len(self.data)) if self.data[i] != baseline[i] or
+                       (baseline_sources is not None and sources[i] != baseline_sources[i])]
+        scores = list(baseline_scores) if baseline is not None else [None] * len(self.data)
+        if len(changed) == 0:
+            return scores
+        candidates = [self.data[i] for i in changed]
+        references = [reference[i] for i in changed]
+        changed_sources = [sources[i] for i in changed] if sources is not None else None
+        if cache is not None:
+            computed = cache.score(metric, model, candidates, references, compute, sources=changed_sources)
+        elif sources is not None:
+            computed = compute(candidates, references, changed_sources)
         else:
+            computed = compute(candidates, references)
+        for i, score in zip(changed, computed):
+            scores[i] = score
+        return scores
+
+    def get_bert_score(self, reference, cache=None, baseline=None, baseline_scores=None):
+        """
+        Returns the BERTScore similarity score of the data against a reference, the precision, recall and f1 of every sentence and the
+        hashcode like bert.compute, plus their corpus means as mean_precision, mean_recall and mean_f1.
+        If a ScoreCache or a baseline with its scores (the result of get_bert_score of the baseline) are given, only the sentences that
+        are not cached or differ from the baseline are scored (see get_sentence_scores). The scores are cached under the hashcode.
+        """
+        bert = metric_registry.get("bertscore")
+        if type(reference) == DataLoader:
+            reference = reference.get_data()
+        elif not isinstance(reference, list):
             raise Exception("Invalid reference type, please pass in a list or DataLoader instance")
+        if cache is not None or baseline is not None:
+            hashcode = self.get_bert_hashcode("fr")
+            def compute(predictions, references):
+                scores = bert.compute(predictions=predictions, references=references, lang="fr")
+                return [{"precision": p, "recall": r, "f1": f} for p, r, f in zip(scores["precision"], scores["recall"], scores["f1"])]
+            if baseline_scores is not None:
+                baseline_scores = [{"precision": p, "recall": r, "f1": f} for p, r, f in
+                                   zip(baseline_scores["precision"], baseline_scores["recall"], baseline_scores["f1"])]
+            scores = self.get_sentence_scores(reference, compute, metric="bertscore", model=hashcode, baseline=baseline,
+                                              baseline_scores=baseline_scores, cache=cache)
+            scores = {key: [score[key] for score in scores] for key in ["precision", "recall", "f1"]}
+            scores["hashcode"] = hashcode
+        else:
+            scores = bert.compute(predictions=self.data, references=reference, lang="fr")
+        for key in ["precision", "recall", "f1"]:
+            scores[f"mean_{key}"] = float(np.mean(scores[key])) if len(scores[key]) > 0 else 0.0
+        return scores
+
+    @staticmethod
+    def get_bert_hashcode(lang):
+        #the hashcode bert.compute returns for a language with the default settings, it names the model and its settings
+        from bert_score.utils import get_hash, lang2model, model2layers
+        model_type = lang2model[lang.lower()]
+        return get_hash(model=model_type, num_layers=model2layers[model_type], idf=False, rescale_with_baseline=False,
+                        use_custom_baseline=False, use_fast_tokenizer=False)
 
-    def get_LaBSE(self, reference, model=None, tokenizer=None):
+    def get_bleurt_score(self, reference, cache=None, baseline=None, baseline_scores=None):
+        """
+        Returns the BLEURT score of every sentence of the data against a reference as {"scores": [...]}.
+        Only the sentences that are not cached or differ from the baseline are scored, see get_sentence_scores.
+        """
+        bleurt = metric_registry.get("bleurt")
+        def compute(predictions, references):
+            return bleurt.compute(predictions=predictions, references=references)["scores"]
+        return {"scores": self.get_sentence_scores(reference, compute, metric="bleurt", model=bleurt.config_name, baseline=baseline,
+                                                   baseline_scores=baseline_scores, cache=cache)}
+
+    def get_comet_score(self, reference, sources, cache=None, baseline=None, baseline_scores=None, baseline_sources=None):
+        """
+        Returns the COMET score of every sentence of the data against a reference and the sources that were translated,
+        as {"mean_score": ..., "scores": [...]}. Only the sentences that are not cached or whose translation or source differs from
+        the baseline are scored, a baseline needs its baseline_sources, see get_sentence_scores.
+        """
+        comet = metric_registry.get("comet")
+        if type(sources) == DataLoader:
+            sources = sources.get_data()
+        if type(baseline_sources) == DataLoader:
+            baseline_sources = baseline_sources.get_data()
+        def compute(predictions, references, sources):
+            return comet.compute(predictions=predictions, references=references, sources=sources)["scores"]
+        scores = self.get_sentence_scores(reference, compute, metric="comet", model=comet.config_name, sources=sources, baseline=baseline,
+                                          baseline_scores=baseline_scores, baseline_sources=baseline_sources, cache=cache)
+        return {"mean_score": float(np.mean(scores)) if len(scores) > 0 else 0.0, "scores": scores}
+
+    def get_LaBSE(self, reference, model=None, tokenizer=None, batch_size=64, max_tokens=None, device=None, prefetch=True, threads=None, cache=None,
+                  baseline=None, baseline_scores=None):
         """
         Returns the LaBSE similarity score of the data against a reference which is a l2 norm between the reference and target sentences score.
         Score of 1 means the sentences are identical, closer to 0 means they are less similar semantically.
+        The model and tokenizer are loaded once for all DataLoaders (see MetricRegistry) unless they are passed in.
+        The sentences are embedded in length sorted batches of at most batch_size sentences and max_tokens padded tokens (see SentenceEmbedder),
+        on the device of the model unless device is given. The shared model is put on cuda once when it is loaded if cuda is available.
+        Returns a numpy array with the score of every sentence.
+        If a ScoreCache or a baseline with its scores are given, only the sentences that are not cached or differ from the baseline are embedded.
         """
-        if model is None:
-            model = BertModel.from_pretrained("setu4993/LaBSE")
-        if tokenizer is None:
-            tokenizer = BertTokenizerFast.from_pretrained("setu4993/LaBSE")
-        if type(reference) == list:
-            pass
-        elif type(reference) == DataLoader:
-            reference = reference.get_data()
-        else:
-            raise Exception("Invalid reference type, please pass in a list or DataLoader instance")
-        target = self.data
-        reference_inputs = tokenizer(reference, return_tensors="pt", padding=True).to("cuda")
-        target_inputs = tokenizer(target, return_tensors="pt", padding=True).to("cuda")
-        with torch.no_grad():
-            reference_outputs = model(**reference_inputs)
-            target_outputs = model(**target_inputs)
-        reference_embeddings = reference_outputs.pooler_output
-        target_embeddings = target_outputs.pooler_output
-        return self.similarity(reference_embeddings, target_embeddings)
\ No newline at end of file
+        if model is None or tokenizer is None:
+            labse_model, labse_tokenizer = metric_registry.get("labse")
+            model = labse_model if model is None else model
+            tokenizer = labse_tokenizer if tokenizer is None else tokenizer
+        embedder = SentenceEmbedder(model, tokenizer, batch_size=batch_size, max_tokens=max_tokens, device=device, prefetch=prefetch, threads=threads)
+        def compute(targets, references):
+            return embedder.similarity(embedder.embed(references), embedder.embed(targets)).tolist()
+        return np.array(self.get_sentence_scores(reference, compute, metric="labse", model=getattr(model, "name_or_path", "setu4993/LaBSE"),
+                                                 baseline=baseline, baseline_scores=baseline_scores, cache=cache))
+
+#shared by all DataLoaders, so the cached references (at most WordAligner.cache_size of them) are reused across services and injection levels
+_aligner = WordAligner()
+#scorers of the last references used with engine="native", see get_scorer
+_scorers = []
+
+def _edit_distance_chunk(args):
+    references, sentences, engine = args
+    return [DataLoader.edit_distance(reference_sentence, sentence, engine=engine) for reference_sentence, sentence in zip(references, sentences)]
+
+def _edit_distance_counts(args):
+    #sums the edit distances of a chunk into counters, substitutions are counted by (reference word, word)
+    counts = np.zeros(4, dtype=np.int64)
+    substitution_counter = Counter()
+    insertion_counter = Counter()
+    deletion_counter = Counter()
+    for sub, ins, dele, substitution_dict, insertion_dict, deletion_dict, distance in _edit_distance_chunk(args):
+        counts += (sub, ins, dele, distance)
+        for reference_word, words in substitution_dict.items():
+            for word, count in words.items():
+                substitution_counter[(reference_word, word)] += count
+        insertion_counter.update(insertion_dict)
+        deletion_counter.update(deletion_dict)
+    return counts, substitution_counter, insertion_counter, deletion_counter
+
+def _merge_edit_distance_counts(partials):
+    #merges neighbouring chunks pairwise until one is left, so the counters keep the order in which words first appear
+    if len(partials) == 0:
+        return np.zeros(4, dtype=np.int64), Counter(), Counter(), Counter()
+    while len(partials) > 1:
+        merged = []
+        for i in range(0, len(partials) - 1, 2):
+            left, right = partials[i], partials[i+1]
+            for counter, other in zip(left[1:], right[1:]):
+                counter.update(other)
+            merged.append((left[0] + right[0], *left[1:]))
+        if len(partials) % 2 == 1:
+            merged.append(partials[-1])
+        partials = merged
+    return partials[0]
@@ -6,7 +6,19 @@ import evaluate
 from docx import Document
 import os
 import unittest
+import random
+import pickle
 from datasets import load_dataset
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from DataLoader import DataLoader
+from TokenizedCorpus import TokenizedCorpus
+from Lexicon import Lexicon
+from SweepLog import SweepLog
+from CorpusReader import CorpusReader
+from InjectorProfiler import InjectorProfiler
+from CorpusWriter import CorpusWriter
+from EditLog import EditLog
 class DyslexiaInjector:
     """
     This class is used to inject dyslexia into a dataset. It can be used to inject homophones and confusing letters.
@@ -19,20 +31,59 @@ class DyslexiaInjector:
         A dictionary that contains the homophones
     confusing_letters_dict : dict
         A dictionary that contains the confusing letters
+    confusing_words_dict : dict
+        A dictionary that contains the confusing words
+    lexicon : Lexicon
+        The compiled lexicon if lexicon_path was given, homophones_dict and confusing_words_dict are then read-only views on it
+    profiler : InjectorProfiler
+        The profiler recording the injection stages, None unless profiling is enabled
+    writers : dict
+        The CorpusWriter used by saver for every format, compression and folder, they remember the files they wrote to link identical files.
+        They are made again for every injection_swap
+    cache_size : int
+        Maximum number of injected words kept in the cache of batch_injector, the least recently used words are dropped first
     Methods
     -------
     load_homophones(path)
         Loads the homophones from a pickle file
     load_confusing_letters(path)
         Loads the confusing letters from a pickle file
-    injection_swap(p_start=0, p_end=1, step_size=0.1, save_path="", save_format="both")
+    injection_swap(p_start=0, p_end=1, step_size=0.1, save_path="", save_format="both", individual=False, workers=1, coupled=False, compression=None, log_edits=False)
         Injects dyslexia into the dataset by swapping words and letters.
+    get_sweep_cells(p_start=0, p_end=1, step_size=0.1, individual=False)
+        Returns the probability triples of a sweep
+    cell_rng(p_homophone, p_letter, p_confusing_word)
+        Returns the random generator of a single sweep cell
+    get_coupled_variates()
+        Returns the random numbers shared by all cells of a coupled sweep
+    gather_save_results(p_homophone, p_letter, p_confusing_word, save_path, save_format="both", coupled=False, compression=None, log_edits=False)
+        Runs, saves and returns the results of a single sweep cell
+    get_writer(save_format="both", compression=None, save_path="")
+        Returns the CorpusWriter for a format, compression and folder
+    saver(temp_load, save_path, p_homophone, p_letter, p_confusing_word, format="both", compression=None, edit_log=None)
+        Saves injected data in one or more formats, and the EditLog if one is given, and returns the checksums of the saved files
+    stream_injection(path, out_path, p_homophone, p_letter, p_confusing_word, chunk_size=10000, rng=None)
+        Injects dyslexia into a txt or csv file chunk by chunk without loading the whole file
     get_homophones(word)
         Returns the homophones of a word
     get_confusing_letters(letter)
         Returns the confusing letters of a letter
+    get_eligibility(words)
+        Returns masks of the words that have homophones and confusing words
     injector(sentence, p_homophone, p_letter)
         Injects dyslexia into a sentence with a given probability
+    word_injector(in_word, p_homophone, p_letter, p_confusing_word)
+        Injects dyslexia into a single word with a given probability
+    draw_variates(corpus, rng=None)
+        Draws all random numbers batch_injector needs for a TokenizedCorpus
+    batch_injector(sentences, p_homophone, p_letter, p_confusing_word, rng=None, variates=None, cache=None, edit_log=None)
+        Injects dyslexia into a whole list of sentences at once using bulk NumPy random draws
+    multi_level_injector(sentences, levels, rng=None)
+        Injects dyslexia at several probability levels with shared random numbers, giving nested injections
+    enable_profiling(profiler=None)
+        Starts recording time and calls of every injection stage, returns the InjectorProfiler
+    disable_profiling()
+        Stops recording, returns the InjectorProfiler with the recorded data
     Usage
     -------
     >>> from datasets import load_dataset
@@ -47,16 +98,53 @@ class DyslexiaInjector:
     >>> dyslexia_injector.injection_swap(p_start=0.1, p_end=0.5, step_size=0.1, save_path="data/wmt14_enfr", save_format="both")
     This creates multiple files with different levels of dyslexia injected into the dataset. The files are saved in the data folder.
     """
+    #maximum number of injected words kept in the cache of a coupled sweep or of multi_level_injector
+    cache_size = 200000
+
     def __init__(self, load: DataLoader, 
                 homophone_path = "dict/homophones_dict.pickle",
                 confusing_letters_path = "dict/confusing_letters_dict.pickle",
                 confusing_words_path="dict/pedler_dict.pickle",
-                seed = 42):
+                seed = 42, lexicon_path=None):
         self.load = load
-        self.homophones_dict = self.load_dict(homophone_path)
-        self.confusing_letters_dict = self.load_dict(confusing_letters_path)
-        self.confusing_words_dict = self.load_dict(confusing_words_path)
+        self.homophone_path = homophone_path
+        self.confusing_letters_path = confusing_letters_path
+        self.confusing_words_path = confusing_words_path
+        self.lexicon_path = lexicon_path
+        if lexicon_path is None:
+            self.lexicon = None
+            self.homophones_dict = self.load_dict(homophone_path)
+            self.confusing_letters_dict = self.load_dict(confusing_letters_path)
+            self.confusing_words_dict = self.load_dict(confusing_words_path)
+        else:
+            #memory-mapped compiled lexicon, the word dicts are read-only views on it
+            self.lexicon = Lexicon(lexicon_path)
+            self.homophones_dict = self.lexicon.get_dict("homophones")
+            #a couple of letters, a plain dict is faster
+            self.confusing_letters_dict = dict(self.lexicon.get_dict("confusing_letters"))
+            self.confusing_words_dict = self.lexicon.get_dict("confusing_words")
+        self.seed = seed
         random.seed(seed)
+        #numpy generator used by the batch engine
+        self.rng = np.random.default_rng(seed)
+        #random numbers shared by the cells of a coupled sweep, see get_coupled_variates
+        self.coupled_variates = None
+        #opt-in stage timings, see enable_profiling
+        self.profiler = None
+        #writers used by saver, see get_writer
+        self.writers = {}
+
+    def enable_profiling(self, profiler=None):
+        if self.profiler is not None:
+            return self.profiler
+        if profiler is None:
+            profiler = InjectorProfiler()
+        return profiler.attach(self)
+
+    def disable_profiling(self):
+        if self.profiler is None:
+            raise Exception("Profiling is not enabled")
+        return self.profiler.detach()
 
     def load_dict(self, path):
         with open(path, "rb") as f:
@@ -65,11 +153,16 @@ class DyslexiaInjector:
             f.close()
         return out   
 
-    def injection_swap(self, p_start=0, p_end=1, step_size=0.1, save_path="", save_format="both"):
+    def injection_swap(self, p_start=0, p_end=1, step_size=0.1, save_path="", save_format="both", individual=False, workers=1, coupled=False, compression=None,
+                       log_edits=False):
         """
         Injects dyslexia into the dataset by swapping words and letters. It is to note, that probability p does not result in p% of the words being modified.
         For example, if p = 0.5, it does not mean that 50% of the words will be modified. It means that each word has a 50% chance of being modified. But, not all words
         have homophones, confusing letters or consufing words. Therefore, the actual percentage of words that are modified is lower than p. The same applies to letters.
+        Every cell of the sweep gets its own random generator derived from the seed and its probabilities (see cell_rng), so the saved files
+        and swap_results.csv are the same no matter the order the cells run in or the number of workers.
+        Finished cells are logged in save_path (see SweepLog), running the same sweep again only runs the cells that are missing or whose
+        files changed. The results are saved as swap_results.csv and swap_results.parquet.
         Parameters
         ----------
         p_start : float
@@ -81,29 +174,85 @@ class DyslexiaInjector:
         save_path : str
             The path where the data needs to be saved
         save_format : str
-            The format in which the data needs to be saved. Can be "both", "csv" or "txt"
+            The format in which the data needs to be saved. Can be "both", "all", "csv", "txt", "docx" or a comma separated list like "txt,docx"
+        individual : bool
+            If True only one type of injection is done at a time (plus the baseline with no injection), otherwise the full grid is swept
+        workers : int
+            Number of worker processes the cells are farmed out to, 1 runs the sweep in this process
+        coupled : bool
+            If True all cells share one set of random numbers (common random numbers, see multi_level_injector), so a word that is swapped
+            at a lower probability is swapped the same way at every higher probability. This makes the cells easier to compare, every cell
+            still runs its own batch_injector pass over the corpus, so the sweep does not run faster
+        compression : str
+            None, "gzip" or "zstd" to compress the saved txt and csv files, see CorpusWriter
+        log_edits : bool
+            If True every edit of a cell is recorded and saved next to its data as a parquet file ending in .edits.parquet, see EditLog
         """
-        df_swap_results = pd.DataFrame(columns=["dataset","p_homophone", "p_letter", "p_confusing_word", "homophones_injected",
-                                        "letters_swapped", "confusing_words_injected", "words_modified", "sentences_changed"])
-        #for loop that increases the p_homophone with step_size
-        for i in np.arange(p_start, p_end+step_size, step_size):
-            #round i to 3 decimals
-            i = round(i, 3)
-            for j in np.arange(p_start, p_end+step_size, step_size):
-                #round j to 3 decimals
-                j = round(j, 3)
-                for k in np.arange(p_start, p_end+step_size, step_size):
-                    k = round(k, 3)
-                    #create deep copy of the data
-                    temp_load, results = self.injection_runner(self.load.create_deepcopy(), i, j, k)
-                    df_swap_results.loc[len(df_swap_results)] = {"dataset":"wmt14_en", "p_homophone":i, "p_letter":j, "p_confusing_word":k,
-                                                                "homophones_injected":results[0],"letters_swapped":results[1], 
-                                                                "confusing_words_injected": results[2], "words_modified":results[3], 
-                                                                "sentences_changed":results[4]}
-            return df_swap_results
-        #efficiency wise this should be changed to lists and then combined at the end into a df
-        df_swap_results = pd.DataFrame(columns=["filename","dataset","p_homophone", "p_letter", "p_confusing_word", "homophones_injected",
+        cells = self.get_sweep_cells(p_start, p_end, step_size, individual)
+        #every finished cell is logged, cells that are already in the log with unchanged files are not run again
+        log = SweepLog(save_path, {"dataset": self.load.get_name(), "seed": self.seed, "p_start": p_start, "p_end": p_end,
+                                   "step_size": step_size, "save_format": save_format, "individual": individual, "coupled": coupled,
+                                   "compression": compression, "log_edits": log_edits, "lexicon_path": self.lexicon_path,
+                                   "data_sha256": hashlib.sha256("\n".join(self.load.get_data()).encode("utf-8")).hexdigest()})
+        completed = log.get_completed()
+        #a new writer for every sweep, it only knows the files of this sweep
+        self.writers = {}
+        #files of finished cells can be linked to by the cells that are still to run
+        writer = self.get_writer(save_format, compression, save_path)
+        for record in completed.values():
+            for path, checksum in record["files"].items():
+                writer.add(path, checksum)
+        todo = [cell for cell in cells if SweepLog.cell_key(*cell) not in completed]
+        if len(todo) < len(cells):
+            print(f"Resuming sweep, {len(cells)-len(todo)} of {len(cells)} cells are already done")
+        if workers > 1 and len(todo) > 0:
+            #every worker builds its own injector once, only the probabilities are sent with each task
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_sweep_worker,
+                                     initargs=(self.load.get_data(), self.load.get_name(), self.homophone_path,
+                                               self.confusing_letters_path, self.confusing_words_path, self.seed, self.lexicon_path)) as executor:
+                futures = [executor.submit(_run_sweep_cell, (*cell, save_path, save_format, coupled, compression, log_edits)) for cell in todo]
+                for future in as_completed(futures):
+                    row = future.result()
+                    #every worker has its own writer, so files that are identical to the files of other workers are linked here
+                    for path, checksum in row["files"].items():
+                        writer.deduplicate(path, checksum)
+                    log.append(row)
+                    completed[SweepLog.cell_key(row["p_homophone"], row["p_letter"], row["p_confusing_word"])] = row
+        else:
+            for cell in todo:
+                row = self.gather_save_results(*cell, save_path, save_format, coupled=coupled, compression=compression, log_edits=log_edits)
+                log.append(row)
+                completed[SweepLog.cell_key(*cell)] = row
+        #the shared random numbers and the cache of injected words are only kept for one sweep
+        self.coupled_variates = None
+        rows = [completed[SweepLog.cell_key(*cell)] for cell in cells]
+        df_swap_results = pd.DataFrame(rows, columns=["dataset","p_homophone", "p_letter", "p_confusing_word", "homophones_injected",
                                         "letters_swapped", "confusing_words_injected", "words_modified", "sentences_changed"])
+        #add number of sentences to the dataframe
+        df_swap_results["sentences"] = self.load.get_number_of_sentences()
+        #add number of words to the dataframe
+        df_swap_results["words"] = self.load.get_number_of_words()
+        #add number of characters to the dataframe
+        df_swap_results["letters"] = self.load.get_number_of_letters()
+        #percentage of sentences changed
+        df_swap_results["percentage_sentences_changed"] = df_swap_results["sentences_changed"] / df_swap_results["sentences"] * 100
+        #percentage of words modified
+        df_swap_results["percentage_words_modified"] = df_swap_results["words_modified"] / df_swap_results["words"] * 100
+        #percentaged of words swapped
+        df_swap_results["percentage_words_swapped_for_homophones"] = df_swap_results["homophones_injected"] / df_swap_results["words"] * 100
+        df_swap_results["percentage_words_swapped_for_confusing_words"] = df_swap_results["confusing_words_injected"] / df_swap_results["words"] * 100
+        #percentage of letters swapped
+        df_swap_results["percentage_letters_swapped"] = df_swap_results["letters_swapped"] / df_swap_results["letters"] * 100 
+        #save the results, the parquet file is faster to load in the analysis notebooks
+        df_swap_results.to_csv(f"{save_path}/swap_results.csv", index=False)
+        df_swap_results.to_parquet(f"{save_path}/swap_results.parquet", index=False)
+        return df_swap_results
+
+    def get_sweep_cells(self, p_start=0, p_end=1, step_size=0.1, individual=False):
+        """
+        Returns the (p_homophone, p_letter, p_confusing_word) triples of a sweep in the order injection_swap runs them
+        """
+        cells = []
         if individual:
             for i in range(3):
                 p_homophone = 0
@@ -117,9 +266,8 @@ class DyslexiaInjector:
                         p_letter = k
                     elif i == 2:
                         p_confusing_word = k
-                    df_swap_results = gather_save_results(self, df_swap_results, p_homophone, p_letter, p_confusing_word, save_path, save_format)
-            df_swap_results = gather_save_results(self, df_swap_results, 0, 0, 0, save_path, save_format)
-            
+                    cells.append((p_homophone, p_letter, p_confusing_word))
+            cells.append((0, 0, 0))
         else:
             #for loop that increases the p_homophone with step_size
             for i in np.arange(p_start, p_end+step_size, step_size):
@@ -129,57 +277,109 @@ class DyslexiaInjector:
                     j = round(j, 3)
                     for k in np.arange(p_start, p_end+step_size, step_size):
                         k = round(k, 3)
-                        #create deep copy of the data
-                        df_swap_results = gather_save_results(self, df_swap_results, i, j, k, save_path, save_format)
-                        
-        #add number of sentences to the dataframe
-        df_swap_results["sentences"] = self.load.get_number_of_sentences()
-        #add number of words to the dataframe
-        df_swap_results["words"] = self.load.get_number_of_words()
-        #add number of characters to the dataframe
-        df_swap_results["letters"] = self.load.get_number_of_letters()
-        #percentage of sentences changed
-        df_swap_results["percentage_sentences_changed"] = df_swap_results["sentences_changed"] / df_swap_results["sentences"] * 100
-        #percentage of words modified
-        df_swap_results["percentage_words_modified"] = df_swap_results["words_modified"] / df_swap_results["words"] * 100
-        #percentaged of words swapped
-        df_swap_results["percentage_words_swapped_for_homophones"] = df_swap_results["homophones_injected"] / df_swap_results["words"] * 100
-        df_swap_results["percentage_words_swapped_for_confusing_words"] = df_swap_results["confusing_words_injected"] / df_swap_results["words"] * 100
-        #percentage of letters swapped
-        df_swap_results["percentage_letters_swapped"] = df_swap_results["letters_swapped"] / df_swap_results["letters"] * 100 
-        #save the results
-        df_swap_results.to_csv(f"{save_path}/swap_results.csv", index=False)
-        return df_swap_results
+                        cells.append((i, j, k))
+        return cells
 
-    def injection_runner(self, data_loader, p_homophone, p_letter, p_confusing_word):
-        #track of the amount of words that were swapped
-        homophones_injected = 0
-        #keep track of the amount of letters that were swapped
-        letters_swapped = 0
-        #keep track of the amount of confusing words that were injected
-        confusing_words_injected = 0
-        #track of the amount of words that were changed
-        words_modified = 0
-        #track of the amount of sentences that were changed
-        sentences_changed = 0
-        for i in range(len(data_loader.data)):
-            #get the sentence
-            sentence = data_loader.data[i]
-            #swap the sentence
-            sentence, results = self.injector(sentence, p_homophone, p_letter, p_confusing_word)
-            # update the amount of words that were swapped
-            homophones_injected += results[0]
-            #update the amount of letters that were swapped
-            letters_swapped += results[1]
-            #updated the amount of confusing words that were injected
-            confusing_words_injected += results[2]
-            #update the amount of words that were changed
-            words_modified += results[3]
-            #update the amount of sentences that were changed
-            if results[3] > 0:
-                sentences_changed += 1
-            #update the sentence in the dataframe
-            data_loader.data[i] = sentence
+    def cell_rng(self, p_homophone, p_letter, p_confusing_word):
+        """
+        Returns a numpy Generator for one sweep cell. The stream only depends on the seed and the probabilities of the cell.
+        """
+        return np.random.default_rng([self.seed] + [int(round(p*1e6)) for p in (p_homophone, p_letter, p_confusing_word)])
+
+    def gather_save_results(self, p_homophone, p_letter, p_confusing_word, save_path, save_format="both", coupled=False, compression=None, log_edits=False):
+        """
+        Runs a single cell of the sweep on a copy of the data, saves it and returns the row for swap_results with the checksums of the saved files.
+        If coupled is True the cell uses the random numbers shared by all cells, see get_coupled_variates. If log_edits is True the edits
+        are saved as well, see EditLog.
+        """
+        edit_log = EditLog() if log_edits else None
+        if coupled:
+            variates, cache = self.get_coupled_variates()
+            temp_load, results = self.injection_runner(self.load.create_deepcopy(), p_homophone, p_letter, p_confusing_word,
+                                                       variates=variates, cache=cache, edit_log=edit_log)
+        else:
+            temp_load, results = self.injection_runner(self.load.create_deepcopy(), p_homophone, p_letter, p_confusing_word,
+                                                       rng=self.cell_rng(p_homophone, p_letter, p_confusing_word), edit_log=edit_log)
+        checksums = self.saver(temp_load, save_path, p_homophone, p_letter, p_confusing_word, format=save_format, compression=compression,
+                               edit_log=edit_log)
+        return {"dataset":self.load.get_name(), "p_homophone":p_homophone, "p_letter":p_letter, "p_confusing_word":p_confusing_word,
+                "homophones_injected":results[0],"letters_swapped":results[1],
+                "confusing_words_injected": results[2], "words_modified":results[3],
+                "sentences_changed":results[4], "files":checksums}
+
+    def get_coupled_variates(self):
+        """
+        Returns the random numbers shared by all cells of a coupled sweep and the cache of injected words. They only depend on the seed
+        and the data, so every worker process of a sweep draws the same numbers.
+        """
+        corpus = self.load.get_tokenized()
+        if self.coupled_variates is None or self.coupled_variates[0] is not corpus:
+            self.coupled_variates = (corpus, self.draw_variates(corpus, np.random.default_rng(self.seed)), {})
+        return self.coupled_variates[1], self.coupled_variates[2]
+
+    def injection_runner(self, data_loader, p_homophone, p_letter, p_confusing_word, engine="batch", rng=None, variates=None, cache=None, edit_log=None):
+        """
+        Injects dyslexia into every sentence of data_loader with the given probabilities. The data of data_loader is updated in place.
+        Parameters
+        ----------
+        data_loader : DataLoader
+            The DataLoader object that contains the data that needs to be injected
+        p_homophone : float
+            The probability of swapping a word with a homophone
+        p_letter : float
+            The probability of swapping a letter with a confusing letter
+        p_confusing_word : float
+            The probability of swapping a word with a confusing word
+        engine : str
+            "batch" injects the whole corpus at once with batch_injector, "sentence" calls injector on one sentence at a time
+        rng : numpy.random.Generator
+            Generator used by the batch engine, defaults to the generator seeded in the constructor
+        variates : dict
+            Shared random numbers for the batch engine, see batch_injector
+        cache : dict
+            Cache of injected words that goes with variates, see batch_injector
+        edit_log : EditLog
+            Records every edit if given
+        """
+        if engine == "batch":
+            sentences, results = self.batch_injector(data_loader.get_tokenized(), p_homophone, p_letter, p_confusing_word,
+                                                     rng=rng, variates=variates, cache=cache, edit_log=edit_log)
+            data_loader.data[:] = sentences
+            homophones_injected, letters_swapped, confusing_words_injected, words_modified, sentences_changed = results
+        elif engine == "sentence":
+            #track of the amount of words that were swapped
+            homophones_injected = 0
+            #keep track of the amount of letters that were swapped
+            letters_swapped = 0
+            #keep track of the amount of confusing words that were injected
+            confusing_words_injected = 0
+            #track of the amount of words that were changed
+            words_modified = 0
+            #track of the amount of sentences that were changed
+            sentences_changed = 0
+            #the data is assigned once at the end, which is much cheaper for an ArrowCorpus
+            sentences = list(data_loader.data)
+            for i in range(len(sentences)):
+                #get the sentence
+                sentence = sentences[i]
+                #swap the sentence
+                sentence, results = self.injector(sentence, p_homophone, p_letter, p_confusing_word, edit_log=edit_log, sentence_index=i)
+                # update the amount of words that were swapped
+                homophones_injected += results[0]
+                #update the amount of letters that were swapped
+                letters_swapped += results[1]
+                #updated the amount of confusing words that were injected
+                confusing_words_injected += results[2]
+                #update the amount of words that were changed
+                words_modified += results[3]
+                #update the amount of sentences that were changed
+                if results[3] > 0:
+                    sentences_changed += 1
+                sentences[i] = sentence
+            #update the sentences in the dataframe
+            data_loader.data[:] = sentences
+        else:
+            raise Exception("Invalid engine, please use batch or sentence")
         print(f"p_homophone = {p_homophone}, p_letter = {p_letter}, p_confusing_word = {p_confusing_word}")
         print("Homophones Injected: " + str(homophones_injected))
         print("Letters swapped: " + str(letters_swapped))
@@ -188,6 +388,49 @@ class DyslexiaInjector:
         print("Sentences changed: " + str(sentences_changed))
         return data_loader, (homophones_injected, letters_swapped, confusing_words_injected, words_modified, sentences_changed)
 
+    def stream_injection(self, path, out_path, p_homophone, p_letter, p_confusing_word, chunk_size=10000, rng=None):
+        """
+        Injects dyslexia into a txt or csv file without loading it into memory. The file is read lazily with DataLoader.stream,
+        every chunk of sentences is injected with batch_injector and appended to out_path right away, so memory use only depends on chunk_size.
+        Parameters
+        ----------
+        path : str
+            Path of the txt or csv file that needs to be injected
+        out_path : str
+            Path of the output file, saved as csv if it ends with .csv and as txt otherwise
+        p_homophone : float
+            The probability of swapping a word with a homophone
+        p_letter : float
+            The probability of swapping a letter with a confusing letter
+        p_confusing_word : float
+            The probability of swapping a word with a confusing word
+        chunk_size : int
+            Number of sentences that are read, injected and written at a time
+        rng : numpy.random.Generator
+            Generator for the random draws, defaults to the generator seeded in the constructor
+        Returns (homophones_injected, letters_swapped, confusing_words_injected, words_modified, sentences_changed) and the number of sentences
+        """
+        totals = np.zeros(5, dtype=np.int64)
+        sentences = 0
+        with open(out_path, "w", encoding="utf-8", newline="") as f:
+            for chunk in DataLoader.stream(path, chunk_size=chunk_size):
+                injected, results = self.batch_injector(chunk, p_homophone, p_letter, p_confusing_word, rng=rng)
+                totals += results
+                sentences += len(chunk)
+                if out_path.split(".")[-1] == "csv":
+                    pd.DataFrame(injected).to_csv(f, index=False, header=False)
+                else:
+                    f.write("".join(f"{sentence}\n" for sentence in injected))
+        homophones_injected, letters_swapped, confusing_words_injected, words_modified, sentences_changed = totals.tolist()
+        print(f"p_homophone = {p_homophone}, p_letter = {p_letter}, p_confusing_word = {p_confusing_word}")
+        print(f"Streamed {sentences} sentences from {path} to {out_path}")
+        print("Homophones Injected: " + str(homophones_injected))
+        print("Letters swapped: " + str(letters_swapped))
+        print("Confusing words injected: " + str(confusing_words_injected))
+        print("Words Modified: " + str(words_modified))
+        print("Sentences changed: " + str(sentences_changed))
+        return (homophones_injected, letters_swapped, confusing_words_injected, words_modified, sentences_changed), sentences
+
     def get_homophones(self, word):
         return self.homophones_dict[word]
     
@@ -199,16 +442,35 @@ class DyslexiaInjector:
     
     def get_confusing_letters_dict(self):
         return self.confusing_letters_dict
+
+    def get_eligibility(self, words):
+        #returns masks of the words that have homophones and confusing words
+        if self.lexicon is not None:
+            #a word is only in a lexicon view if it has candidates
+            homophone_mask = np.fromiter((word in self.homophones_dict for word in words), dtype=bool, count=len(words))
+            confusing_word_mask = np.fromiter((word in self.confusing_words_dict for word in words), dtype=bool, count=len(words))
+            return homophone_mask, confusing_word_mask
+        homophone_mask = np.array([len(self.homophones_dict.get(word, ())) > 0 for word in words], dtype=bool)
+        confusing_word_mask = np.array([len(self.confusing_words_dict.get(word, ())) > 0 for word in words], dtype=bool)
+        return homophone_mask, confusing_word_mask
     
-    def saver(self, temp_load: DataLoader, save_path, p_homophone, p_letter, p_confusing_word, format="both"):
-        if format == "csv":
-            temp_load.save_as_csv(save_path + f"{temp_load.get_name()}_p_homophone_{p_homophone}_p_letter_{p_letter}_p_confusing_word_{p_confusing_word}.csv")
-        elif format == "txt":
-            temp_load.save_as_txt(save_path + f"{temp_load.get_name()}_p_homophone_{p_homophone}_p_letter_{p_letter}_p_confusing_word_{p_confusing_word}.txt")
-        else:
-            #save as both
-            temp_load.save_as_csv(save_path + f"{temp_load.get_name()}_p_homophone_{p_homophone}_p_letter_{p_letter}_p_confusing_word_{p_confusing_word}.csv")
-            temp_load.save_as_txt(save_path + f"{temp_load.get_name()}_p_homophone_{p_homophone}_p_letter_{p_letter}_p_confusing_word_{p_confusing_word}.txt")
+    def get_writer(self, save_format="both", compression=None, save_path=""):
+        #files are only linked to files in the same folder
+        key = (tuple(CorpusWriter.get_formats(save_format)), compression, save_path)
+        if key not in self.writers:
+            self.writers[key] = CorpusWriter(formats=key[0], compression=compression)
+        return self.writers[key]
+
+    def saver(self, temp_load: DataLoader, save_path, p_homophone, p_letter, p_confusing_word, format="both", compression=None, edit_log=None):
+        #every format is serialized once and written in one go, returns the sha256 checksums of the saved files by path
+        name = save_path + f"{temp_load.get_name()}_p_homophone_{p_homophone}_p_letter_{p_letter}_p_confusing_word_{p_confusing_word}"
+        checksums = self.get_writer(format, compression, save_path).write(temp_load.get_data(), name)
+        if edit_log is not None:
+            #checksummed like the data, so a resumed sweep notices a missing or changed log
+            edit_log.save(f"{name}.edits.parquet")
+            checksums[f"{name}.edits.parquet"] = CorpusReader.get_checksum(f"{name}.edits.parquet")
+        print(f"Saved {temp_load.get_name()} to {', '.join(checksums)}")
+        return checksums
 
     def get_punctuation(self, word):
         #gets punctuationand symbols from a word
@@ -218,9 +480,9 @@ class DyslexiaInjector:
                 punctuation.append((i,word[i]))
         return punctuation
 
-    def homophone_swapper(self, in_word, out_word, apostrophe=False):
+    def homophone_swapper(self, in_word, out_word, apostrophe=False, choice=random.choice):
         #pick a random homophone from the list of homophones
-        homophone = random.choice(self.homophones_dict[out_word])
+        homophone = choice(self.homophones_dict[out_word])
         #check if difference is apostrophe
         if homophone.replace("'", "") == out_word:
             apostrophe = True
@@ -234,8 +496,8 @@ class DyslexiaInjector:
             homophone = homophone.upper()
         return homophone, apostrophe
 
-    def confusing_word_injector(self, in_word, out_word):
-        confusing_word = random.choice(self.confusing_words_dict[out_word])
+    def confusing_word_injector(self, in_word, out_word, choice=random.choice):
+        confusing_word = choice(self.confusing_words_dict[out_word])
         #check if the first letter is capitalized
         if in_word.strip('".,?!:;()').strip("'")[0].isupper():
             #Capitalize the first letter of the confusing word
@@ -246,18 +508,26 @@ class DyslexiaInjector:
             confusing_word = confusing_word.upper()
         return confusing_word
 
-    def confusing_letter_swapper(self, in_word, out_word, p_letter, letters_swapped, homophone_swapped, confusing_word_swapped, confusing_letter_swapped):
+    def confusing_letter_swapper(self, in_word, out_word, p_letter, letters_swapped, homophone_swapped, confusing_word_swapped, confusing_letter_swapped,
+                                 letter_draws=None, chance_draws=None, choice=random.choice, choice_draws=None, positions=None):
+        #letter_draws, chance_draws and choice_draws hold pre-drawn random numbers for every letter, if they are not given they are drawn here
+        #the index of every swapped letter is appended to positions if it is given
         for i in range(len(out_word)):
+                letter_draw = random.random() if letter_draws is None else letter_draws[i]
                 #check if swap a letter with a confusing letter with probability p_letter
-                if  random.random() <= p_letter:
-                    chance = random.random()
+                if  letter_draw <= p_letter:
+                    chance = random.random() if chance_draws is None else chance_draws[i]
                     #need to skip first letter with 95% probability, based on Peddler findings
                     if i == 0 and chance >= 0.95:
                         continue
                     #check if the word is in the confusing letters dict
                     if out_word[i].lower() in self.confusing_letters_dict.keys():
                         #pick a random letter from the list of confusing letters
-                        confusing_letter = random.choice(self.confusing_letters_dict[out_word[i].lower()])
+                        confusing_letters = self.confusing_letters_dict[out_word[i].lower()]
+                        if choice_draws is None:
+                            confusing_letter = choice(confusing_letters)
+                        else:
+                            confusing_letter = confusing_letters[int(choice_draws[i]*len(confusing_letters))]
                         #check if swapping a letter in a homophone
                         if not homophone_swapped and not confusing_word_swapped:
                             if in_word.strip('".,?!:;()').strip("'")[i].isupper():
@@ -271,6 +541,8 @@ class DyslexiaInjector:
                         confusing_letter_swapped = True
                         #update the amount of letters that were swapped
                         letters_swapped += 1
+                        if positions is not None:
+                            positions.append(i)
                         #lower the probability of swapping a letter with a confusing letter each time a letter is swapped
                         p_letter = 0.1*p_letter
                 if not homophone_swapped and not confusing_word_swapped:
@@ -299,7 +571,90 @@ class DyslexiaInjector:
                     out_word = out_word[:index] + punc + out_word[index:]
         return out_word
     
-    def injector(self, sentence, p_homophone, p_letter, p_confusing_word):
+    def word_injector(self, in_word, p_homophone, p_letter, p_confusing_word, homophone_draw=None, confusing_word_draw=None,
+                      letter_draws=None, chance_draws=None, rng=None, punctuation=None, homophone_choice_draw=None,
+                      confusing_word_choice_draw=None, letter_choice_draws=None, edits=None):
+        """
+        Injects dyslexia into a single word. Random numbers that are not passed in are drawn from the random module,
+        unless rng (a numpy Generator) is given in which case all remaining draws and choices come from rng.
+        The *_choice_draw(s) are uniform numbers in [0, 1) used to pick a homophone, confusing word or confusing letter.
+        The punctuation of the word can be passed in if it is already known (e.g. from a TokenizedCorpus).
+        If edits is a list, an (edit_type, letter positions) tuple is appended for every type of edit made to the word, see EditLog.
+        Returns the new word and (homophones_injected, letters_swapped, confusing_words_injected, words_modified) for the word
+        """
+        def chooser(draw):
+            #pick from the options with the pre-drawn number if there is one
+            if draw is not None:
+                return lambda options: options[int(draw*len(options))]
+            if rng is not None:
+                return lambda options: options[rng.integers(len(options))]
+            return random.choice
+        #check for punctuation at all indexes of the word and save it
+        if punctuation is None:
+            punctuation = self.get_punctuation(in_word)
+        #get the word and remove any punctuation
+        word = in_word.lower().strip('".,?!:;()')
+        word = word.strip("'")
+        homophones_injected = 0
+        letters_swapped = 0
+        confusing_words_injected = 0
+        #flag for homophone swapped and confusing letter swapped
+        homophone_swapped = False
+        confusing_letter_swapped = False
+        confusing_word_swapped = False
+        #flag for apostrophe
+        apostrophe = False
+        #check if the word is in the homophones dict
+        if word in self.homophones_dict.keys():
+            #check if the word has any homophones
+            if len(self.homophones_dict[word]) > 0:
+                if homophone_draw is None:
+                    homophone_draw = random.random() if rng is None else rng.random()
+                #swap the word with a homophone with probability p_homophone
+                if homophone_draw <= p_homophone:
+                    #replace the word with the homophone, flag to see if apostrophe is the difference in homophone
+                    word, apostrophe = self.homophone_swapper(in_word, word, choice=chooser(homophone_choice_draw))
+                    homophones_injected += 1
+                    homophone_swapped = True
+        #check if the word is in the pedler dict
+        if word in self.confusing_words_dict.keys():
+            #check if the word has any confusing words
+            if len(self.confusing_words_dict[word]) > 0:
+                if confusing_word_draw is None:
+                    confusing_word_draw = random.random() if rng is None else rng.random()
+                #swap the word with a confusing word with probability p_confusing_word
+                if confusing_word_draw <= p_confusing_word:
+                    word = self.confusing_word_injector(in_word, word, choice=chooser(confusing_word_choice_draw))
+                    confusing_words_injected += 1
+                    confusing_word_swapped = True
+        #pre-drawn letter draws belong to the original word, a swapped word needs its own
+        if rng is not None and (letter_draws is None or homophone_swapped or confusing_word_swapped):
+            letter_draws, chance_draws, letter_choice_draws = rng.random((3, len(word))).tolist()
+        #use confusing letter swapper to swap letters with probability p_letter
+        positions = [] if edits is not None else None
+        word, letters_swapped, confusing_letter_swapped = self.confusing_letter_swapper(
+            in_word, word, p_letter,
+            letters_swapped, homophone_swapped,
+            confusing_word_swapped, confusing_letter_swapped,
+            letter_draws=letter_draws, chance_draws=chance_draws, choice=chooser(None), choice_draws=letter_choice_draws, positions=positions)
+        #If whole word is upper case and its more than 1 letter then capitalize the whole word
+        if in_word.isupper() and len(in_word) > 1:
+            word = word.upper()
+        #add back the proper punctuation if any
+        word = self.insert_punctuation(in_word, word, punctuation, apostrophe, homophone_swapped, confusing_word_swapped)
+        if confusing_letter_swapped or homophone_swapped or confusing_word_swapped:
+            if edits is not None:
+                if homophone_swapped:
+                    edits.append(("homophone", ()))
+                if confusing_word_swapped:
+                    edits.append(("confusing_word", ()))
+                if confusing_letter_swapped:
+                    edits.append(("confusing_letter", tuple(positions)))
+            return word, (homophones_injected, letters_swapped, confusing_words_injected, 1)
+        return in_word, (homophones_injected, letters_swapped, confusing_words_injected, 0)
+
+    def injector(self, sentence, p_homophone, p_letter, p_confusing_word, edit_log=None, sentence_index=0):
+        #edits are recorded in edit_log under sentence_index if it is given
         #split the sentence into a list of words
         words = sentence.split()
         #keep track of the amount of homophones injected 
@@ -311,55 +666,240 @@ class DyslexiaInjector:
         #keep track of the amount of words that were changed
         words_modified = 0
         for i in range(len(words)):
-            #check for punctuation at all indexes of the word and save it
-            punctuation = self.get_punctuation(words[i])         
-            #get the word and remove any punctuation
-            word = words[i].lower().strip('".,?!:;()')
-            word = word.strip("'")
-            #create a copy of the word to check if it was changed
-            word_copy = words[i]
-            #flag for homophone swapped and confusing letter swapped
-            homophone_swapped = False
-            confusing_letter_swapped = False
-            confusing_word_swapped = False
-            #flag for apostrophe
-            apostrophe = False
-            #check if the word is in the homophones dict
-            if word in self.homophones_dict.keys():
-                #check if the word has any homophones
-                if len(self.homophones_dict[word]) > 0:
-                    #swap the word with a homophone with probability p_homophone
-                    if random.random() <= p_homophone:
-                        #replace the word with the homophone, flag to see if apostrophe is the difference in homophone
-                        word, apostrophe = self.homophone_swapper(words[i], word)
-                        #update the amount of words that were swapped for homophone
-                        homonphones_injected += 1
-                        #update the flag
-                        homophone_swapped = True
-            #check if the word is in the pedler dict
-            if word in self.confusing_words_dict.keys():
-                #check if the word has any confusing words
-                if len(self.confusing_words_dict[word]) > 0:
-                    #swap the word with a homophone with probability p_homophone
-                    if random.random() <= p_confusing_word:
-                        word = self.confusing_word_injector(words[i], word)
-                        #update the amount of words that were swapped for homophone
-                        confusing_words_injected += 1
-                        #update the flag
-                        confusing_word_swapped = True
-            #use confusing letter swapper to swap letters with probability p_letter
-            word, letters_swapped, confusing_letter_swapped = self.confusing_letter_swapper(
-                words[i], word, p_letter,
-                letters_swapped, homophone_swapped,
-                confusing_word_swapped, confusing_letter_swapped)
-            #If whole word is upper case and its more than 1 letter then capitalize the whole word
-            if words[i].isupper() and len(words[i]) > 1:
-                word = word.upper()
-            #replace the orignal word with new word and proper punctuation if any
-            word = self.insert_punctuation(words[i], word, punctuation, apostrophe, homophone_swapped, confusing_word_swapped)
-            if confusing_letter_swapped or homophone_swapped or confusing_word_swapped:
-                words[i] = word
-                words_modified += 1
+            edits = [] if edit_log is not None else None
+            original = words[i]
+            words[i], results = self.word_injector(words[i], p_homophone, p_letter, p_confusing_word, edits=edits)
+            if edits:
+                edit_log.add_word(sentence_index, i, original, words[i], edits)
+            homonphones_injected += results[0]
+            letters_swapped += results[1]
+            confusing_words_injected += results[2]
+            words_modified += results[3]
         #join the list of words back into a sentence
         sentence = " ".join(words)
-        return sentence, (homonphones_injected, letters_swapped, confusing_words_injected, words_modified)
\ No newline at end of file
+        return sentence, (homonphones_injected, letters_swapped, confusing_words_injected, words_modified)
+
+    def draw_variates(self, corpus, rng=None):
+        """
+        Draws every random number batch_injector needs for a TokenizedCorpus: one uniform number per token for the homophone and
+        confusing word decisions and choices, one per letter for the letter decisions, first letter chance and letter choice,
+        and a seed for the letters of words that were swapped for a homophone or confusing word.
+        """
+        if rng is None:
+            rng = self.rng
+        n_tokens = corpus.get_number_of_tokens()
+        n_letters = corpus.letter_offsets[-1]
+        variates = {}
+        variates["homophone"], variates["confusing_word"], variates["homophone_choice"], variates["confusing_word_choice"] = rng.random((4, n_tokens))
+        variates["letter"], variates["chance"], variates["letter_choice"] = rng.random((3, n_letters))
+        variates["seed"] = int(rng.integers(2**63))
+        return variates
+
+    def batch_injector(self, sentences, p_homophone, p_letter, p_confusing_word, rng=None, variates=None, cache=None, edit_log=None):
+        """
+        Injects dyslexia into a list of sentences at once. Instead of drawing a random number per word and per letter in python,
+        one array of random numbers is drawn per probability axis (homophone, confusing word, letter) for the whole corpus and
+        compared against precomputed masks of the words that are in the dictionaries. Letter swaps of plain words are done on the
+        arrays, a swap lowers p_letter for the letters after it so they are found in a few rounds of one lower probability each.
+        Words that are selected for a homophone or confusing word swap, or that need special punctuation handling, still go
+        through word_injector one at a time, so the time of a call grows with p_homophone and p_confusing_word and is about the
+        same as injector when almost every word is swapped. Every other word is left untouched. The same swapping rules as injector are applied.
+        Parameters
+        ----------
+        sentences : list or TokenizedCorpus
+            A list of strings, or the TokenizedCorpus of a DataLoader so the sentences do not need to be tokenized again
+        p_homophone : float
+            The probability of swapping a word with a homophone
+        p_letter : float
+            The probability of swapping a letter with a confusing letter
+        p_confusing_word : float
+            The probability of swapping a word with a confusing word
+        rng : numpy.random.Generator
+            Generator for the random draws, defaults to the generator seeded in the constructor
+        variates : dict
+            Random numbers from draw_variates to use instead of drawing new ones, reusing them gives nested injections across probabilities
+        cache : dict
+            Results of word_injector that can be reused between calls with the same variates, see multi_level_injector.
+            It holds at most cache_size words
+        edit_log : EditLog
+            Records every edit if given, with the index of the sentence and of the word in the sentence
+        Returns the new list of sentences and (homophones_injected, letters_swapped, confusing_words_injected, words_modified, sentences_changed)
+        """
+        corpus = sentences if isinstance(sentences, TokenizedCorpus) else TokenizedCorpus(sentences)
+        if variates is None:
+            if rng is None:
+                rng = self.rng
+            variates = self.draw_variates(corpus, rng)
+            #the random numbers are only used by this call, so swapped words can draw their letters from rng directly
+            token_rng = lambda t: rng
+        else:
+            #shared random numbers need the same letters for a swapped word at every level, so they come from a generator of the token
+            token_rng = lambda t: np.random.default_rng([variates["seed"], t])
+        n_tokens = corpus.get_number_of_tokens()
+        n_letters = corpus.letter_offsets[-1]
+        letter_offsets = corpus.letter_offsets
+        letter_draws = variates["letter"]
+        chance_draws = variates["chance"]
+        homophone_mask, confusing_word_mask = self.get_eligibility(corpus.vocabulary)
+        homophone_mask = homophone_mask[corpus.key_ids]
+        confusing_word_mask = confusing_word_mask[corpus.key_ids]
+        homophone_hits = homophone_mask & (variates["homophone"] <= p_homophone)
+        #a homophone swap changes the word, so confusing word eligibility of those tokens is checked again in word_injector
+        confusing_word_passed = variates["confusing_word"] <= p_confusing_word
+        confusing_word_hits = confusing_word_mask & confusing_word_passed
+        #a token gets a letter swapped only if one of its letters passes the letter draw, is in the confusing letters dict
+        #and is not a first letter that is skipped. The first such letter is always swapped since p_letter is only lowered after a swap
+        letter_hits = np.zeros(n_tokens, dtype=bool)
+        #tokens that only get letters swapped and need no special punctuation handling are swapped right here
+        letter_tokens = np.zeros(n_tokens, dtype=bool)
+        swapped_letters = np.zeros(0, dtype=np.int64)
+        if p_letter > 0 and n_letters > 0:
+            letter_token = corpus.letter_token
+            confusing_codes = np.array([ord(letter) for letter in self.confusing_letters_dict.keys() if len(letter) == 1], dtype=np.uint32)
+            swappable = np.isin(corpus.letter_codes, confusing_codes) & ~(corpus.first_letter & (chance_draws >= 0.95))
+            #every later swap passes a lower probability, so all swapped letters are among the letters that pass p_letter
+            passed_index = np.flatnonzero((letter_draws <= p_letter) & swappable)
+            passed_token = letter_token[passed_index]
+            passed_draws = letter_draws[passed_index]
+            #the first swapped letter of every token that is hit
+            hit_tokens, first_index = np.unique(passed_token, return_index=True)
+            letter_hits[hit_tokens] = True
+            #plain ascii words, optionally followed by one punctuation mark, keep their punctuation and capitalization as is
+            letter_tokens = letter_hits & ~homophone_hits & ~confusing_word_hits & corpus.plain
+            #a skipped first letter also skips its capitalization in confusing_letter_swapper, leave those to word_injector
+            first_skipped = corpus.first_letter & (letter_draws <= p_letter) & (chance_draws >= 0.95)
+            letter_tokens[letter_token[first_skipped]] = False
+            #after every swap p_letter drops to 0.1*p_letter, the next swap is the first letter after the last one that passes it
+            rounds = [passed_index[first_index]]
+            last_swap = np.full(n_tokens, n_letters, dtype=np.int64)
+            last_swap[hit_tokens] = rounds[0]
+            threshold = p_letter
+            while len(rounds[-1]) > 0:
+                threshold *= 0.1
+                later = (passed_draws <= threshold) & (passed_index > last_swap[passed_token])
+                next_tokens, next_index = np.unique(passed_token[later], return_index=True)
+                rounds.append(passed_index[later][next_index])
+                last_swap[:] = n_letters
+                last_swap[next_tokens] = rounds[-1]
+            swapped_letters = np.sort(np.concatenate(rounds))
+            swapped_letters = swapped_letters[letter_tokens[letter_token[swapped_letters]]]
+        tokens = list(corpus.tokens)
+        homophones_injected = 0
+        letters_swapped = 0
+        confusing_words_injected = 0
+        words_modified = 0
+        changed = np.zeros(len(corpus.sentences), dtype=bool)
+        if len(swapped_letters) > 0:
+            #the confusing letter of every swapped letter, picked with its choice draw from a table of the options of every letter
+            options = {ord(letter): [ord(option) for option in letter_options] for letter, letter_options in self.confusing_letters_dict.items() if len(letter) == 1}
+            option_table = np.zeros((int(confusing_codes.max())+1, max(len(letter_options) for letter_options in options.values())), dtype=np.uint32)
+            option_counts = np.zeros(len(option_table), dtype=np.int64)
+            for code, letter_options in options.items():
+                option_table[code, :len(letter_options)] = letter_options
+                option_counts[code] = len(letter_options)
+            codes = corpus.letter_codes[swapped_letters]
+            choices = (variates["letter_choice"][swapped_letters]*option_counts[codes]).astype(np.int64)
+            replacements = option_table[codes, choices].tobytes().decode("utf-32-le")
+            swapped_tokens = letter_token[swapped_letters]
+            positions = swapped_letters - letter_offsets[swapped_tokens]
+            token_starts = np.flatnonzero(np.r_[True, swapped_tokens[1:] != swapped_tokens[:-1]])
+            token_ends = np.r_[token_starts[1:], len(swapped_letters)]
+            for start, end in zip(token_starts.tolist(), token_ends.tolist()):
+                t = swapped_tokens[start]
+                letters = list(tokens[t])
+                for j in range(start, end):
+                    i = positions[j]
+                    letters[i] = replacements[j].upper() if letters[i].isupper() else replacements[j]
+                tokens[t] = "".join(letters)
+                if edit_log is not None:
+                    sentence = corpus.sentence_index[t]
+                    edit_log.add(sentence, t - corpus.sentence_offsets[sentence], "confusing_letter", corpus.tokens[t], tokens[t],
+                                 tuple(positions[start:end].tolist()))
+            letters_swapped += len(swapped_letters)
+            words_modified += len(token_starts)
+            changed[corpus.sentence_index[swapped_tokens]] = True
+        #every other selected token goes through word_injector with its pre-drawn random numbers
+        candidates = np.flatnonzero((homophone_hits | confusing_word_hits | letter_hits) & ~letter_tokens)
+        #python values of the draws of the candidates, indexing numpy arrays one element at a time is slow.
+        #The letter draws of the candidates are put one after the other, candidate_offsets gives the letters of every candidate
+        lengths = letter_offsets[candidates+1] - letter_offsets[candidates]
+        candidate_offsets = np.zeros(len(candidates)+1, dtype=np.int64)
+        np.cumsum(lengths, out=candidate_offsets[1:])
+        letter_index = np.repeat(letter_offsets[candidates] - candidate_offsets[:-1], lengths) + np.arange(candidate_offsets[-1])
+        letter_draws, chance_draws, letter_choice_draws = (letter_draws[letter_index].tolist(), chance_draws[letter_index].tolist(),
+                                                           variates["letter_choice"][letter_index].tolist())
+        draws = zip(candidates.tolist(), homophone_hits[candidates].tolist(), confusing_word_hits[candidates].tolist(),
+                    confusing_word_passed[candidates].tolist(), variates["homophone"][candidates].tolist(),
+                    variates["confusing_word"][candidates].tolist(), variates["homophone_choice"][candidates].tolist(),
+                    variates["confusing_word_choice"][candidates].tolist(), candidate_offsets[:-1].tolist(), candidate_offsets[1:].tolist())
+        for t, homophone_hit, confusing_word_hit, confusing_word_pass, homophone_draw, confusing_word_draw, homophone_choice_draw, \
+                confusing_word_choice_draw, start, end in draws:
+            #the outcome of a token only depends on these decisions, since the random numbers are fixed
+            key = (t, homophone_hit, confusing_word_pass, p_letter)
+            if cache is not None and key in cache:
+                #moved to the end, so the least recently used words are the first ones in the dict
+                word, results, edits = cache[key] = cache.pop(key)
+            else:
+                edits = [] if edit_log is not None or cache is not None else None
+                #words that are swapped for a homophone or confusing word need new letter draws
+                word_rng = token_rng(t) if homophone_hit or confusing_word_hit else None
+                word, results = self.word_injector(corpus.tokens[t], p_homophone, p_letter, p_confusing_word,
+                                                   homophone_draw=homophone_draw, confusing_word_draw=confusing_word_draw,
+                                                   letter_draws=letter_draws[start:end], chance_draws=chance_draws[start:end], rng=word_rng,
+                                                   punctuation=corpus.get_punctuation(t), homophone_choice_draw=homophone_choice_draw,
+                                                   confusing_word_choice_draw=confusing_word_choice_draw,
+                                                   letter_choice_draws=letter_choice_draws[start:end], edits=edits)
+                if cache is not None:
+                    cache[key] = (word, results, edits)
+                    if len(cache) > self.cache_size:
+                        del cache[next(iter(cache))]
+            homophones_injected += results[0]
+            letters_swapped += results[1]
+            confusing_words_injected += results[2]
+            if results[3]:
+                tokens[t] = word
+                words_modified += 1
+                changed[corpus.sentence_index[t]] = True
+                if edit_log is not None:
+                    sentence = corpus.sentence_index[t]
+                    edit_log.add_word(sentence, t - corpus.sentence_offsets[sentence], corpus.tokens[t], word, edits)
+        #only rebuild the sentences that were changed
+        out = list(corpus.sentences)
+        for i in np.flatnonzero(changed):
+            out[i] = " ".join(tokens[corpus.sentence_offsets[i]:corpus.sentence_offsets[i+1]])
+        sentences_changed = int(changed.sum())
+        return out, (homophones_injected, letters_swapped, confusing_words_injected, words_modified, sentences_changed)
+
+    def multi_level_injector(self, sentences, levels, rng=None):
+        """
+        Injects dyslexia at several probability levels with common random numbers. One set of random numbers is drawn for the corpus and
+        shared by all levels, so a word is swapped at level p if its number is <= p and gets the same replacement at every level where it
+        is swapped. The swapped words of a lower level are therefore a subset of those of a higher level (for the word swaps, a letter swap
+        also lowers the probability of the letters after it). Every level is still a separate batch_injector call over the whole corpus,
+        the shared numbers are for comparing the levels, not for speed.
+        Parameters
+        ----------
+        sentences : list or TokenizedCorpus
+            A list of strings, or the TokenizedCorpus of a DataLoader
+        levels : list
+            A list of (p_homophone, p_letter, p_confusing_word) triples
+        rng : numpy.random.Generator
+            Generator for the random draws, defaults to the generator seeded in the constructor
+        Returns a list with the new sentences and results of batch_injector for every level
+        """
+        corpus = sentences if isinstance(sentences, TokenizedCorpus) else TokenizedCorpus(sentences)
+        variates = self.draw_variates(corpus, rng)
+        cache = {}
+        return [self.batch_injector(corpus, *level, variates=variates, cache=cache) for level in levels]
+
+#injector of a sweep worker process, built once per worker by _init_sweep_worker
+_sweep_injector = None
+
+def _init_sweep_worker(data, dataset_name, homophone_path, confusing_letters_path, confusing_words_path, seed, lexicon_path):
+    global _sweep_injector
+    _sweep_injector = DyslexiaInjector(DataLoader(data=data, dataset_name=dataset_name, fix_formatting=False), homophone_path=homophone_path,
+                                       confusing_letters_path=confusing_letters_path, confusing_words_path=confusing_words_path,
+                                       seed=seed, lexicon_path=lexicon_path)
+
+def _run_sweep_cell(args):
+    return _sweep_injector.gather_save_results(*args)
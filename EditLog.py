@@ -0,0 +1,92 @@
+import pyarrow as pa
+import pyarrow.parquet as pq
+class EditLog:
+    """
+    Record of every edit made by DyslexiaInjector, one row per edit: the sentence, the index of the word in the sentence, the type of
+    edit (homophone, confusing_word or confusing_letter), the original word, the word it became and, for confusing letters, the
+    positions of the swapped letters. A word that is changed in several ways (e.g. a homophone with a swapped letter) has a row per type
+    with the same original and replacement. Letter positions are indices in the word without its punctuation, after a homophone or
+    confusing word swap they are positions in the new word.
+    The log is saved as a parquet file next to the injected data (see DyslexiaInjector.injection_swap(log_edits=True)), so edits can be
+    joined with scores and translations by sentence without aligning the injected data against the original again.
+    ...
+    Attributes
+    ----------
+    sentences: list
+        Sentence index of every edit
+    tokens: list
+        Index of the edited word in its sentence (words are split on whitespace)
+    edit_types: list
+        Type of every edit
+    originals: list
+        The word before the injection
+    replacements: list
+        The word after the injection
+    letters: list
+        Positions of the swapped letters of every edit, empty for homophones and confusing words
+    ...
+    Methods
+    -------
+    add(sentence, token, edit_type, original, replacement, letters=())
+        Adds an edit
+    add_word(sentence, token, original, replacement, edits)
+        Adds the edits word_injector made to a word, edits is the list of (edit_type, letters) it collected
+    to_table()
+        Returns the log as a pyarrow Table
+    to_frame()
+        Returns the log as a DataFrame
+    save(path)
+        Saves the log as a parquet file
+    load(path)
+        Returns a saved log as a DataFrame
+
+    Usage
+    -------
+    >>> edit_log = EditLog()
+    >>> sentences, results = dyslexia_injector.batch_injector(loader.get_tokenized(), 0.2, 0.05, 0.2, edit_log=edit_log)
+    >>> edit_log.to_frame().groupby("edit_type").size()
+    """
+    types = ["homophone", "confusing_word", "confusing_letter"]
+
+    def __init__(self):
+        self.sentences = []
+        self.tokens = []
+        self.edit_types = []
+        self.originals = []
+        self.replacements = []
+        self.letters = []
+
+    def add(self, sentence, token, edit_type, original, replacement, letters=()):
+        if edit_type not in self.types:
+            raise Exception(f"Invalid edit type {edit_type}, please use one of {', '.join(self.types)}")
+        self.sentences.append(int(sentence))
+        self.tokens.append(int(token))
+        self.edit_types.append(edit_type)
+        self.originals.append(original)
+        self.replacements.append(replacement)
+        self.letters.append([int(letter) for letter in letters])
+
+    def add_word(self, sentence, token, original, replacement, edits):
+        for edit_type, letters in edits:
+            self.add(sentence, token, edit_type, original, replacement, letters)
+
+    def __len__(self):
+        return len(self.sentences)
+
+    def to_table(self):
+        #the edit types are dictionary encoded, so every row only stores a small integer
+        edit_types = pa.DictionaryArray.from_arrays(pa.array([self.types.index(edit_type) for edit_type in self.edit_types], type=pa.int8()),
+                                                    pa.array(self.types))
+        return pa.table({"sentence": pa.array(self.sentences, type=pa.int32()), "token": pa.array(self.tokens, type=pa.int32()),
+                         "edit_type": edit_types, "original": pa.array(self.originals, type=pa.string()),
+                         "replacement": pa.array(self.replacements, type=pa.string()), "letters": pa.array(self.letters, type=pa.list_(pa.int16()))})
+
+    def to_frame(self):
+        return self.to_table().to_pandas()
+
+    def save(self, path):
+        pq.write_table(self.to_table(), path)
+
+    @staticmethod
+    def load(path):
+        return pq.read_table(path).to_pandas()
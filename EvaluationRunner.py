@@ -0,0 +1,207 @@
+import os
+import re
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from DataLoader import DataLoader
+class EvaluationRunner:
+    """
+    Evaluates every translation in an output folder against one reference with several metrics and writes one table.
+    The translated files are found from their names (see discover), e.g. output_data/v2/aws/fr.wmt14_en_p_homophone_0.35_p_letter_0.0_p_confusing_word_0.0.txt
+    or output_data/v1/gpt/gpt_homophone_10.txt. The work is a small task graph: every file is loaded once and as soon as it is loaded
+    a task per metric is sent to the pool of that metric. The reference is parsed once and shared by all tasks, cheap metrics run in
+    process pools that get the reference once per worker, metrics that load a model run in thread pools so the model
+    is only loaded once (see MetricRegistry).
+    ...
+    Attributes
+    ----------
+    root: str
+        The folder with one folder per version, each with one folder per service
+    reference: list
+        The reference translations
+    sources: str
+        Path of the untranslated source data, used by comet for the files without injection
+    metrics: list
+        The metrics that are computed, see metric_pools
+    workers: dict
+        The number of workers of every metric
+    aliases: dict
+        (p_homophone, p_letter, p_confusing_word) of files whose names have no probabilities
+    engine: str
+        "native" scores bleu, chrf and wer with CorpusScorer, which counts the reference n-grams once per worker, "evaluate" with evaluate
+    ...
+    Methods
+    -------
+    parse_name(filename)
+        Returns the dataset and probabilities in a file name, None if the name does not follow the naming convention
+    discover()
+        Returns a DataFrame with the version, service, path and probabilities of every translated file
+    get_source(task)
+        Returns the injected source sentences of a file, from the "default files" folder of its version
+    run(out_path=None)
+        Evaluates all files and returns (and saves) the results
+
+    Usage
+    -------
+    python EvaluationRunner.py --root output_data --reference wmt14_fr.txt --metrics bleu chrf wer edit_distance --workers edit_distance=4 --out evaluation_results.csv
+    """
+    #pool type and default number of workers of every metric
+    metric_pools = {"bleu": ("process", 1), "wer": ("process", 1), "chrf": ("process", 1), "edit_distance": ("process", os.cpu_count() or 1),
+                    "bertscore": ("thread", 1), "labse": ("thread", 1), "bleurt": ("thread", 1), "comet": ("thread", 1)}
+    probabilities = re.compile(r"^(?:fr\.)?(?P<dataset>.+)_p_homophone_(?P<p_homophone>[\d.]+)_p_letter_(?P<p_letter>[\d.]+)"
+                               r"_p_confusing_word_(?P<p_confusing_word>[\d.]+)\.(?:txt|csv|docx)$")
+    percentage = re.compile(r"^(?P<dataset>[^_]+)_(?P<type>homophone|confusing_letter|confusing_word)_(?P<percentage>[\d.]+)\.(?:txt|csv|docx)$")
+    types = {"homophone": "p_homophone", "confusing_letter": "p_letter", "confusing_word": "p_confusing_word"}
+
+    def __init__(self, root="output_data", reference="wmt14_fr.txt", sources="wmt14_en.txt", metrics=("bleu", "wer", "edit_distance"),
+                 workers=None, aliases=None, engine="native"):
+        for metric in metrics:
+            if metric not in self.metric_pools:
+                raise Exception(f"Invalid metric {metric}, please use one of {', '.join(self.metric_pools)}")
+        self.root = root
+        self.reference = DataLoader(path=reference).get_data()
+        self.sources = sources
+        self.metrics = list(metrics)
+        self.workers = {metric: self.metric_pools[metric][1] for metric in self.metrics}
+        self.workers.update(workers or {})
+        self.aliases = {"gpt_3_5_turbo_DL.txt": (0.0, 0.0, 0.0)} if aliases is None else aliases
+        self.engine = engine
+
+    def parse_name(self, filename):
+        match = self.probabilities.match(filename)
+        if match is not None:
+            return match["dataset"], float(match["p_homophone"]), float(match["p_letter"]), float(match["p_confusing_word"])
+        match = self.percentage.match(filename)
+        if match is not None:
+            p = {"p_homophone": 0.0, "p_letter": 0.0, "p_confusing_word": 0.0}
+            p[self.types[match["type"]]] = round(float(match["percentage"]) / 100, 6)
+            return match["dataset"], p["p_homophone"], p["p_letter"], p["p_confusing_word"]
+        if filename in self.aliases:
+            return os.path.splitext(filename)[0], *self.aliases[filename]
+        return None
+
+    def discover(self):
+        rows = []
+        for version in sorted(os.listdir(self.root)):
+            if not os.path.isdir(os.path.join(self.root, version)):
+                continue
+            for service in sorted(os.listdir(os.path.join(self.root, version))):
+                folder = os.path.join(self.root, version, service)
+                #default files holds the injected sources, not translations
+                if not os.path.isdir(folder) or service == "default files":
+                    continue
+                for filename in sorted(os.listdir(folder)):
+                    parsed = self.parse_name(filename)
+                    if parsed is None:
+                        print(f"Skipping {os.path.join(folder, filename)}, its name has no probabilities")
+                        continue
+                    rows.append({"version": version, "service": service, "path": os.path.join(folder, filename), "dataset": parsed[0],
+                                 "p_homophone": parsed[1], "p_letter": parsed[2], "p_confusing_word": parsed[3]})
+        return pd.DataFrame(rows, columns=["version", "service", "path", "dataset", "p_homophone", "p_letter", "p_confusing_word"])
+
+    def get_source(self, task):
+        folder = os.path.join(self.root, task["version"], "default files")
+        if os.path.isdir(folder):
+            for filename in os.listdir(folder):
+                parsed = self.parse_name(filename)
+                if parsed is not None and np.allclose(parsed[1:], (task["p_homophone"], task["p_letter"], task["p_confusing_word"])):
+                    return DataLoader(path=os.path.join(folder, filename)).get_data()
+        if task["p_homophone"] == 0 and task["p_letter"] == 0 and task["p_confusing_word"] == 0:
+            return DataLoader(path=self.sources).get_data()
+        raise Exception(f"No source file for {task['path']}")
+
+    def load(self, task):
+        data = DataLoader(path=task["path"]).get_data()
+        if len(data) != len(self.reference):
+            raise Exception(f"{task['path']} has {len(data)} sentences, the reference has {len(self.reference)}")
+        sources = self.get_source(task) if "comet" in self.metrics else None
+        return data, sources
+
+    def run(self, out_path=None):
+        tasks = self.discover().to_dict("records")
+        start = time.perf_counter()
+        pools = {}
+        for metric in self.metrics:
+            if self.metric_pools[metric][0] == "process":
+                #the reference is sent once to every worker instead of with every task
+                pools[metric] = ProcessPoolExecutor(max_workers=self.workers[metric], initializer=_init_evaluation_worker, initargs=(self.reference,))
+            else:
+                pools[metric] = ThreadPoolExecutor(max_workers=self.workers[metric])
+        futures = {}
+        try:
+            with ThreadPoolExecutor(max_workers=4) as loader_pool:
+                loads = {loader_pool.submit(self.load, task): i for i, task in enumerate(tasks)}
+                for future in as_completed(loads):
+                    i = loads[future]
+                    try:
+                        data, sources = future.result()
+                    except Exception as e:
+                        tasks[i]["error"] = str(e)
+                        print(f"Skipping {tasks[i]['path']}: {e}")
+                        continue
+                    for metric in self.metrics:
+                        if self.metric_pools[metric][0] == "process":
+                            futures[pools[metric].submit(_evaluate_worker, metric, data, self.engine)] = (i, metric)
+                        else:
+                            futures[pools[metric].submit(_evaluate, metric, data, self.reference, sources, self.engine)] = (i, metric)
+            for future in as_completed(futures):
+                i, metric = futures[future]
+                try:
+                    tasks[i].update(future.result())
+                except Exception as e:
+                    tasks[i]["error"] = f"{tasks[i].get('error', '')}{metric}: {e}; "
+                print(f"Finished {metric} of {tasks[i]['path']}")
+        finally:
+            for pool in pools.values():
+                pool.shutdown()
+        df = pd.DataFrame(tasks)
+        print(f"Evaluated {len(tasks)} files with {len(self.metrics)} metrics in {time.perf_counter() - start:.1f}s")
+        if out_path is not None:
+            df.to_csv(out_path, index=False)
+        return df
+
+def _evaluate(metric, data, reference, sources=None, engine="native"):
+    #returns the columns of one metric for one file
+    loader = DataLoader(data=data, fix_formatting=False)
+    if metric == "bleu":
+        return {"bleu": loader.get_bleue_score(reference, engine=engine)["bleu"]}
+    if metric == "wer":
+        return {"wer": loader.get_wer(reference, engine=engine)}
+    if metric == "chrf":
+        return {"chrf": loader.get_chrf_score(reference, engine=engine)["score"]}
+    if metric == "edit_distance":
+        substitutions, insertions, deletions, _, _, _, distance, manual_wer = loader.get_edit_distance(reference, manual_wer=True)
+        return {"substitutions": substitutions, "insertions": insertions, "deletions": deletions, "edit_distance": distance, "manual_wer": manual_wer}
+    if metric == "bertscore":
+        scores = loader.get_bert_score(reference)
+        return {f"bertscore_{key}": scores[f"mean_{key}"] for key in ["precision", "recall", "f1"]}
+    if metric == "labse":
+        return {"labse": float(np.mean(loader.get_LaBSE(reference)))}
+    if metric == "bleurt":
+        return {"bleurt": float(np.mean(loader.get_bleurt_score(reference)["scores"]))}
+    if metric == "comet":
+        return {"comet": loader.get_comet_score(reference, sources)["mean_score"]}
+    raise Exception(f"Invalid metric {metric}")
+
+def _init_evaluation_worker(reference):
+    global _evaluation_reference
+    _evaluation_reference = reference
+
+def _evaluate_worker(metric, data, engine="native"):
+    return _evaluate(metric, data, _evaluation_reference, engine=engine)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluates all translations in an output folder against a reference")
+    parser.add_argument("--root", default="output_data")
+    parser.add_argument("--reference", default="wmt14_fr.txt")
+    parser.add_argument("--sources", default="wmt14_en.txt", help="untranslated source data, used by comet")
+    parser.add_argument("--metrics", nargs="+", default=["bleu", "wer", "edit_distance"], choices=list(EvaluationRunner.metric_pools))
+    parser.add_argument("--workers", nargs="*", default=[], help="workers per metric, e.g. edit_distance=4 bertscore=1")
+    parser.add_argument("--out", default="evaluation_results.csv")
+    parser.add_argument("--engine", default="native", choices=["native", "evaluate"], help="how bleu, chrf and wer are computed")
+    args = parser.parse_args()
+    workers = {metric: int(n) for metric, n in (worker.split("=") for worker in args.workers)}
+    runner = EvaluationRunner(root=args.root, reference=args.reference, sources=args.sources, metrics=args.metrics, workers=workers, engine=args.engine)
+    runner.run(args.out)
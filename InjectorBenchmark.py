@@ -0,0 +1,194 @@
+import os
+import gc
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import contextlib
+import io
+import tracemalloc
+import subprocess
+import numpy as np
+import pandas as pd
+from DataLoader import DataLoader
+from DyslexiaInjector import DyslexiaInjector
+try:
+    import resource
+except ImportError:
+    #resource is not available on windows, peak rss is then not reported
+    resource = None
+class InjectorBenchmark:
+    """
+    Offline throughput benchmark for DyslexiaInjector. It runs against the bundled wmt14_en.txt and the dict/ pickles, so no download is needed.
+    For injector (one sentence at a time), injection_runner (batch engine on the whole corpus) and a full injection_swap it reports
+    the time, sentences/sec, words/sec, the peak traced python memory, how much the case raised the peak rss of the process and the number
+    of memory blocks the case allocated and still holds when it returns (the change in sys.getallocatedblocks()).
+    The peak rss of a process never goes down, so a case only raises it if it needs more memory than every case before it,
+    run one benchmark per process (e.g. with --benchmarks and --triples-limit) to get the peak rss of a single case.
+    The results are saved as json so runs of different versions can be compared.
+    ...
+    Attributes
+    ----------
+    load: DataLoader
+        The corpus the benchmark runs on
+    injector: DyslexiaInjector
+        The injector that is benchmarked
+    triples: list
+        The (p_homophone, p_letter, p_confusing_word) triples that are benchmarked
+    trace: bool
+        Whether every case is run a second time under tracemalloc to measure the peak python memory, this is slow
+    results: list
+        One dict per benchmark run
+    ...
+    Methods
+    -------
+    get_triples(path, limit=None)
+        Returns the unique probability triples of a swap_results csv
+    measure(name, p_homophone, p_letter, p_confusing_word, setup, run, sentences, words)
+        Times run(setup()) and measures its memory use
+    get_peak_rss()
+        Returns the peak rss of the process in kb, None if it is not available
+    bench_injector()
+        Benchmarks DyslexiaInjector.injector on every sentence for every triple
+    bench_runner()
+        Benchmarks DyslexiaInjector.injection_runner for every triple
+    bench_swap(p_start=0, p_end=0.1, step_size=0.05)
+        Benchmarks a full individual injection_swap
+    run(benchmarks)
+        Runs the given benchmarks
+    save(path)
+        Saves the results as json
+    compare(path)
+        Returns a DataFrame comparing the results against an earlier saved run
+
+    Usage
+    -------
+    python InjectorBenchmark.py --out bench.json
+    python InjectorBenchmark.py --benchmarks runner --compare bench.json
+    """
+    def __init__(self, path="wmt14_en.txt", triples_path="swap_results_combined.csv", triples_limit=None, seed=42, lexicon_path=None, trace=True):
+        self.load = DataLoader(path=path, dataset_name="wmt14_en")
+        self.injector = DyslexiaInjector(self.load, seed=seed, lexicon_path=lexicon_path)
+        self.triples = self.get_triples(triples_path, triples_limit)
+        self.trace = trace
+        self.results = []
+
+    @staticmethod
+    def get_triples(path, limit=None):
+        df = pd.read_csv(path)
+        triples = df[["p_homophone", "p_letter", "p_confusing_word"]].drop_duplicates()
+        triples = [tuple(float(p) for p in row) for row in triples.itertuples(index=False)]
+        if limit is not None and limit < len(triples):
+            #spread the triples over the whole file
+            triples = [triples[i] for i in np.linspace(0, len(triples)-1, limit).round().astype(int)]
+        return triples
+
+    def measure(self, name, p_homophone, p_letter, p_confusing_word, setup, run, sentences, words):
+        #timed run without tracing, then a second run under tracemalloc for the memory use
+        state = setup()
+        gc.collect()
+        blocks = sys.getallocatedblocks()
+        peak_rss = self.get_peak_rss()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            output = run(state)
+        seconds = time.perf_counter() - start
+        peak_rss = self.get_peak_rss() - peak_rss if peak_rss is not None else None
+        #the output is still alive, so the blocks it holds are counted and the garbage of the run is not
+        gc.collect()
+        blocks = sys.getallocatedblocks() - blocks
+        del output
+        traced_peak = None
+        if self.trace:
+            state = setup()
+            tracemalloc.start()
+            with contextlib.redirect_stdout(io.StringIO()):
+                run(state)
+            _, traced_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        result = {"benchmark": name, "p_homophone": p_homophone, "p_letter": p_letter, "p_confusing_word": p_confusing_word,
+                  "seconds": seconds, "sentences_per_sec": sentences / seconds, "words_per_sec": words / seconds,
+                  "traced_peak_bytes": traced_peak, "allocated_blocks": blocks,
+                  #how much this case raised the high-water mark of the whole process
+                  "peak_rss_growth_kb": peak_rss}
+        self.results.append(result)
+        print(f"{name} p=({p_homophone}, {p_letter}, {p_confusing_word}): {seconds:.3f}s, {result['sentences_per_sec']:.0f} sentences/sec, {result['words_per_sec']:.0f} words/sec")
+        return result
+
+    @staticmethod
+    def get_peak_rss():
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource is not None else None
+
+    def bench_injector(self):
+        sentences = self.load.get_number_of_sentences()
+        words = self.load.get_number_of_words()
+        for triple in self.triples:
+            self.measure("injector", *triple, setup=lambda: self.load.get_data(),
+                         run=lambda data: [self.injector.injector(sentence, *triple) for sentence in data],
+                         sentences=sentences, words=words)
+
+    def bench_runner(self):
+        sentences = self.load.get_number_of_sentences()
+        words = self.load.get_number_of_words()
+        for triple in self.triples:
+            self.measure("injection_runner", *triple, setup=self.load.create_deepcopy,
+                         run=lambda data_loader: self.injector.injection_runner(data_loader, *triple),
+                         sentences=sentences, words=words)
+
+    def bench_swap(self, p_start=0, p_end=0.1, step_size=0.05):
+        cells = len(self.injector.get_sweep_cells(p_start, p_end, step_size, individual=True))
+        sentences = self.load.get_number_of_sentences() * cells
+        words = self.load.get_number_of_words() * cells
+        def run(state):
+            with tempfile.TemporaryDirectory() as save_path:
+                self.injector.injection_swap(p_start=p_start, p_end=p_end, step_size=step_size, save_path=save_path+"/", save_format="txt", individual=True)
+        self.measure("injection_swap", p_end, p_end, p_end, setup=lambda: None, run=run, sentences=sentences, words=words)
+
+    def run(self, benchmarks=("injector", "injection_runner", "injection_swap")):
+        if "injector" in benchmarks:
+            self.bench_injector()
+        if "injection_runner" in benchmarks:
+            self.bench_runner()
+        if "injection_swap" in benchmarks:
+            self.bench_swap()
+        return self.results
+
+    def save(self, path):
+        try:
+            commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True).stdout.strip()
+        except OSError:
+            commit = ""
+        meta = {"commit": commit, "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": sys.version, "numpy": np.__version__,
+                "platform": platform.platform(), "cpu_count": os.cpu_count(), "sentences": self.load.get_number_of_sentences(),
+                "words": self.load.get_number_of_words()}
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"meta": meta, "results": self.results}, f, indent=2)
+        print(f"Saved benchmark results to {path}")
+
+    def compare(self, path):
+        with open(path, "r", encoding="utf-8") as f:
+            baseline = pd.DataFrame(json.load(f)["results"])
+        keys = ["benchmark", "p_homophone", "p_letter", "p_confusing_word"]
+        df = pd.DataFrame(self.results).merge(baseline, on=keys, suffixes=("", "_baseline"))
+        df["speedup"] = df["seconds_baseline"] / df["seconds"]
+        df["traced_peak_ratio"] = df["traced_peak_bytes"] / df["traced_peak_bytes_baseline"]
+        return df[keys + ["seconds_baseline", "seconds", "speedup", "traced_peak_ratio"]]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline throughput benchmark for DyslexiaInjector")
+    parser.add_argument("--benchmarks", nargs="+", default=["injector", "injection_runner", "injection_swap"],
+                        choices=["injector", "injection_runner", "injection_swap"])
+    parser.add_argument("--triples", default="swap_results_combined.csv", help="csv with the p_homophone, p_letter, p_confusing_word columns to benchmark")
+    parser.add_argument("--triples-limit", type=int, default=None, help="only benchmark this many triples")
+    parser.add_argument("--lexicon", default=None, help="compiled lexicon to use instead of the pickles")
+    parser.add_argument("--no-trace", action="store_true", help="skip the tracemalloc run of every case")
+    parser.add_argument("--out", default="bench_output.json")
+    parser.add_argument("--compare", default=None, help="earlier saved results to compare against")
+    args = parser.parse_args()
+    benchmark = InjectorBenchmark(triples_path=args.triples, triples_limit=args.triples_limit, lexicon_path=args.lexicon, trace=not args.no_trace)
+    benchmark.run(args.benchmarks)
+    benchmark.save(args.out)
+    if args.compare is not None:
+        print(benchmark.compare(args.compare).to_string(index=False))
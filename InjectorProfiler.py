@@ -0,0 +1,197 @@
+import json
+import time
+import cProfile
+import pstats
+import numpy as np
+import pandas as pd
+from collections.abc import Mapping
+class InjectorProfiler:
+    """
+    Opt-in instrumentation for DyslexiaInjector. When attached it records the number of calls and the time spent in every stage of
+    word injection (get_punctuation, dictionary lookups, homophone_swapper, confusing_word_injector, confusing_letter_swapper and
+    insert_punctuation, plus word_injector, injector and batch_injector as a whole) and a histogram of the latency of injector by sentence length.
+    Nothing is recorded and nothing is slowed down while no profiler is attached.
+    Stage times are inclusive, word_injector includes the time of the stages it calls. The batch engine only calls word_injector for the
+    few words that need it and has no per-sentence latency, so profile_sweep runs the sweep with the sentence engine by default.
+    ...
+    Attributes
+    ----------
+    stages : list
+        The names of the recorded stages
+    length_edges : list
+        The lower edges (in words) of the sentence length buckets of the latency histogram
+    calls : dict
+        The number of calls of every stage
+    seconds : dict
+        The total time in seconds of every stage
+    latencies : list
+        One list of per-sentence latencies in seconds for every sentence length bucket
+    injector : DyslexiaInjector
+        The injector the profiler is attached to, None if it is not attached
+    ...
+    Methods
+    -------
+    attach(injector)
+        Starts recording the stages of injector
+    detach()
+        Stops recording and restores the injector
+    reset()
+        Clears everything that was recorded
+    get_report()
+        Returns the stages and the latency histogram as a dict
+    get_stage_frame()
+        Returns the stages as a DataFrame
+    get_latency_frame()
+        Returns the latency histogram as a DataFrame
+    save(path)
+        Saves the report as json
+    profile_sweep(injector, pstats_path, engine="sentence", **kwargs)
+        Runs injection_swap in this process with the given injection_runner engine, the profiler attached and under cProfile.
+        The cProfile stats are dumped to pstats_path, returns the results of the sweep and the pstats.Stats
+
+    Usage
+    -------
+    >>> profiler = InjectorProfiler()
+    >>> profiler.attach(dyslexia_injector)
+    >>> dyslexia_injector.injection_runner(loader, 0.2, 0.05, 0.2, engine="sentence")
+    >>> profiler.detach()
+    >>> print(profiler.get_stage_frame())
+    >>> print(profiler.get_latency_frame())
+    """
+    stages = ["get_punctuation", "lookup", "homophone_swapper", "confusing_word_injector", "confusing_letter_swapper",
+              "insert_punctuation", "word_injector", "batch_injector", "injector"]
+    dicts = ["homophones_dict", "confusing_words_dict", "confusing_letters_dict"]
+
+    def __init__(self, length_edges=(0, 10, 20, 30, 40, 60, 80)):
+        self.length_edges = list(length_edges)
+        self.injector = None
+        self.reset()
+
+    def reset(self):
+        self.calls = {stage: 0 for stage in self.stages}
+        self.seconds = {stage: 0.0 for stage in self.stages}
+        self.latencies = [[] for _ in self.length_edges]
+
+    def record(self, stage, seconds):
+        self.calls[stage] += 1
+        self.seconds[stage] += seconds
+
+    def timed(self, stage, method):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+        return wrapper
+
+    def timed_injector(self, method):
+        def wrapper(sentence, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(sentence, *args, **kwargs)
+            finally:
+                seconds = time.perf_counter() - start
+                self.record("injector", seconds)
+                #bucket of the sentence length, the last bucket is open ended
+                bucket = int(np.searchsorted(self.length_edges, len(sentence.split()), side="right")) - 1
+                self.latencies[max(bucket, 0)].append(seconds)
+        return wrapper
+
+    def attach(self, injector):
+        if self.injector is not None:
+            raise Exception("Profiler is already attached, call detach first")
+        self.injector = injector
+        #instance attributes shadow the methods, so word_injector and injector call the timed versions
+        for stage in self.stages[:-1]:
+            if stage != "lookup":
+                setattr(injector, stage, self.timed(stage, getattr(injector, stage)))
+        injector.injector = self.timed_injector(injector.injector)
+        for name in self.dicts:
+            setattr(injector, name, TimedDict(getattr(injector, name), self))
+        injector.profiler = self
+        return self
+
+    def detach(self):
+        if self.injector is None:
+            return self
+        for stage in self.stages:
+            if stage != "lookup":
+                delattr(self.injector, stage)
+        for name in self.dicts:
+            setattr(self.injector, name, getattr(self.injector, name).data)
+        self.injector.profiler = None
+        self.injector = None
+        return self
+
+    def get_report(self):
+        stages = {stage: {"calls": self.calls[stage], "seconds": self.seconds[stage],
+                          "mean_us": 1e6 * self.seconds[stage] / self.calls[stage] if self.calls[stage] > 0 else 0.0}
+                  for stage in self.stages}
+        latency = []
+        for i, latencies in enumerate(self.latencies):
+            latencies = np.array(latencies)
+            latency.append({"min_words": self.length_edges[i],
+                            "max_words": self.length_edges[i+1] - 1 if i+1 < len(self.length_edges) else None,
+                            "sentences": len(latencies), "seconds": float(latencies.sum()),
+                            "mean_ms": float(1e3 * latencies.mean()) if len(latencies) > 0 else 0.0,
+                            "p95_ms": float(1e3 * np.percentile(latencies, 95)) if len(latencies) > 0 else 0.0,
+                            "max_ms": float(1e3 * latencies.max()) if len(latencies) > 0 else 0.0})
+        return {"stages": stages, "sentence_latency": latency}
+
+    def get_stage_frame(self):
+        return pd.DataFrame.from_dict(self.get_report()["stages"], orient="index")
+
+    def get_latency_frame(self):
+        return pd.DataFrame(self.get_report()["sentence_latency"])
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.get_report(), f, indent=2)
+
+    def profile_sweep(self, injector, pstats_path, engine="sentence", **kwargs):
+        #worker processes have their own injector and are not seen by cProfile, so the sweep has to run in this process
+        if kwargs.get("workers", 1) > 1:
+            raise Exception("profile_sweep runs the sweep in this process, please use workers=1")
+        profile = cProfile.Profile()
+        self.attach(injector)
+        #every cell goes through injection_runner, the instance attribute makes it use engine
+        injection_runner = injector.injection_runner
+        injector.injection_runner = lambda *args, **kw: injection_runner(*args, **{**kw, "engine": engine})
+        try:
+            profile.enable()
+            df = injector.injection_swap(**kwargs)
+            profile.disable()
+        finally:
+            del injector.injection_runner
+            self.detach()
+        profile.dump_stats(pstats_path)
+        return df, pstats.Stats(pstats_path)
+
+class TimedDict(Mapping):
+    """
+    Read-only view of one of the injector dicts that records the time of every lookup in the "lookup" stage of an InjectorProfiler.
+    """
+    def __init__(self, data, profiler):
+        self.data = data
+        self.profiler = profiler
+
+    def __getitem__(self, word):
+        start = time.perf_counter()
+        try:
+            return self.data[word]
+        finally:
+            self.profiler.record("lookup", time.perf_counter() - start)
+
+    def __contains__(self, word):
+        start = time.perf_counter()
+        try:
+            return word in self.data
+        finally:
+            self.profiler.record("lookup", time.perf_counter() - start)
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __len__(self):
+        return len(self.data)
@@ -0,0 +1,164 @@
+import os
+import json
+import pickle
+import hashlib
+import numpy as np
+from collections.abc import Mapping
+class Lexicon:
+    """
+    Compiled version of the dictionaries used by DyslexiaInjector (homophones, confusing letters and confusing words).
+    All words of the three dictionaries share one sorted word index, so a word has the same id in every table.
+    The candidates of every table are stored as flat arrays of word ids with an offsets array, and a bitmap stores which
+    tables have candidates for a word. The arrays are saved as .npy files in a folder and memory-mapped read-only,
+    so worker processes that load the same lexicon share one copy of it. The words are saved as a UTF-8 text file with one word per line
+    and read into a dict from word to id when the lexicon is loaded, so looking up a word is a dict lookup.
+    ...
+    Attributes
+    ----------
+    path: str
+        Folder of the compiled lexicon
+    words: list
+        Sorted list of every word in the lexicon, the index of a word is its id
+    ids: dict
+        The id of every word
+    flags: np.ndarray
+        Bitmap with one entry per word, bit i is set if the word has candidates in tables[i]
+    offsets: dict
+        Offsets into the candidates of every table, the candidates of word id w are candidates[offsets[w]:offsets[w+1]]
+    candidates: dict
+        Flat array of candidate word ids of every table
+    ...
+    Methods
+    -------
+    compile(path, homophone_path, confusing_letters_path, confusing_words_path)
+        Converts the pickled dictionaries into a compiled lexicon saved in path
+    lookup(words)
+        Returns the ids of a list of words, -1 for words that are not in the lexicon
+    has_candidates(ids, table)
+        Returns a mask of the ids that have candidates in a table
+    get_candidates(word, table)
+        Returns the candidates of a word in a table as a list of strings
+    get_dict(table)
+        Returns a read-only dict-like view of a table that can be used in place of the pickled dict
+    ...
+
+    Usage
+    -------
+    >>> from Lexicon import Lexicon
+    >>> Lexicon.compile("dict/lexicon")
+    >>> lexicon = Lexicon("dict/lexicon")
+    >>> lexicon.get_candidates("capital", "homophones")
+    ['capitol']
+    >>> injector = DyslexiaInjector(loader, lexicon_path="dict/lexicon")
+    """
+    tables = ["homophones", "confusing_letters", "confusing_words"]
+    version = 2
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "lexicon.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta["version"] != self.version:
+            raise Exception(f"Lexicon in {path} has version {self.meta['version']}, please compile it again")
+        with open(os.path.join(path, "words.txt"), "r", encoding="utf-8", newline="\n") as f:
+            self.words = f.read().split("\n")[:-1]
+        self.ids = {word: i for i, word in enumerate(self.words)}
+        self.flags = np.load(os.path.join(path, "flags.npy"), mmap_mode="r")
+        self.offsets = {}
+        self.candidates = {}
+        for table in self.tables:
+            self.offsets[table] = np.load(os.path.join(path, f"{table}_offsets.npy"), mmap_mode="r")
+            self.candidates[table] = np.load(os.path.join(path, f"{table}_candidates.npy"), mmap_mode="r")
+
+    @staticmethod
+    def compile(path, homophone_path="dict/homophones_dict.pickle",
+                confusing_letters_path="dict/confusing_letters_dict.pickle",
+                confusing_words_path="dict/pedler_dict.pickle"):
+        sources = dict(zip(Lexicon.tables, [homophone_path, confusing_letters_path, confusing_words_path]))
+        dicts = {}
+        meta = {"version": Lexicon.version, "sources": {}}
+        for table, source in sources.items():
+            with open(source, "rb") as f:
+                content = f.read()
+            dicts[table] = pickle.loads(content)
+            meta["sources"][table] = {"path": source, "sha256": hashlib.sha256(content).hexdigest()}
+        #one index for the keys and candidates of all tables
+        vocabulary = set()
+        for dictionary in dicts.values():
+            for key, values in dictionary.items():
+                vocabulary.add(key)
+                vocabulary.update(values)
+        words = sorted(vocabulary)
+        ids = {word: i for i, word in enumerate(words)}
+        flags = np.zeros(len(words), dtype=np.uint8)
+        os.makedirs(path, exist_ok=True)
+        for bit, table in enumerate(Lexicon.tables):
+            counts = np.zeros(len(words), dtype=np.int64)
+            for key, values in dicts[table].items():
+                counts[ids[key]] = len(values)
+            offsets = np.zeros(len(words)+1, dtype=np.int32)
+            np.cumsum(counts, out=offsets[1:])
+            candidates = np.zeros(offsets[-1], dtype=np.int32)
+            for key, values in dicts[table].items():
+                candidates[offsets[ids[key]]:offsets[ids[key]+1]] = [ids[value] for value in values]
+            flags[counts > 0] |= 1 << bit
+            np.save(os.path.join(path, f"{table}_offsets.npy"), offsets)
+            np.save(os.path.join(path, f"{table}_candidates.npy"), candidates)
+        with open(os.path.join(path, "words.txt"), "w", encoding="utf-8", newline="\n") as f:
+            f.write("".join(f"{word}\n" for word in words))
+        np.save(os.path.join(path, "flags.npy"), flags)
+        with open(os.path.join(path, "lexicon.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+        print(f"Compiled lexicon with {len(words)} words to {path}")
+        return path
+
+    def lookup(self, words):
+        return np.fromiter((self.ids.get(word, -1) for word in words), dtype=np.int64, count=len(words))
+
+    def has_candidates(self, ids, table):
+        ids = np.asarray(ids)
+        mask = np.zeros(ids.shape, dtype=bool)
+        found = ids >= 0
+        mask[found] = (self.flags[ids[found]] & (1 << self.tables.index(table))) > 0
+        return mask
+
+    def get_candidates(self, word, table):
+        word_id = self.ids.get(word, -1)
+        if word_id < 0:
+            return []
+        offsets = self.offsets[table]
+        return [self.words[i] for i in self.candidates[table][offsets[word_id]:offsets[word_id+1]]]
+
+    def get_dict(self, table):
+        return LexiconDict(self, table)
+
+class LexiconDict(Mapping):
+    """
+    Read-only dict-like view of one table of a Lexicon. A word is only a key if it has candidates in the table.
+    The words of the table are kept in a set and the candidates of a word are read from the lexicon once and kept in a dict,
+    so lookups cost about as much as on the pickled dict.
+    """
+    def __init__(self, lexicon, table):
+        self.lexicon = lexicon
+        self.table = table
+        self.bit = 1 << Lexicon.tables.index(table)
+        self.words = frozenset(lexicon.words[i] for i in np.flatnonzero(lexicon.flags & self.bit))
+        self.cache = {}
+
+    def __getitem__(self, word):
+        candidates = self.cache.get(word) if isinstance(word, str) else None
+        if candidates is None:
+            if word not in self.words:
+                raise KeyError(word)
+            candidates = self.cache[word] = self.lexicon.get_candidates(word, self.table)
+        return candidates
+
+    def __contains__(self, word):
+        return word in self.words
+
+    def __iter__(self):
+        for i in np.flatnonzero(self.lexicon.flags & self.bit):
+            yield self.lexicon.words[i]
+
+    def __len__(self):
+        return len(self.words)
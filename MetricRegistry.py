@@ -0,0 +1,93 @@
+import gc
+import sys
+import threading
+import evaluate
+class MetricRegistry:
+    """
+    Process-wide registry of the metrics and models used to score translations. Every entry is loaded once on first use and then
+    shared by all DataLoader instances, so scoring the same reference against many services and injection levels only loads
+    evaluate metrics and the LaBSE model once. Large models can be released again to get their memory back.
+    ...
+    Attributes
+    ----------
+    loaders: dict
+        The function that loads every registered entry
+    loaded: dict
+        The entries that are loaded
+    lock: threading.RLock
+        Lock so entries are only loaded once when used from several threads
+    ...
+    Methods
+    -------
+    register(name, loader)
+        Registers a function that loads an entry
+    get(name)
+        Returns an entry, it is loaded on first use
+    warm_up(*names)
+        Loads entries ahead of time, all registered entries if no names are given
+    release(*names)
+        Drops loaded entries so their memory can be reclaimed, all loaded entries if no names are given
+    is_loaded(name)
+        Returns True if an entry is loaded
+
+    Usage
+    -------
+    >>> from MetricRegistry import metric_registry
+    >>> metric_registry.warm_up("bleu", "wer")
+    >>> loader.get_bleue_score(reference)
+    >>> metric_registry.release("labse")
+    """
+    def __init__(self):
+        self.loaders = {}
+        self.loaded = {}
+        self.lock = threading.RLock()
+
+    def register(self, name, loader):
+        with self.lock:
+            self.loaders[name] = loader
+            #a new loader replaces whatever was loaded before
+            self.loaded.pop(name, None)
+
+    def get(self, name):
+        with self.lock:
+            if name not in self.loaded:
+                if name not in self.loaders:
+                    raise Exception(f"Unknown metric {name}, please use one of {', '.join(self.loaders)} or register it")
+                self.loaded[name] = self.loaders[name]()
+            return self.loaded[name]
+
+    def warm_up(self, *names):
+        for name in names or list(self.loaders):
+            self.get(name)
+
+    def release(self, *names):
+        with self.lock:
+            for name in names or list(self.loaded):
+                self.loaded.pop(name, None)
+        gc.collect()
+        #give cached gpu memory back if torch was used
+        torch = sys.modules.get("torch")
+        if torch is not None and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def is_loaded(self, name):
+        return name in self.loaded
+
+def _load_labse():
+    #transformers is only needed for LaBSE, so it is imported when the model is loaded
+    import torch
+    from transformers import BertModel, BertTokenizerFast
+    model = BertModel.from_pretrained("setu4993/LaBSE")
+    #the shared model is put on the gpu once here, SentenceEmbedder never moves it
+    model.to("cuda" if torch.cuda.is_available() else "cpu")
+    model.eval()
+    return model, BertTokenizerFast.from_pretrained("setu4993/LaBSE")
+
+metric_registry = MetricRegistry()
+metric_registry.register("bleu", lambda: evaluate.load("bleu"))
+metric_registry.register("wer", lambda: evaluate.load("wer"))
+metric_registry.register("chrf", lambda: evaluate.load("chrf"))
+metric_registry.register("bertscore", lambda: evaluate.load("bertscore"))
+metric_registry.register("bleurt", lambda: evaluate.load("bleurt"))
+metric_registry.register("comet", lambda: evaluate.load("comet"))
+metric_registry.register("labse", _load_labse)
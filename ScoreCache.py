@@ -0,0 +1,115 @@
+import json
+import hashlib
+from SqliteStore import SqliteStore
+class ScoreCache(SqliteStore):
+    """
+    Persistent cache of sentence level scores (bertscore, LaBSE, BLEURT, COMET, ...) keyed by the metric, the model or version of the
+    metric and the sha256 of the candidate, reference and source sentence. Many sentences are the same across injection levels and
+    services, so a scoring call only computes the pairs that are not in the cache yet.
+    The cache is a SqliteStore, see there for concurrent access and max_entries.
+    ...
+    Attributes
+    ----------
+    path: str
+        Path of the sqlite database
+    max_entries: int
+        Maximum number of scores that are kept, None for no limit
+    connection: sqlite3.Connection
+        Connection to the database
+    ...
+    Methods
+    -------
+    hash(sentence)
+        Returns the sha256 of a sentence
+    get_keys(metric, model, candidates, references, sources=None)
+        Returns the cache key of every sentence pair
+    get_many(metric, model, candidates, references, sources=None)
+        Returns the cached score of every sentence pair, None for pairs that are not cached
+    lookup(keys, default=None)
+        Returns the cached score of every key, default for keys that are not cached
+    put_many(metric, model, candidates, references, scores, sources=None)
+        Adds the scores of sentence pairs to the cache
+    score(metric, model, candidates, references, compute, sources=None)
+        Returns the score of every sentence pair, only the pairs that are not cached are computed with compute
+    evict()
+        Removes the least recently used scores until there are at most max_entries
+    get_number_of_entries()
+        Returns the number of cached scores
+    close()
+        Closes the database
+
+    Usage
+    -------
+    >>> cache = ScoreCache("scores.sqlite", max_entries=10000000)
+    >>> def compute(candidates, references):
+    >>>     return bleurt.compute(predictions=candidates, references=references)["scores"]
+    >>> scores = cache.score("bleurt", "BLEURT-20", translations, reference, compute)
+    """
+    table = "scores"
+    columns = ["metric", "model", "candidate", "reference", "source"]
+    value = "score"
+
+    def __init__(self, path="score_cache.sqlite", max_entries=None):
+        super().__init__(path, max_entries)
+
+    def encode(self, value):
+        #scores can be anything json can store
+        return json.dumps(value)
+
+    def decode(self, text):
+        return json.loads(text)
+
+    @staticmethod
+    def hash(sentence):
+        return hashlib.sha256(sentence.encode("utf-8")).hexdigest()
+
+    def get_rows(self, metric, model, candidates, references, sources=None):
+        if len(candidates) != len(references) or (sources is not None and len(sources) != len(candidates)):
+            raise Exception("candidates, references and sources should have the same length")
+        rows = []
+        for i in range(len(candidates)):
+            candidate = self.hash(candidates[i])
+            reference = self.hash(references[i])
+            source = self.hash(sources[i]) if sources is not None else ""
+            key = hashlib.sha256("\0".join([metric, model, candidate, reference, source]).encode("utf-8")).hexdigest()
+            rows.append((key, metric, model, candidate, reference, source))
+        return rows
+
+    def get_keys(self, metric, model, candidates, references, sources=None):
+        return [row[0] for row in self.get_rows(metric, model, candidates, references, sources)]
+
+    def get_many(self, metric, model, candidates, references, sources=None):
+        return self.lookup(self.get_keys(metric, model, candidates, references, sources))
+
+    def put_many(self, metric, model, candidates, references, scores, sources=None):
+        self.insert(self.get_rows(metric, model, candidates, references, sources), scores)
+
+    def score(self, metric, model, candidates, references, compute, sources=None):
+        """
+        Returns the score of every sentence pair. compute(candidates, references) (or compute(candidates, references, sources) if sources
+        are given) is called once with the pairs that are missing from the cache, each pair only once, and has to return one score per pair.
+        A score can be anything json can store, e.g. a float or a dict of floats.
+        """
+        keys = self.get_keys(metric, model, candidates, references, sources)
+        #a cached score can be None, so misses are marked with missing
+        scores = self.lookup(keys, default=self.missing)
+        missing = {}
+        for i, score in enumerate(scores):
+            if score is self.missing and keys[i] not in missing:
+                missing[keys[i]] = i
+        if len(missing) > 0:
+            index = list(missing.values())
+            missing_candidates = [candidates[i] for i in index]
+            missing_references = [references[i] for i in index]
+            if sources is None:
+                computed = list(compute(missing_candidates, missing_references))
+            else:
+                missing_sources = [sources[i] for i in index]
+                computed = list(compute(missing_candidates, missing_references, missing_sources))
+            if len(computed) != len(index):
+                raise Exception("compute should return one score per sentence pair")
+            self.put_many(metric, model, missing_candidates, missing_references, computed,
+                          sources=missing_sources if sources is not None else None)
+            computed = dict(zip(missing, computed))
+            scores = [computed[keys[i]] if score is self.missing else score for i, score in enumerate(scores)]
+        return scores
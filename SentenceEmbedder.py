@@ -0,0 +1,134 @@
+import sys
+import copy
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+class SentenceEmbedder:
+    """
+    Batched sentence embeddings with a BERT-style model such as LaBSE, used by DataLoader.get_LaBSE. The sentences are sorted by their
+    number of tokens and cut into minibatches of at most batch_size sentences and, if max_tokens is given, at most max_tokens padded
+    tokens, so sentences are only padded to the longest sentence of their batch. Only one batch (and the next one if prefetch is True)
+    is tokenized at a time and the model runs in inference mode, so peak memory only depends on the batch size and not on the corpus.
+    While the model runs on a batch the next batch can be tokenized on a second thread.
+    The model is not moved or changed, so a model shared through MetricRegistry stays where it is for everyone else. If device is
+    another device than the one the model is on, or the model is not in eval mode, the embedder runs a private copy of it instead.
+    torch is only used for torch models and never imported here, so the batching also works with any model that takes the tokenizer
+    output and returns a pooler_output.
+    ...
+    Attributes
+    ----------
+    model: transformers.PreTrainedModel
+        The model, its pooler_output is used as the sentence embedding
+    tokenizer: transformers.PreTrainedTokenizer
+        The tokenizer that goes with the model
+    batch_size: int
+        The maximum number of sentences in a batch
+    max_tokens: int
+        The maximum number of padded tokens in a batch, None for no limit
+    max_length: int
+        Sentences are truncated to this number of tokens
+    device: str
+        Device the model runs on, defaults to the device the model is on
+    prefetch: bool
+        Whether the next batch is tokenized on a second thread while the model runs
+    ...
+    Methods
+    -------
+    get_lengths(sentences, chunk_size=10000)
+        Returns the number of tokens of every sentence
+    get_batches(lengths)
+        Returns the indices of the sentences in every batch, from short to long sentences
+    encode(inputs)
+        Returns the pooler output of a tokenized batch as a float32 array
+    embed(sentences)
+        Returns the l2 normalized embedding of every sentence as a float32 array in the order of sentences
+    similarity(reference_embeddings, target_embeddings)
+        Returns the cosine similarity of every pair of normalized embeddings
+
+    Usage
+    -------
+    >>> embedder = SentenceEmbedder(model, tokenizer, batch_size=32, max_tokens=4096, device="cpu")
+    >>> embeddings = embedder.embed(loader.get_data())
+    """
+    def __init__(self, model, tokenizer, batch_size=64, max_tokens=None, max_length=512, device=None, prefetch=True, threads=None):
+        #a torch model can only be made if torch is imported already
+        torch = sys.modules.get("torch")
+        self.torch = torch if torch is not None and isinstance(model, torch.nn.Module) else None
+        if self.torch is not None:
+            if threads is not None:
+                torch.set_num_threads(threads)
+            model_device = next(model.parameters()).device
+            device = model_device if device is None else torch.device(device)
+            #"cuda" is whichever gpu the model is on
+            if device.type == model_device.type and device.index in (None, model_device.index):
+                device = model_device
+            if device != model_device or model.training:
+                model = copy.deepcopy(model).to(device).eval()
+        self.model = model
+        self.tokenizer = tokenizer
+        self.batch_size = batch_size
+        self.max_tokens = max_tokens
+        self.max_length = max_length
+        self.device = device
+        self.prefetch = prefetch
+
+    def get_lengths(self, sentences, chunk_size=10000):
+        #tokenized in chunks so the token ids of the whole corpus are never held at once
+        lengths = np.zeros(len(sentences), dtype=np.int64)
+        for i in range(0, len(sentences), chunk_size):
+            input_ids = self.tokenizer(sentences[i:i+chunk_size], truncation=True, max_length=self.max_length)["input_ids"]
+            lengths[i:i+chunk_size] = [len(ids) for ids in input_ids]
+        return lengths
+
+    def get_batches(self, lengths):
+        order = np.argsort(lengths, kind="stable")
+        batches = []
+        batch = []
+        for i in order:
+            #the batch is padded to its last (longest) sentence
+            if len(batch) > 0 and (len(batch) == self.batch_size or
+                                   (self.max_tokens is not None and (len(batch) + 1) * lengths[i] > self.max_tokens)):
+                batches.append(np.array(batch))
+                batch = []
+            batch.append(i)
+        if len(batch) > 0:
+            batches.append(np.array(batch))
+        return batches
+
+    def tokenize(self, sentences):
+        return self.tokenizer(sentences, return_tensors="pt" if self.torch is not None else "np", padding=True, truncation=True,
+                              max_length=self.max_length)
+
+    def encode(self, inputs):
+        #pooler output of a tokenized batch as a float32 array
+        if self.torch is None:
+            return np.asarray(self.model(**inputs).pooler_output, dtype=np.float32)
+        with self.torch.inference_mode():
+            return self.model(**inputs.to(self.device)).pooler_output.float().cpu().numpy()
+
+    def embed(self, sentences):
+        sentences = list(sentences)
+        embeddings = np.zeros((len(sentences), self.model.config.hidden_size), dtype=np.float32)
+        batches = self.get_batches(self.get_lengths(sentences))
+        if len(batches) == 0:
+            return embeddings
+        executor = ThreadPoolExecutor(max_workers=1) if self.prefetch else None
+        try:
+            def tokenize(batch):
+                texts = [sentences[i] for i in batch]
+                return executor.submit(self.tokenize, texts) if executor is not None else self.tokenize(texts)
+            pending = tokenize(batches[0])
+            for k, batch in enumerate(batches):
+                inputs = pending.result() if executor is not None else pending
+                #start on the next batch while the model runs
+                if k+1 < len(batches):
+                    pending = tokenize(batches[k+1])
+                outputs = self.encode(inputs)
+                embeddings[batch] = outputs / np.maximum(np.linalg.norm(outputs, axis=1, keepdims=True), 1e-12)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        return embeddings
+
+    @staticmethod
+    def similarity(reference_embeddings, target_embeddings):
+        return np.einsum("ij,ij->i", reference_embeddings, target_embeddings)
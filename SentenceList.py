@@ -0,0 +1,80 @@
+class SentenceList(list):
+    """
+    List of sentences that counts the changes made to it, used as DataLoader.data for the list backend. The tokenized corpus and the
+    statistics of a DataLoader are rebuilt when the version they were built from changes, so a DataLoader never compares the sentences
+    to find out whether its data changed. ArrowCorpus counts its changes the same way.
+    Slices, copies and the result of + are plain lists.
+    ...
+    Attributes
+    ----------
+    version: int
+        Number of changes made to the list
+    ...
+    Methods
+    -------
+    changed()
+        Counts a change, e.g. after changing a sentence that is not a string in place
+
+    Usage
+    -------
+    >>> sentences = SentenceList(["the cat is black"])
+    >>> sentences[0] = "the cat is back"
+    >>> sentences.version
+    1
+    """
+    #a class attribute, so unpickled lists have a version before their sentences are appended
+    version = 0
+
+    def changed(self):
+        self.version += 1
+
+    def __setitem__(self, i, value):
+        super().__setitem__(i, value)
+        self.changed()
+
+    def __delitem__(self, i):
+        super().__delitem__(i)
+        self.changed()
+
+    def __iadd__(self, sentences):
+        result = super().__iadd__(sentences)
+        self.changed()
+        return result
+
+    def __imul__(self, n):
+        result = super().__imul__(n)
+        self.changed()
+        return result
+
+    def append(self, sentence):
+        super().append(sentence)
+        self.changed()
+
+    def extend(self, sentences):
+        super().extend(sentences)
+        self.changed()
+
+    def insert(self, i, sentence):
+        super().insert(i, sentence)
+        self.changed()
+
+    def pop(self, i=-1):
+        sentence = super().pop(i)
+        self.changed()
+        return sentence
+
+    def remove(self, sentence):
+        super().remove(sentence)
+        self.changed()
+
+    def clear(self):
+        super().clear()
+        self.changed()
+
+    def sort(self, *args, **kwargs):
+        super().sort(*args, **kwargs)
+        self.changed()
+
+    def reverse(self):
+        super().reverse()
+        self.changed()
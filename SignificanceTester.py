@@ -0,0 +1,151 @@
+import numpy as np
+import pandas as pd
+class SignificanceTester:
+    """
+    Paired bootstrap and approximate randomization tests of the change in mean sentence score between a clean condition and the injected
+    conditions, for every translation service. The scores are a (sentences, systems, conditions) matrix, e.g. the BERTScore, BLEURT, COMET
+    or LaBSE of every sentence translated by every service at every injection level.
+    All tests are matrix products: a chunk of resamples is a (resamples, sentences) matrix of weights, the number of times every sentence
+    is drawn for the bootstrap or a random sign for approximate randomization, and multiplying it with the (sentences, systems * conditions)
+    matrix of per-sentence deltas gives the mean delta of every resample, system and condition at once. The same resamples are used for
+    all systems and conditions (the tests are paired), resamples are drawn in fixed blocks from seed so the results do not depend on
+    chunk_size, and only one chunk of weights is in memory at a time.
+    ...
+    Attributes
+    ----------
+    scores: np.ndarray
+        The (sentences, systems, conditions) matrix of sentence scores
+    systems: list
+        Name of every system
+    conditions: list
+        Name of every condition
+    baseline: int
+        Index of the clean condition the other conditions are compared to
+    n_resamples: int
+        Number of bootstrap resamples and of random permutations
+    confidence: float
+        Level of the confidence intervals
+    chunk_size: int
+        Number of resamples that are computed at a time
+    seed: int
+        Seed of the resamples
+    ...
+    Methods
+    -------
+    from_frame(df, score, sentence="sentence", system="service", condition="condition", baseline=None, **kwargs)
+        Returns a tester for a long DataFrame with one row per sentence, system and condition
+    get_deltas()
+        Returns the (sentences, systems * conditions) matrix of score changes against the baseline
+    get_indices(start, stop)
+        Returns the sentence indices of bootstrap resamples start to stop, the pre-drawn resample matrix of that chunk
+    get_signs(start, stop)
+        Returns the random signs of permutations start to stop
+    bootstrap()
+        Returns the mean delta of every bootstrap resample, a (n_resamples, systems, conditions) array
+    randomization()
+        Returns the approximate randomization p-value of every system and condition
+    run()
+        Returns a DataFrame with the delta, confidence interval and p-values of every system and injected condition
+
+    Usage
+    -------
+    >>> tester = SignificanceTester(scores, systems=["aws", "azure", "google", "gpt"], conditions=["clean", "homophone_0.2", "homophone_0.4"],
+    >>>                             n_resamples=10000)
+    >>> tester.run()
+    """
+    #resamples are drawn in blocks of this size, each from its own stream of seed
+    block_size = 500
+
+    def __init__(self, scores, systems=None, conditions=None, baseline=0, n_resamples=10000, confidence=0.95, chunk_size=1000, seed=42):
+        scores = np.asarray(scores, dtype=np.float64)
+        if scores.ndim == 2:
+            scores = scores[:, None, :]
+        if scores.ndim != 3:
+            raise Exception("scores should be a (sentences, systems, conditions) matrix")
+        if np.isnan(scores).any():
+            raise Exception("scores contains NaN, every sentence needs a score for every system and condition")
+        self.scores = scores
+        self.systems = list(systems) if systems is not None else list(range(scores.shape[1]))
+        self.conditions = list(conditions) if conditions is not None else list(range(scores.shape[2]))
+        if len(self.systems) != scores.shape[1] or len(self.conditions) != scores.shape[2]:
+            raise Exception("There should be one name per system and per condition")
+        #a condition name or the index of the condition
+        self.baseline = self.conditions.index(baseline) if baseline in self.conditions else baseline
+        self.n_resamples = n_resamples
+        self.confidence = confidence
+        self.chunk_size = chunk_size
+        self.seed = seed
+
+    @staticmethod
+    def from_frame(df, score, sentence="sentence", system="service", condition="condition", baseline=None, **kwargs):
+        table = df.pivot_table(index=sentence, columns=[system, condition], values=score, aggfunc="first")
+        systems = list(table.columns.levels[0])
+        conditions = list(table.columns.levels[1])
+        table = table.reindex(columns=pd.MultiIndex.from_product([systems, conditions]))
+        scores = table.to_numpy().reshape(len(table), len(systems), len(conditions))
+        return SignificanceTester(scores, systems, conditions, baseline=conditions[0] if baseline is None else baseline, **kwargs)
+
+    def get_deltas(self):
+        return (self.scores - self.scores[:, :, [self.baseline]]).reshape(self.scores.shape[0], -1)
+
+    def get_blocks(self, start, stop, stream, draw):
+        #draws the resamples of every block that overlaps start to stop and keeps the rows start to stop
+        first, last = start // self.block_size, (stop - 1) // self.block_size
+        rows = np.concatenate([draw(np.random.default_rng([self.seed, stream, block])) for block in range(first, last + 1)])
+        return rows[start - first * self.block_size:stop - first * self.block_size]
+
+    def get_indices(self, start, stop):
+        n = self.scores.shape[0]
+        return self.get_blocks(start, stop, 0, lambda rng: rng.integers(0, n, size=(self.block_size, n), dtype=np.int32))
+
+    def get_signs(self, start, stop):
+        n = self.scores.shape[0]
+        #a different stream than the bootstrap
+        return self.get_blocks(start, stop, 1, lambda rng: rng.integers(0, 2, size=(self.block_size, n), dtype=np.int8) * 2 - 1)
+
+    def get_chunks(self):
+        for start in range(0, self.n_resamples, self.chunk_size):
+            yield start, min(start + self.chunk_size, self.n_resamples)
+
+    def bootstrap(self):
+        n = self.scores.shape[0]
+        deltas = self.get_deltas()
+        means = np.empty((self.n_resamples, deltas.shape[1]))
+        for start, stop in self.get_chunks():
+            indices = self.get_indices(start, stop)
+            #number of times every sentence is drawn in every resample
+            offsets = np.arange(stop - start, dtype=np.int64)[:, None] * n
+            weights = np.bincount((indices + offsets).ravel(), minlength=(stop - start) * n).reshape(stop - start, n)
+            means[start:stop] = weights @ deltas / n
+        return means.reshape(self.n_resamples, *self.scores.shape[1:])
+
+    def randomization(self):
+        #swaps the clean and injected score of every sentence with probability 0.5, which flips the sign of its delta
+        n = self.scores.shape[0]
+        deltas = self.get_deltas()
+        observed = np.abs(deltas.mean(axis=0))
+        extreme = np.zeros(deltas.shape[1], dtype=np.int64)
+        for start, stop in self.get_chunks():
+            means = self.get_signs(start, stop).astype(np.float64) @ deltas / n
+            #small tolerance so permutations that give the observed delta up to rounding count as extreme
+            extreme += np.sum(np.abs(means) >= observed - 1e-12, axis=0)
+        return ((extreme + 1) / (self.n_resamples + 1)).reshape(self.scores.shape[1:])
+
+    def run(self):
+        means = self.scores.mean(axis=0)
+        deltas = means - means[:, [self.baseline]]
+        resamples = self.bootstrap()
+        alpha = (1 - self.confidence) / 2
+        low, high = np.quantile(resamples, [alpha, 1 - alpha], axis=0)
+        #two sided bootstrap p-value, how often the resampled delta is on the other side of zero
+        p_bootstrap = np.minimum(1.0, 2 * np.minimum(np.mean(resamples <= 0, axis=0), np.mean(resamples >= 0, axis=0)))
+        p_randomization = self.randomization()
+        rows = []
+        for s, system in enumerate(self.systems):
+            for c, condition in enumerate(self.conditions):
+                if c == self.baseline:
+                    continue
+                rows.append({"system": system, "condition": condition, "baseline_mean": means[s, self.baseline], "mean": means[s, c],
+                             "delta": deltas[s, c], "ci_low": low[s, c], "ci_high": high[s, c], "p_bootstrap": p_bootstrap[s, c],
+                             "p_randomization": p_randomization[s, c]})
+        return pd.DataFrame(rows)
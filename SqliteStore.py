@@ -0,0 +1,124 @@
+import time
+import sqlite3
+class SqliteStore:
+    """
+    Base class of the persistent sqlite stores (ScoreCache and TranslationMemo). A store is one table of values keyed by the sha256 of
+    whatever identifies them, with a column per part of the key so the table can be queried, and the time every value was last used.
+    The database is in WAL mode, so several processes can read it while one writes. If max_entries is given the least recently used
+    values are evicted when the store grows larger. The number of values is counted once when the store is opened and kept up to date by
+    insert, so inserting does not count the table; values added by other processes are only counted when evict is called.
+    Subclasses set the table, the key columns and the value column and build the keys, encode and decode convert values to and from text.
+    ...
+    Attributes
+    ----------
+    table: str
+        Name of the table
+    columns: list
+        Names of the columns that make up the key
+    value: str
+        Name of the column of the values
+    path: str
+        Path of the sqlite database
+    max_entries: int
+        Maximum number of values that are kept, None for no limit
+    connection: sqlite3.Connection
+        Connection to the database
+    entries: int
+        Number of values in the store as counted by this connection, None if max_entries is None
+    missing: object
+        Returned by lookup for keys that are not in the store if it is passed as default, a stored value can be None
+    ...
+    Methods
+    -------
+    encode(value)
+        Returns the text that is stored for a value
+    decode(text)
+        Returns the value of stored text
+    lookup(keys, default=None)
+        Returns the value of every key, default for keys that are not in the store
+    insert(rows, values)
+        Adds the values of rows, every row is the key followed by its key columns
+    count_new(keys)
+        Returns the number of distinct keys that are not in the store
+    evict()
+        Counts the values and removes the least recently used values until there are at most max_entries
+    remove_oldest(n)
+        Removes the n least recently used values
+    get_number_of_entries()
+        Returns the number of values in the store
+    close()
+        Closes the database
+    """
+    table = None
+    columns = []
+    value = "value"
+    missing = object()
+
+    def __init__(self, path, max_entries=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        columns = ", ".join(f"{column} TEXT" for column in self.columns)
+        self.connection.execute(f"CREATE TABLE IF NOT EXISTS {self.table} (key TEXT PRIMARY KEY, {columns}, {self.value} TEXT, last_used REAL)")
+        self.connection.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_last_used ON {self.table} (last_used)")
+        self.connection.commit()
+        self.entries = self.get_number_of_entries() if max_entries is not None else None
+
+    def encode(self, value):
+        return value
+
+    def decode(self, text):
+        return text
+
+    def lookup(self, keys, default=None):
+        found = {}
+        unique = list(dict.fromkeys(keys))
+        #sqlite limits the number of parameters of a query
+        for i in range(0, len(unique), 500):
+            chunk = unique[i:i+500]
+            query = f"SELECT key, {self.value} FROM {self.table} WHERE key IN ({','.join('?' * len(chunk))})"
+            for key, text in self.connection.execute(query, chunk):
+                found[key] = self.decode(text)
+        if len(found) > 0 and self.max_entries is not None:
+            #only needed to evict the least recently used values
+            now = time.time()
+            self.connection.executemany(f"UPDATE {self.table} SET last_used = ? WHERE key = ?", [(now, key) for key in found])
+            self.connection.commit()
+        return [found.get(key, default) for key in keys]
+
+    def insert(self, rows, values):
+        if self.max_entries is not None:
+            self.entries += self.count_new([row[0] for row in rows])
+        now = time.time()
+        placeholders = ", ".join("?" * (len(self.columns) + 3))
+        self.connection.executemany(f"INSERT OR REPLACE INTO {self.table} VALUES ({placeholders})",
+                                    [(*row, self.encode(value), now) for row, value in zip(rows, values)])
+        self.connection.commit()
+        if self.max_entries is not None and self.entries > self.max_entries:
+            self.remove_oldest(self.entries - self.max_entries)
+
+    def count_new(self, keys):
+        unique = list(dict.fromkeys(keys))
+        existing = 0
+        for i in range(0, len(unique), 500):
+            chunk = unique[i:i+500]
+            query = f"SELECT COUNT(*) FROM {self.table} WHERE key IN ({','.join('?' * len(chunk))})"
+            existing += self.connection.execute(query, chunk).fetchone()[0]
+        return len(unique) - existing
+
+    def evict(self):
+        self.entries = self.get_number_of_entries()
+        if self.entries > self.max_entries:
+            self.remove_oldest(self.entries - self.max_entries)
+
+    def remove_oldest(self, n):
+        self.connection.execute(f"DELETE FROM {self.table} WHERE key IN (SELECT key FROM {self.table} ORDER BY last_used LIMIT ?)", (n,))
+        self.connection.commit()
+        self.entries -= n
+
+    def get_number_of_entries(self):
+        return self.connection.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,71 @@
+import os
+import json
+from CorpusReader import CorpusReader
+class SweepLog:
+    """
+    Append-only log of the finished cells of a sweep (see DyslexiaInjector.injection_swap), so a sweep that stops half way can be resumed.
+    Every finished cell is written as one json line with its results and the sha256 checksum of the files it saved, and flushed right away.
+    A manifest with the settings of the sweep is saved next to it, the log can only be resumed with the same settings.
+    ...
+    Attributes
+    ----------
+    log_path: str
+        Path of the json lines log
+    manifest_path: str
+        Path of the manifest
+    manifest: dict
+        The settings of the sweep
+    ...
+    Methods
+    -------
+    get_completed()
+        Returns the records of the cells that are finished and whose files are unchanged, by cell
+    append(record)
+        Adds the record of a finished cell to the log
+    verify(record)
+        Returns True if all files of a record exist and have the same checksum
+    cell_key(p_homophone, p_letter, p_confusing_word)
+        Returns the key of a cell
+    """
+    def __init__(self, save_path, manifest):
+        self.log_path = f"{save_path}/swap_results.log"
+        self.manifest_path = f"{save_path}/sweep_manifest.json"
+        self.manifest = manifest
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                saved_manifest = json.load(f)
+            if saved_manifest != manifest:
+                raise Exception(f"{save_path} contains a sweep with different settings, please use another save_path or remove {self.manifest_path} and {self.log_path}")
+        else:
+            with open(self.manifest_path, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=2)
+
+    @staticmethod
+    def cell_key(p_homophone, p_letter, p_confusing_word):
+        return tuple(round(float(p), 6) for p in (p_homophone, p_letter, p_confusing_word))
+
+    def verify(self, record):
+        for path, checksum in record["files"].items():
+            if not os.path.exists(path) or CorpusReader.get_checksum(path) != checksum:
+                return False
+        return True
+
+    def get_completed(self):
+        records = {}
+        if os.path.exists(self.log_path):
+            with open(self.log_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    #a line that was cut off when the process died is ignored
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    #later records of a cell replace earlier ones
+                    records[self.cell_key(record["p_homophone"], record["p_letter"], record["p_confusing_word"])] = record
+        return {cell: record for cell, record in records.items() if self.verify(record)}
+
+    def append(self, record):
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
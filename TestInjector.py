@@ -6,7 +6,36 @@ import evaluate
 from docx import Document
 import os
 import unittest
+from unittest import mock
+import tempfile
 from datasets import load_dataset
+from DataLoader import DataLoader
+from DyslexiaInjector import DyslexiaInjector
+from Lexicon import Lexicon
+from InjectorBenchmark import InjectorBenchmark
+from InjectorProfiler import InjectorProfiler
+from CorpusWriter import CorpusWriter
+from MetricRegistry import MetricRegistry
+from ScoreCache import ScoreCache
+from CorpusReader import CorpusReader
+from WordAligner import WordAligner
+from EvaluationRunner import EvaluationRunner
+from ArrowCorpus import ArrowCorpus
+from CorpusStatistics import CorpusStatistics
+from TranslationClient import TranslationClient
+from TranslationProvider import StubProvider
+from TranslationStubServer import TranslationStubServer
+from TranslationMemo import TranslationMemo
+from TokenBucket import TokenBucket
+from CorpusScorer import CorpusScorer
+from collections import Counter
+from SignificanceTester import SignificanceTester
+from EditLog import EditLog
+from SentenceEmbedder import SentenceEmbedder
+from MetricRegistry import metric_registry
+import gzip
+import time
+import asyncio
 class TestInjector(unittest.TestCase):
     
     def setUp(self):
@@ -128,3 +157,785 @@ class TestInjector(unittest.TestCase):
                 self.assertEqual(actual_words_modified, expected_words_modified, f"actual_words_modified: {actual_words_modified} | expected_words_modified: {expected_words_modified}, i: {i}")
                 self.assertEqual(actual_letters_swapped, expected_letters_swapped, f"actual_letters_swapped: {actual_letters_swapped} | expected_letters_swapped: {expected_letters_swapped}, i: {i}")
                 self.assertEqual(actual_confusing_words_injected, expected_confusing_words_injected, f"actual_confusing_words_injected: {actual_confusing_words_injected} | expected_confusing_words_injected: {expected_confusing_words_injected}, i: {i}")
+
+class TestInjectionEngines(unittest.TestCase):
+
+    def setUp(self):
+        #wmt14_en.txt is the english side of the wmt14 fr-en test split, so these tests run offline
+        wmt14_en = DataLoader(path="wmt14_en.txt", dataset_name="wmt14_en")
+        self.injector = DyslexiaInjector(load=wmt14_en, homophone_path="dict/homophones_dict.pickle",
+                                         confusing_letters_path="dict/confusing_letters_dict.pickle",
+                                         confusing_words_path="dict/pedler_dict.pickle", seed=3)
+
+    get_sentence_stats = TestInjector.get_sentence_stats
+
+    def test_batch_injector(self):
+        all_sentences= ['I am a sentence.', 'Also, in a sentence, we can have different types of punctuatioN!', "Now that we've tested punctuation, let's test homophones.","Let's see what happens when he have an abreviation like NASA"]
+        for i in range(3):
+            p = [0, 0, 0]
+            p[i] = 1
+            out_sentences, results = self.injector.batch_injector(all_sentences, p_homophone=p[0], p_letter=p[1], p_confusing_word=p[2])
+            self.assertEqual(len(out_sentences), len(all_sentences))
+            homophones, words_modified, letters_swapped, confusing_words = 0, 0, 0, 0
+            sentences_changed = 0
+            for original_sentence, out_sentence in zip(all_sentences, out_sentences):
+                self.assertNotEqual(out_sentence, original_sentence)
+                stats = self.get_sentence_stats(original_sentence.split(), out_sentence.split(), k=i)
+                homophones += stats[0]
+                words_modified += stats[1]
+                letters_swapped += stats[2]
+                confusing_words += stats[3]
+                sentences_changed += stats[1] > 0
+            self.assertEqual((homophones, letters_swapped, confusing_words, words_modified, sentences_changed), results, f"i: {i}")
+
+    def test_batch_letter_swaps(self):
+        #the letter swaps done on the arrays should match word_injector with the same random numbers
+        corpus = DataLoader(data=self.injector.load.get_data()[:300]).get_tokenized()
+        variates = self.injector.draw_variates(corpus, np.random.default_rng(0))
+        sentences, results = self.injector.batch_injector(corpus, 0, 0.6, 0, variates=variates)
+        tokens, letters_swapped = [], 0
+        for t, token in enumerate(corpus.tokens):
+            start, end = corpus.letter_offsets[t], corpus.letter_offsets[t+1]
+            word, word_results = self.injector.word_injector(token, 0, 0.6, 0, homophone_draw=1, confusing_word_draw=1,
+                                                             letter_draws=variates["letter"][start:end], chance_draws=variates["chance"][start:end],
+                                                             letter_choice_draws=variates["letter_choice"][start:end])
+            tokens.append(word)
+            letters_swapped += word_results[1]
+        expected = [" ".join(tokens[corpus.sentence_offsets[i]:corpus.sentence_offsets[i+1]]) for i in range(len(corpus.sentences))]
+        self.assertEqual(sentences, expected)
+        self.assertEqual(results[1], letters_swapped)
+        self.assertGreater(letters_swapped, results[3])
+
+    def test_batch_injector_no_injection(self):
+        sentences = self.injector.load.get_data()
+        out_sentences, results = self.injector.batch_injector(sentences, 0, 0, 0)
+        self.assertEqual(out_sentences, sentences)
+        self.assertEqual(results, (0, 0, 0, 0, 0))
+
+    def test_injection_swap_workers(self):
+        #every cell has its own random stream, so the number of workers should not change the results
+        small_injector = DyslexiaInjector(load=DataLoader(data=self.injector.load.get_data()[:50], dataset_name="wmt14_en"), seed=3)
+        outputs = []
+        for workers in [1, 2]:
+            with tempfile.TemporaryDirectory() as save_path:
+                df_swap_results = small_injector.injection_swap(p_start=0, p_end=0.2, step_size=0.1, save_path=save_path+"/", save_format="txt", individual=True, workers=workers)
+                files = {}
+                for filename in sorted(os.listdir(save_path)):
+                    #the log is written in the order the cells finish
+                    if filename == "swap_results.log":
+                        continue
+                    with open(os.path.join(save_path, filename), "rb") as f:
+                        files[filename] = f.read()
+                outputs.append((df_swap_results.to_csv(index=False), files))
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertIn("swap_results.csv", outputs[0][1])
+        #nothing can be injected into numbers, so every cell writes the same file and the files of all workers are linked to one
+        numbers_injector = DyslexiaInjector(load=DataLoader(data=["123 456", "7 89"], dataset_name="numbers"), seed=3)
+        with tempfile.TemporaryDirectory() as save_path:
+            df_swap_results = numbers_injector.injection_swap(p_start=0, p_end=0.2, step_size=0.1, save_path=save_path+"/", save_format="txt", workers=2)
+            paths = [os.path.join(save_path, filename) for filename in os.listdir(save_path) if filename.startswith("numbers_")]
+            self.assertEqual(len(paths), len(df_swap_results))
+            self.assertEqual(len({os.stat(path).st_ino for path in paths}), 1)
+
+    def test_lexicon(self):
+        with tempfile.TemporaryDirectory() as lexicon_path:
+            Lexicon.compile(lexicon_path)
+            lexicon_injector = DyslexiaInjector(load=self.injector.load, seed=3, lexicon_path=lexicon_path)
+            #the compiled tables should hold the same candidates as the pickled dicts
+            self.assertEqual(dict(lexicon_injector.homophones_dict), self.injector.homophones_dict)
+            self.assertEqual(dict(lexicon_injector.confusing_letters_dict), self.injector.confusing_letters_dict)
+            self.assertEqual(dict(lexicon_injector.confusing_words_dict), self.injector.confusing_words_dict)
+            self.assertEqual(lexicon_injector.lexicon.lookup(["capital", "not a word"])[1], -1)
+            corpus = self.injector.load.get_tokenized()
+            for mask, lexicon_mask in zip(self.injector.get_eligibility(corpus.vocabulary), lexicon_injector.get_eligibility(corpus.vocabulary)):
+                np.testing.assert_array_equal(mask, lexicon_mask)
+            sentences, results = self.injector.batch_injector(corpus, 0.1, 0.05, 0.1, rng=np.random.default_rng(0))
+            lexicon_sentences, lexicon_results = lexicon_injector.batch_injector(corpus, 0.1, 0.05, 0.1, rng=np.random.default_rng(0))
+            self.assertEqual(sentences, lexicon_sentences)
+            self.assertEqual(results, lexicon_results)
+
+    def test_stream_injection(self):
+        with tempfile.TemporaryDirectory() as save_path:
+            in_path = os.path.join(save_path, "wmt14_en_small.txt")
+            self.injector.load.create_deepcopy().save_as_txt(in_path)
+            for out_name in ["baseline.txt", "baseline.csv"]:
+                out_path = os.path.join(save_path, out_name)
+                results, sentences = self.injector.stream_injection(in_path, out_path, 0, 0, 0, chunk_size=500)
+                self.assertEqual(results, (0, 0, 0, 0, 0))
+                self.assertEqual(sentences, self.injector.load.get_number_of_sentences())
+                self.assertEqual(DataLoader(path=out_path).get_data(), self.injector.load.get_data())
+            out_path = os.path.join(save_path, "injected.txt")
+            results, sentences = self.injector.stream_injection(in_path, out_path, 0.1, 0.05, 0.1, chunk_size=500)
+            with open(out_path, "r", encoding="utf-8") as f:
+                injected = f.read().splitlines()
+            self.assertEqual(len(injected), sentences)
+            #a swap can occasionally give back the same word, so the counter is an upper bound on the sentences that differ
+            sentences_changed = sum(a != b for a, b in zip(injected, self.injector.load.get_data()))
+            self.assertLessEqual(sentences_changed, results[4])
+            self.assertGreater(sentences_changed, 0)
+            #streaming gives the same sentences as loading, including sentences that change when formatted a second time
+            raw = ["\" a \"", "hello , world !", "« bonjour »", "", "'quoted'"] + self.injector.load.get_data()[:100]
+            with open(os.path.join(save_path, "raw.txt"), "w", encoding="utf-8") as f:
+                f.write("\n".join(raw) + "\n")
+            pd.DataFrame(raw).to_csv(os.path.join(save_path, "raw.csv"), header=False, index=False)
+            for path in ["wmt14_en.txt", os.path.join(save_path, "raw.txt"), os.path.join(save_path, "raw.csv")]:
+                chunks = list(DataLoader.stream(path, chunk_size=30))
+                self.assertTrue(all(len(chunk) == 30 for chunk in chunks[:-1]))
+                self.assertEqual([sentence for chunk in chunks for sentence in chunk], DataLoader(path=path).get_data())
+
+    def test_multi_level_injector(self):
+        corpus = self.injector.load.get_tokenized()
+        for axis in range(3):
+            levels = []
+            for p in [0.05, 0.2, 0.5]:
+                level = [0, 0, 0]
+                level[axis] = p
+                levels.append(tuple(level))
+            outputs = self.injector.multi_level_injector(corpus, levels)
+            for (lower, lower_results), (higher, higher_results) in zip(outputs, outputs[1:]):
+                self.assertLessEqual(lower_results[3], higher_results[3])
+                if axis == 1:
+                    continue
+                #a word swapped at a lower level is swapped the same way at the higher level
+                for original_sentence, lower_sentence, higher_sentence in zip(corpus.sentences, lower, higher):
+                    for original_word, lower_word, higher_word in zip(original_sentence.split(), lower_sentence.split(), higher_sentence.split()):
+                        if lower_word != original_word:
+                            self.assertEqual(lower_word, higher_word)
+
+    def test_coupled_cache(self):
+        small_injector = DyslexiaInjector(load=DataLoader(data=self.injector.load.get_data()[:200], dataset_name="wmt14_en"), seed=3)
+        variates, cache = small_injector.get_coupled_variates()
+        levels = [(0.1, 0.05, 0.1), (0.2, 0.05, 0.2), (0.2, 0.1, 0.2)]
+        expected = [small_injector.batch_injector(small_injector.load.get_tokenized(), *level, variates=variates, cache=cache) for level in levels]
+        self.assertGreater(len(cache), 50)
+        #a small cache drops the least recently used words and gives the same results
+        small_injector.cache_size = 50
+        cache = {}
+        outputs = [small_injector.batch_injector(small_injector.load.get_tokenized(), *level, variates=variates, cache=cache) for level in levels]
+        self.assertEqual(outputs, expected)
+        self.assertEqual(len(cache), 50)
+        #the cache is not kept after a sweep
+        with tempfile.TemporaryDirectory() as save_path:
+            small_injector.injection_swap(p_start=0, p_end=0.1, step_size=0.1, save_path=save_path+"/", save_format="txt", coupled=True)
+        self.assertIsNone(small_injector.coupled_variates)
+
+    def test_injection_swap_resume(self):
+        small_injector = DyslexiaInjector(load=DataLoader(data=self.injector.load.get_data()[:50], dataset_name="wmt14_en"), seed=3)
+        with tempfile.TemporaryDirectory() as save_path:
+            df_swap_results = small_injector.injection_swap(p_start=0, p_end=0.1, step_size=0.1, save_path=save_path+"/", save_format="txt")
+            self.assertTrue(os.path.exists(os.path.join(save_path, "swap_results.parquet")))
+            pd.testing.assert_frame_equal(pd.read_parquet(os.path.join(save_path, "swap_results.parquet")), df_swap_results)
+            #count the cells that are run again
+            ran = []
+            gather_save_results = small_injector.gather_save_results
+            small_injector.gather_save_results = lambda *args, **kwargs: ran.append(args[:3]) or gather_save_results(*args, **kwargs)
+            resumed = small_injector.injection_swap(p_start=0, p_end=0.1, step_size=0.1, save_path=save_path+"/", save_format="txt")
+            self.assertEqual(ran, [])
+            pd.testing.assert_frame_equal(resumed, df_swap_results)
+            #a changed output file is detected by its checksum and only that cell is run again
+            with open(os.path.join(save_path, "wmt14_en_p_homophone_0.1_p_letter_0.0_p_confusing_word_0.1.txt"), "a", encoding="utf-8") as f:
+                f.write("changed\n")
+            resumed = small_injector.injection_swap(p_start=0, p_end=0.1, step_size=0.1, save_path=save_path+"/", save_format="txt")
+            self.assertEqual(ran, [(0.1, 0.0, 0.1)])
+            pd.testing.assert_frame_equal(resumed, df_swap_results)
+            #a different sweep in the same folder is refused
+            with self.assertRaises(Exception):
+                small_injector.injection_swap(p_start=0, p_end=0.2, step_size=0.1, save_path=save_path+"/", save_format="txt")
+
+    def test_injector_benchmark(self):
+        benchmark = InjectorBenchmark(triples_limit=2, trace=False)
+        self.assertEqual(benchmark.triples, [benchmark.get_triples("swap_results_combined.csv")[i] for i in [0, -1]])
+        benchmark.bench_runner()
+        self.assertEqual([result["benchmark"] for result in benchmark.results], ["injection_runner"] * 2)
+        self.assertTrue(all(result["sentences_per_sec"] > 0 for result in benchmark.results))
+        #the injected loader and the results are returned, so the case holds new blocks, and the peak rss can only grow
+        self.assertTrue(all(result["allocated_blocks"] > 0 for result in benchmark.results))
+        self.assertTrue(all(result["peak_rss_growth_kb"] is None or result["peak_rss_growth_kb"] >= 0 for result in benchmark.results))
+        with tempfile.TemporaryDirectory() as save_path:
+            benchmark.save(save_path+"/bench.json")
+            df_compare = benchmark.compare(save_path+"/bench.json")
+        self.assertEqual(len(df_compare), 2)
+        self.assertTrue(np.allclose(df_compare["speedup"], 1))
+
+    def test_injector_profiler(self):
+        sentences = self.injector.load.get_data()[:100]
+        profiler = self.injector.enable_profiling()
+        for sentence in sentences:
+            self.injector.injector(sentence, 0.5, 0.1, 0.5)
+        self.injector.disable_profiling()
+        report = profiler.get_report()
+        n_words = sum(len(sentence.split()) for sentence in sentences)
+        self.assertEqual(report["stages"]["injector"]["calls"], 100)
+        self.assertEqual(report["stages"]["word_injector"]["calls"], n_words)
+        self.assertEqual(report["stages"]["get_punctuation"]["calls"], n_words)
+        self.assertGreater(report["stages"]["homophone_swapper"]["calls"], 0)
+        self.assertEqual(sum(bucket["sentences"] for bucket in report["sentence_latency"]), 100)
+        #detaching restores the injector
+        self.assertIsNone(self.injector.profiler)
+        self.assertIsInstance(self.injector.homophones_dict, dict)
+        self.assertNotIn("injector", vars(self.injector))
+        small_injector = DyslexiaInjector(load=DataLoader(data=sentences[:20], dataset_name="wmt14_en"), seed=3)
+        with tempfile.TemporaryDirectory() as save_path:
+            profiler = InjectorProfiler()
+            #worker processes cannot be profiled
+            with self.assertRaises(Exception):
+                profiler.profile_sweep(small_injector, save_path+"/sweep.pstats", p_start=0, p_end=0.1, step_size=0.1,
+                                       save_path=save_path+"/", save_format="txt", workers=2)
+            df, stats = profiler.profile_sweep(small_injector, save_path+"/sweep.pstats", p_start=0, p_end=0.1, step_size=0.1,
+                                               save_path=save_path+"/", save_format="txt")
+            self.assertTrue(os.path.exists(save_path+"/sweep.pstats"))
+            self.assertGreater(stats.total_calls, 0)
+            #every sentence of every cell goes through the timed stages
+            report = profiler.get_report()
+            self.assertEqual(report["stages"]["injector"]["calls"], 20 * len(df))
+            self.assertGreater(report["stages"]["word_injector"]["calls"], 0)
+            self.assertGreater(report["stages"]["confusing_letter_swapper"]["calls"], 0)
+            self.assertEqual(sum(bucket["sentences"] for bucket in report["sentence_latency"]), 20 * len(df))
+            self.assertNotIn("injection_runner", vars(small_injector))
+            #the batch engine is recorded as a stage of its own
+            profiler = InjectorProfiler()
+            os.mkdir(save_path+"/batch")
+            profiler.profile_sweep(small_injector, save_path+"/batch.pstats", engine="batch", p_start=0, p_end=0.1, step_size=0.1,
+                                   save_path=save_path+"/batch/", save_format="txt")
+            self.assertEqual(profiler.get_report()["stages"]["batch_injector"]["calls"], len(df))
+            self.assertEqual(profiler.get_report()["stages"]["injector"]["calls"], 0)
+
+    def test_corpus_writer(self):
+        load = DataLoader(data=self.injector.load.get_data()[:50] + ['a "quoted", sentence'], dataset_name="wmt14_en")
+        with tempfile.TemporaryDirectory() as save_path:
+            load.save_as_csv(save_path+"/loader.csv")
+            load.save_as_txt(save_path+"/loader.txt")
+            writer = CorpusWriter(formats=["csv", "txt", "docx"])
+            writer.write(load.get_data(), save_path+"/writer")
+            #same bytes as the DataLoader savers
+            for format in ["csv", "txt"]:
+                with open(save_path+"/loader."+format, "rb") as f, open(save_path+"/writer."+format, "rb") as g:
+                    self.assertEqual(f.read(), g.read())
+            self.assertEqual(DataLoader(path=save_path+"/writer.docx").get_data(), load.get_data())
+            #identical output is linked instead of copied
+            writer.write(load.get_data(), save_path+"/copy")
+            self.assertTrue(os.path.samefile(save_path+"/writer.txt", save_path+"/copy.txt"))
+            #rewriting a linked file does not change the other one
+            writer.write(load.get_data()[:10], save_path+"/copy")
+            with open(save_path+"/writer.txt", "rb") as f, open(save_path+"/loader.txt", "rb") as g:
+                self.assertEqual(f.read(), g.read())
+        small_injector = DyslexiaInjector(load=load, seed=3)
+        with tempfile.TemporaryDirectory() as save_path:
+            small_injector.injection_swap(p_start=0, p_end=0.1, step_size=0.1, save_path=save_path+"/", save_format="txt", compression="gzip")
+            with gzip.open(save_path+"/wmt14_en_p_homophone_0.0_p_letter_0.0_p_confusing_word_0.0.txt.gz", "rt", encoding="utf-8") as f:
+                self.assertEqual(f.read().splitlines(), load.get_data())
+        #a second sweep into another folder never links to the files of the first one, even if they were changed
+        with tempfile.TemporaryDirectory() as first, tempfile.TemporaryDirectory() as second:
+            name = "/wmt14_en_p_homophone_0.0_p_letter_0.0_p_confusing_word_0.0.txt"
+            small_injector.injection_swap(p_start=0, p_end=0.1, step_size=0.1, save_path=first+"/", save_format="txt")
+            with open(first+name, "a", encoding="utf-8") as f:
+                f.write("tampered\n")
+            small_injector.injection_swap(p_start=0, p_end=0.1, step_size=0.1, save_path=second+"/", save_format="txt")
+            self.assertFalse(os.path.samefile(first+name, second+name))
+            self.assertEqual(DataLoader(path=second+name).get_data(), load.get_data())
+        #a changed file is written again instead of linked
+        with tempfile.TemporaryDirectory() as save_path:
+            writer = CorpusWriter(formats=["txt"])
+            writer.write(load.get_data(), save_path+"/writer")
+            with open(save_path+"/writer.txt", "a", encoding="utf-8") as f:
+                f.write("tampered\n")
+            writer.write(load.get_data(), save_path+"/copy")
+            self.assertFalse(os.path.samefile(save_path+"/writer.txt", save_path+"/copy.txt"))
+            self.assertEqual(DataLoader(path=save_path+"/copy.txt").get_data(), load.get_data())
+
+    def test_edit_distance(self):
+        reference = self.injector.load.get_data()[:300]
+        injected, _ = self.injector.batch_injector(reference, 0.5, 0.1, 0.5, rng=np.random.default_rng(3))
+        #reordered and shortened sentences give insertions and deletions as well
+        injected = injected[:100] + [" ".join(sentence.split()[::-1][:-2]) for sentence in injected[100:200]] + injected[200:] + ["", "a"]
+        reference = reference + ["b", ""]
+        for reference_sentence, sentence in zip(reference, injected):
+            expected = DataLoader.edit_distance(reference_sentence, sentence, engine="matrix")
+            self.assertEqual(DataLoader.edit_distance(reference_sentence, sentence), expected)
+            self.assertEqual(DataLoader.word_distance(reference_sentence, sentence), expected[6])
+            self.assertEqual(DataLoader.word_distance(reference_sentence, sentence, max_distance=2), min(expected[6], 3))
+        loader = DataLoader(data=injected, fix_formatting=False)
+        self.assertEqual(loader.get_edit_distance(reference), loader.get_edit_distance(reference, engine="matrix"))
+        #the aligner only keeps cache_size references and nothing else grows with the number of sentences aligned
+        aligner = WordAligner(cache_size=10)
+        for reference_sentence, sentence in zip(reference, injected):
+            self.assertEqual(aligner.align(reference_sentence, sentence), DataLoader.edit_distance(reference_sentence, sentence, engine="matrix"))
+            self.assertLessEqual(len(aligner.references), 10)
+        self.assertEqual(set(vars(aligner)), {"cache_size", "references"})
+
+    def test_parallel_edit_distance(self):
+        reference = self.injector.load.get_data()[:400]
+        injected, _ = self.injector.batch_injector(reference, 0.5, 0.1, 0.5, rng=np.random.default_rng(3))
+        loader = DataLoader(data=injected, fix_formatting=False)
+        #merging the same counts as adding up every sentence one by one
+        expected = [0, 0, 0, {}, {}, {}, 0]
+        individual = [DataLoader.edit_distance(reference_sentence, sentence) for reference_sentence, sentence in zip(reference, injected)]
+        for result in individual:
+            for k in [0, 1, 2, 6]:
+                expected[k] += result[k]
+            expected[3] = loader.combine_nested_dict(expected[3], copy.deepcopy(result[3]))
+            expected[4] = loader.combine_dicts(expected[4], result[4])
+            expected[5] = loader.combine_dicts(expected[5], result[5])
+        self.assertEqual(loader.get_edit_distance(reference, chunk_size=70), tuple(expected))
+        self.assertEqual(loader.get_edit_distance(reference, workers=2, chunk_size=70), tuple(expected))
+        self.assertEqual(loader.get_individual_edit_distance(reference, workers=2, chunk_size=70), individual)
+        self.assertEqual(list(loader.iter_edit_distance(reference, chunk_size=70)), individual)
+        with self.assertRaises(ValueError):
+            loader.get_edit_distance(reference[:-1])
+
+    def test_sentence_embedder(self):
+        #word level tokenizer and a model that averages word vectors, so the embedding of a sentence does not depend on its padding
+        class Tokenizer:
+            def __init__(self):
+                self.vocabulary = {}
+            def __call__(self, sentences, truncation=True, max_length=512, padding=False, return_tensors=None):
+                input_ids = [[self.vocabulary.setdefault(word, len(self.vocabulary) + 1) for word in sentence.split()][:max_length] for sentence in sentences]
+                if not padding:
+                    return {"input_ids": input_ids}
+                width = max(len(ids) for ids in input_ids)
+                return {"input_ids": np.array([ids + [0] * (width - len(ids)) for ids in input_ids]),
+                        "attention_mask": np.array([[1] * len(ids) + [0] * (width - len(ids)) for ids in input_ids])}
+        class Model:
+            def __init__(self):
+                self.config = type("Config", (), {"hidden_size": 8})
+                self.vectors = np.random.default_rng(0).normal(size=(100000, 8))
+            def __call__(self, input_ids, attention_mask):
+                pooled = (self.vectors[input_ids] * attention_mask[:, :, None]).sum(axis=1) / attention_mask.sum(axis=1, keepdims=True)
+                return type("Output", (), {"pooler_output": pooled})
+        tokenizer, model = Tokenizer(), Model()
+        reference = DataLoader(path="wmt14_fr.txt").get_data()[:200]
+        targets = DataLoader(path="output_data/v2/aws/fr.wmt14_en_p_homophone_0.35_p_letter_0.0_p_confusing_word_0.0.txt").get_data()[:200]
+        embedder = SentenceEmbedder(model, tokenizer, batch_size=16, max_tokens=300)
+        lengths = embedder.get_lengths(targets, chunk_size=64)
+        batches = embedder.get_batches(lengths)
+        self.assertEqual(sorted(np.concatenate(batches).tolist()), list(range(200)))
+        self.assertTrue(all(len(batch) <= 16 and (len(batch) == 1 or len(batch) * lengths[batch].max() <= 300) for batch in batches))
+        #the embeddings come back in the order of the sentences
+        embeddings = embedder.embed(targets)
+        single = SentenceEmbedder(model, tokenizer, batch_size=1, prefetch=False)
+        expected = np.concatenate([single.embed([sentence]) for sentence in targets])
+        self.assertTrue(np.allclose(embeddings, expected, atol=1e-6))
+        self.assertTrue(np.allclose(np.linalg.norm(embeddings, axis=1), 1, atol=1e-6))
+        #the same similarity as embedding one sentence pair at a time
+        scores = DataLoader(data=targets, fix_formatting=False).get_LaBSE(reference, model=model, tokenizer=tokenizer, batch_size=16, max_tokens=300)
+        for i in range(0, 200, 20):
+            reference_embedding = model(**tokenizer([reference[i]], padding=True)).pooler_output[0]
+            target_embedding = model(**tokenizer([targets[i]], padding=True)).pooler_output[0]
+            similarity = reference_embedding @ target_embedding / (np.linalg.norm(reference_embedding) * np.linalg.norm(target_embedding))
+            self.assertAlmostEqual(scores[i], similarity, places=5)
+
+    def test_metric_registry(self):
+        registry = MetricRegistry()
+        loads = []
+        registry.register("words", lambda: loads.append("words") or {"loaded": True})
+        self.assertFalse(registry.is_loaded("words"))
+        #loaded once on first use and then shared
+        self.assertIs(registry.get("words"), registry.get("words"))
+        self.assertEqual(loads, ["words"])
+        registry.release("words")
+        self.assertFalse(registry.is_loaded("words"))
+        registry.warm_up()
+        self.assertTrue(registry.is_loaded("words"))
+        self.assertEqual(loads, ["words", "words"])
+        with self.assertRaises(Exception):
+            registry.get("missing")
+
+    def test_bert_score(self):
+        class Bert:
+            def compute(self, predictions, references, lang):
+                scores = [float(prediction == reference_sentence) for prediction, reference_sentence in zip(predictions, references)]
+                return {"precision": scores, "recall": scores, "f1": scores, "hashcode": "fake_hash"}
+        reference = self.injector.load.get_data()[:10]
+        loader = DataLoader(data=reference[:5] + [sentence.upper() for sentence in reference[5:]], fix_formatting=False)
+        bertscore = metric_registry.loaders["bertscore"]
+        metric_registry.register("bertscore", Bert)
+        try:
+            with tempfile.TemporaryDirectory() as save_path, mock.patch.object(DataLoader, "get_bert_hashcode", return_value="fake_hash"):
+                cache = ScoreCache(save_path+"/scores.sqlite")
+                scores = loader.get_bert_score(reference)
+                #the cached scores have the same shape as bert.compute with the corpus means
+                self.assertEqual(loader.get_bert_score(reference, cache=cache), scores)
+                self.assertEqual(set(scores), {"precision", "recall", "f1", "hashcode", "mean_precision", "mean_recall", "mean_f1"})
+                self.assertEqual(scores["mean_f1"], 0.5)
+                #the scores are cached under the hashcode of the model
+                self.assertEqual(cache.get_many("bertscore", "fake_hash", loader.get_data(), reference)[0], {"precision": 1.0, "recall": 1.0, "f1": 1.0})
+                cache.close()
+        finally:
+            metric_registry.register("bertscore", bertscore)
+
+    def test_score_cache(self):
+        reference = self.injector.load.get_data()[:20]
+        candidates = reference[:10] + [sentence.upper() for sentence in reference[10:]]
+        computed = []
+        def compute(predictions, references):
+            computed.append(len(predictions))
+            return [float(prediction == reference_sentence) for prediction, reference_sentence in zip(predictions, references)]
+        with tempfile.TemporaryDirectory() as save_path:
+            cache = ScoreCache(save_path+"/scores.sqlite", max_entries=25)
+            scores = cache.score("exact", "v1", candidates, reference, compute)
+            self.assertEqual(scores, [1.0] * 10 + [0.0] * 10)
+            #only the new pairs are computed, and a pair that appears twice only once
+            more = candidates[:15] + ["a new sentence", "a new sentence"]
+            self.assertEqual(cache.score("exact", "v1", more, reference[:17], compute), [1.0] * 10 + [0.0] * 7)
+            self.assertEqual(computed, [20, 2])
+            #another model version is a different key, and the cache keeps at most max_entries
+            self.assertEqual(cache.get_many("exact", "v2", candidates[:2], reference[:2]), [None, None])
+            self.assertEqual(cache.get_number_of_entries(), 22)
+            cache.score("exact", "v2", candidates, reference, compute)
+            self.assertEqual(cache.get_number_of_entries(), 25)
+            self.assertEqual(cache.entries, 25)
+            #a null score is a cached score, it is not computed again
+            def compute_none(predictions, references):
+                computed.append(len(predictions))
+                return [None] * len(predictions)
+            computed.clear()
+            for _ in range(2):
+                self.assertEqual(cache.score("none", "v1", candidates[:2], reference[:2], compute_none), [None, None])
+            self.assertEqual(computed, [2])
+            self.assertEqual(cache.lookup(cache.get_keys("none", "v1", candidates[:2], reference[:2]), default=cache.missing), [None, None])
+            cache.close()
+            #the scores are still there for a new connection
+            self.assertEqual(ScoreCache(save_path+"/scores.sqlite").get_many("exact", "v2", candidates[:3], reference[:3]), [1.0] * 3)
+
+    def test_incremental_scores(self):
+        reference = self.injector.load.get_data()[:50]
+        injected, results = self.injector.batch_injector(reference, 0, 0, 0.05, rng=np.random.default_rng(3))
+        scored = []
+        def compute(predictions, references):
+            scored.extend(predictions)
+            return [len(set(prediction.split()) & set(reference_sentence.split())) for prediction, reference_sentence in zip(predictions, references)]
+        baseline = DataLoader(data=reference, fix_formatting=False)
+        baseline_scores = baseline.get_sentence_scores(reference, compute)
+        loader = DataLoader(data=injected, fix_formatting=False)
+        expected = loader.get_sentence_scores(reference, compute)
+        scored.clear()
+        #only the sentences that changed are scored again
+        self.assertEqual(loader.get_sentence_scores(reference, compute, baseline=baseline, baseline_scores=baseline_scores), expected)
+        self.assertEqual(len(scored), results[4])
+        self.assertTrue(0 < len(scored) < 50)
+        #a different source is scored again as well
+        sources = list(reference)
+        sources[0] = "changed"
+        scored.clear()
+        loader.get_sentence_scores(reference, lambda predictions, references, sources: compute(predictions, references), sources=sources,
+                                   baseline=baseline, baseline_scores=baseline_scores, baseline_sources=reference)
+        self.assertEqual(len(scored), results[4] + (injected[0] == reference[0]))
+        #sources and baseline_sources are needed together
+        with self.assertRaises(ValueError):
+            loader.get_sentence_scores(reference, compute, baseline=baseline, baseline_scores=baseline_scores, baseline_sources=reference)
+        with self.assertRaises(ValueError):
+            loader.get_sentence_scores(reference, compute, sources=sources, baseline=baseline, baseline_scores=baseline_scores)
+
+    def test_corpus_reader(self):
+        with tempfile.TemporaryDirectory() as save_path:
+            lines = ['  "Hello , world "  ', "«Bonjour»\r\n", "", "it ’s fine .", '" a "']
+            with open(save_path+"/corpus.txt", "w", encoding="utf-8", newline="") as f:
+                f.write("\n".join(lines))
+            with open(save_path+"/corpus.txt", "r", encoding="utf-8") as f:
+                expected = [DataLoader.fix_format(DataLoader.fix_format(line)) for line in f]
+            #small chunks split lines in the middle
+            self.assertEqual(CorpusReader(chunk_size=7).read(save_path+"/corpus.txt"), expected)
+            self.assertEqual(CorpusReader(chunk_size=7, workers=2).read(save_path+"/corpus.txt"), expected)
+            loader = DataLoader(path=save_path+"/corpus.txt", cache_dir=save_path+"/cache")
+            self.assertEqual(loader.get_data(), expected)
+            cache_path = CorpusReader(cache_dir=save_path+"/cache").get_cache_path(save_path+"/corpus.txt")
+            self.assertTrue(os.path.exists(cache_path))
+            self.assertEqual(DataLoader(path=save_path+"/corpus.txt", cache_dir=save_path+"/cache").get_data(), expected)
+            #a changed file gets a new cache
+            with open(save_path+"/corpus.txt", "a", encoding="utf-8") as f:
+                f.write("\nmore")
+            self.assertEqual(DataLoader(path=save_path+"/corpus.txt", cache_dir=save_path+"/cache").get_data(), expected + ["more"])
+            #the same bytes as txt and csv have their own cache
+            for name in ["same.txt", "same.csv"]:
+                with open(save_path+"/"+name, "w", encoding="utf-8") as f:
+                    f.write("a,b\n")
+            reader = CorpusReader(cache_dir=save_path+"/cache")
+            self.assertEqual(reader.read(save_path+"/same.txt"), ["a,b"])
+            self.assertEqual(reader.read(save_path+"/same.csv"), ["a"])
+
+    def test_evaluation_runner(self):
+        with tempfile.TemporaryDirectory() as save_path:
+            reference = ["le chat est noir", "il fait beau"]
+            DataLoader(data=reference).save_as_txt(save_path+"/reference.txt")
+            files = {"v1/aws/fr.wmt14_en_p_homophone_0.0_p_letter_0.0_p_confusing_word_0.0.txt": ["le chat est noir", "il fait beau"],
+                     "v1/aws/fr.wmt14_en_p_homophone_0.1_p_letter_0.0_p_confusing_word_0.0.txt": ["le chien est noir", "il fait beau"],
+                     "v2/gpt/gpt_confusing_letter_2.5.txt": ["le chat", "il fait très beau"],
+                     "v2/gpt/notes.txt": ["not a translation"],
+                     "v2/default files/wmt14_en_p_homophone_0_p_letter_0.025_p_confusing_word_0.txt": ["the cat is black", "it is nice"]}
+            for path, data in files.items():
+                os.makedirs(os.path.dirname(save_path+"/output/"+path), exist_ok=True)
+                DataLoader(data=data).save_as_txt(save_path+"/output/"+path)
+            runner = EvaluationRunner(root=save_path+"/output", reference=save_path+"/reference.txt", metrics=["edit_distance"],
+                                      workers={"edit_distance": 2})
+            tasks = runner.discover()
+            self.assertEqual(tasks[["version", "service"]].values.tolist(), [["v1", "aws"], ["v1", "aws"], ["v2", "gpt"]])
+            self.assertEqual(tasks[["p_homophone", "p_letter", "p_confusing_word"]].values.tolist(), [[0, 0, 0], [0.1, 0, 0], [0, 0.025, 0]])
+            self.assertEqual(runner.get_source(tasks.iloc[2]), ["the cat is black", "it is nice"])
+            df = runner.run(save_path+"/results.csv")
+            self.assertEqual(df["edit_distance"].tolist(), [0, 1, 3])
+            self.assertEqual(df["substitutions"].tolist(), [0, 1, 0])
+            self.assertTrue(os.path.exists(save_path+"/results.csv"))
+
+    def test_arrow_corpus(self):
+        sentences = self.injector.load.get_data()
+        loader = DataLoader(data=sentences, fix_formatting=False, backend="arrow")
+        self.assertIsInstance(loader.data, ArrowCorpus)
+        self.assertEqual(loader.data, sentences)
+        self.assertLess(loader.data.get_nbytes(), sum(len(sentence.encode("utf-8")) + 8 for sentence in sentences))
+        #slices and shards share the buffers
+        self.assertEqual(loader.data[10:20].to_list(), sentences[10:20])
+        self.assertEqual([sentence for i in range(3) for sentence in loader.data.shard(3, i)], sentences)
+        self.assertEqual(loader.data[-1], sentences[-1])
+        #copies can be changed without changing the original
+        copy_loader = loader.create_deepcopy()
+        copy_loader.data[0] = "changed"
+        self.assertEqual(copy_loader.data[:2].to_list(), ["changed", sentences[1]])
+        self.assertEqual(loader.data[0], sentences[0])
+        out_sentences, _ = self.injector.batch_injector(loader.get_tokenized(), 0.2, 0.05, 0.2, rng=np.random.default_rng(3))
+        expected, _ = self.injector.batch_injector(sentences, 0.2, 0.05, 0.2, rng=np.random.default_rng(3))
+        self.assertEqual(out_sentences, expected)
+        self.assertEqual(ArrowCorpus.from_dataset(loader.data.to_dataset()), loader.data)
+        #a shuffled or selected dataset keeps its rows in the order of its indices mapping
+        shuffled = loader.data.to_dataset().shuffle(seed=0).select(range(100))
+        self.assertEqual(ArrowCorpus.from_dataset(shuffled).to_list(), shuffled["text"])
+        #the tokenized corpus keeps the buffers and is only rebuilt after a change, which is counted without comparing the sentences
+        arrow_loader = DataLoader(data=sentences, fix_formatting=False, backend="arrow")
+        tokenized = arrow_loader.get_tokenized()
+        self.assertIsInstance(tokenized.sentences, ArrowCorpus)
+        arrow_loader.data.to_list = None
+        self.assertIs(arrow_loader.get_tokenized(), tokenized)
+        self.assertIs(arrow_loader.create_deepcopy().get_tokenized(), tokenized)
+        del arrow_loader.data.to_list
+        arrow_loader.data[:] = ["the cat is black"] + sentences[1:]
+        self.assertEqual(arrow_loader.data.version, 1)
+        self.assertEqual(arrow_loader.get_tokenized().tokens[:4], ["the", "cat", "is", "black"])
+        self.assertEqual(tokenized.tokens[:4], sentences[0].split()[:4])
+        with tempfile.TemporaryDirectory() as save_path:
+            loader.data.save(save_path+"/corpus.arrow")
+            self.assertEqual(DataLoader(data=ArrowCorpus.load(save_path+"/corpus.arrow"), fix_formatting=False).data, sentences)
+
+    def test_corpus_statistics(self):
+        loader = self.injector.load.create_deepcopy()
+        sentences = loader.get_data()
+        statistics = loader.get_statistics(injector=self.injector)
+        self.assertIs(loader.get_statistics(), statistics)
+        #the statistics are kept for the data object and version they were built from, the sentences are never compared
+        self.assertIs(loader.statistics_state[0], loader.data)
+        self.assertEqual(loader.get_number_of_words(), sum([len(sentence.split()) for sentence in sentences]))
+        self.assertEqual(loader.get_number_of_letters(), sum([len(re.sub(r'[^\w\s]','',sentence)) for sentence in sentences]))
+        for i in range(0, len(sentences), 97):
+            keys = [word.lower().strip('".,?!:;()').strip("'") for word in sentences[i].split()]
+            homophones, confusing_words = self.injector.get_eligibility(keys)
+            self.assertEqual(statistics.homophone_eligible[i], int(np.sum(homophones)))
+            self.assertEqual(statistics.confusing_word_eligible[i], int(np.sum(confusing_words)))
+        #stratified queries
+        long_sentences = statistics.query("words > 30 and homophone_eligible >= 3")
+        self.assertTrue(all(len(sentences[i].split()) > 30 for i in long_sentences))
+        self.assertEqual(list(long_sentences), [i for i in statistics.select("words", min=31) if statistics.homophone_eligible[i] >= 3])
+        self.assertEqual(loader.get_subset(long_sentences).get_number_of_words(), int(statistics.words[long_sentences].sum()))
+        #the statistics are built again when the data changes
+        loader.data[0] = loader.data[0] + " extra words"
+        self.assertEqual(loader.get_number_of_words(), statistics.get_total("words") + 2)
+        #in place changes of a list assigned to data are counted too
+        loader.data = [sentence for sentence in loader.data]
+        self.assertEqual(loader.get_number_of_words(), statistics.get_total("words") + 2)
+        loader.data.append("two words")
+        self.assertEqual(loader.get_number_of_words(), statistics.get_total("words") + 4)
+        self.assertIsNone(CorpusStatistics(sentences).homophone_eligible)
+
+    def test_translation_client(self):
+        sentences = self.injector.load.get_data()[:500]
+        server = TranslationStubServer(latency=0.01, failure_rate=0.2, max_concurrent=4, max_sentences=40)
+        url = server.start()
+        try:
+            provider = StubProvider(url=url, max_sentences=40, max_characters=4000, concurrency=6, requests_per_second=500, burst=10)
+            client = TranslationClient([provider], backoff=0.01)
+            batches = client.get_batches(provider, sentences)
+            self.assertTrue(all(len(batch) <= 40 and (len(batch) == 1 or sum(map(len, batch)) <= 4000) for _, batch in batches))
+            #failed and rejected requests are retried until every batch is translated, in order
+            self.assertEqual(client.translate(sentences, "stub"), [f"[fr] {sentence}" for sentence in sentences])
+            self.assertGreater(client.statistics["stub"]["retries"], 0)
+            self.assertLessEqual(server.statistics["max_concurrent"], 4)
+            with tempfile.TemporaryDirectory() as save_path:
+                DataLoader(data=sentences, fix_formatting=False).save_as_txt(save_path+"/wmt14_en_p_homophone_0.2_p_letter_0.0_p_confusing_word_0.0.txt")
+                df = client.run([save_path], save_path+"/out")
+                out_path = save_path+"/out/stub/fr.wmt14_en_p_homophone_0.2_p_letter_0.0_p_confusing_word_0.0.txt"
+                self.assertEqual(df["out_path"].tolist(), [out_path])
+                self.assertEqual(DataLoader(path=out_path).get_data(), [f"[fr] {sentence}" for sentence in sentences])
+                #requests that are too large are not retried
+                provider.max_sentences, provider.max_characters = 100, 100000
+                with self.assertRaises(Exception):
+                    client.translate(sentences, "stub")
+        finally:
+            server.stop()
+        #a batch that fails for good cancels the other batches of the sentences
+        cancelled = []
+        class FailingClient(TranslationClient):
+            async def request(self, provider, sentences):
+                if sentences[0] == "bad":
+                    raise Exception("bad request")
+                try:
+                    await asyncio.sleep(10)
+                except asyncio.CancelledError:
+                    cancelled.append(sentences[0])
+                    raise
+        provider = StubProvider(url="http://127.0.0.1:1", max_sentences=1)
+        async def send():
+            with self.assertRaises(Exception):
+                await FailingClient([provider]).send(["a", "bad", "b"], provider)
+            #the other batches are cancelled before the error is raised, not when the event loop is closed
+            return list(cancelled)
+        self.assertEqual(sorted(asyncio.run(send())), ["a", "b"])
+        #penalties of concurrent requests do not add up
+        bucket = TokenBucket(rate=100, capacity=1)
+        async def penalize_and_acquire():
+            for _ in range(10):
+                bucket.penalize(0.1)
+            await bucket.acquire()
+        start = time.perf_counter()
+        asyncio.run(penalize_and_acquire())
+        self.assertLess(time.perf_counter() - start, 0.5)
+
+    def test_translation_memo(self):
+        clean = self.injector.load.get_data()[:300]
+        injected = list(clean)
+        injected[5] = injected[5] + " extra"
+        injected[7] = injected[7] + " words"
+        server = TranslationStubServer()
+        url = server.start()
+        try:
+            with tempfile.TemporaryDirectory() as save_path:
+                memo = TranslationMemo(save_path+"/memo.sqlite")
+                client = TranslationClient([StubProvider(url=url)], memo=memo)
+                #files translated at the same time send shared sentences once
+                DataLoader(data=clean, fix_formatting=False).save_as_txt(save_path+"/clean.txt")
+                DataLoader(data=injected, fix_formatting=False).save_as_txt(save_path+"/injected.txt")
+                client.run([save_path+"/clean.txt", save_path+"/injected.txt"], save_path+"/out")
+                self.assertEqual(server.statistics["sentences"], len(set(clean + injected)))
+                self.assertEqual(DataLoader(path=save_path+"/out/stub/fr.injected.txt").get_data(), [f"[fr] {sentence}" for sentence in injected])
+                #only sentences that were never translated are sent, whitespace differences are normalized
+                injected[9] = injected[9] + " again"
+                injected[11] = "  " + injected[11]
+                self.assertEqual(client.translate(injected, "stub")[9], f"[fr] {injected[9]}")
+                self.assertEqual(server.statistics["sentences"], len(set(clean + injected)) - 1)
+                self.assertEqual(memo.get_number_of_entries(), len(set(clean + injected)) - 1)
+                #other models and languages are kept apart
+                self.assertEqual(memo.get_many(("stub", "stub", "en", "de"), clean[:2]), [None, None])
+                memo.close()
+        finally:
+            server.stop()
+
+    def test_corpus_scorer(self):
+        reference = ["le chat est noir.", "il fait beau", "Bonjour, le monde!"]
+        scorer = CorpusScorer(reference)
+        self.assertEqual(scorer.tokenize("Bonjour, le monde!"), ("Bonjour", ",", "le", "monde", "!"))
+        scores = scorer.score(reference)
+        self.assertEqual((scores["bleu"]["bleu"], scores["chrf"]["score"], scores["wer"]), (1.0, 100.0, 0.0))
+        loader = DataLoader(data=["le chien est noir.", "il fait très beau", "Bonjour, le monde!"], fix_formatting=False)
+        self.assertAlmostEqual(loader.get_wer(reference, engine="native"), 2 / 10, places=12)
+        self.assertIs(DataLoader.get_scorer(reference), DataLoader.get_scorer(reference))
+        #n-gram matches and lengths are the same as the counts of compute_bleu, used by evaluate
+        reference = DataLoader(path="wmt14_fr.txt").get_data()[:300]
+        candidates = DataLoader(path="output_data/v2/aws/fr.wmt14_en_p_homophone_0.35_p_letter_0.0_p_confusing_word_0.0.txt").get_data()[:300]
+        matches, possible = [0] * 4, [0] * 4
+        for reference_sentence, sentence in zip(reference, candidates):
+            reference_tokens, tokens = scorer.tokenize(reference_sentence), scorer.tokenize(sentence)
+            for n in range(1, 5):
+                reference_ngrams = Counter(reference_tokens[i:i+n] for i in range(len(reference_tokens) - n + 1))
+                ngrams = Counter(tokens[i:i+n] for i in range(len(tokens) - n + 1))
+                matches[n-1] += sum((ngrams & reference_ngrams).values())
+                possible[n-1] += max(len(tokens) - n + 1, 0)
+        bleu = DataLoader(data=candidates, fix_formatting=False).get_bleue_score(reference, engine="native")
+        self.assertEqual(bleu["precisions"], [m / p for m, p in zip(matches, possible)])
+        self.assertGreater(bleu["bleu"], 0.2)
+        scores = CorpusScorer(reference).score(candidates)
+        self.assertEqual(len(scores["sentences"]), 300)
+        self.assertAlmostEqual(scores["chrf"]["score"], DataLoader(data=candidates, fix_formatting=False).get_chrf_score(reference, engine="native")["score"])
+        self.assertTrue(((scores["sentences"]["chrf"] >= 0) & (scores["sentences"]["chrf"] <= 100)).all())
+
+    def test_corpus_scorer_against_evaluate(self):
+        #the evaluate metrics are downloaded on first use, so the comparison only runs where they can be loaded
+        metrics = []
+        for name in ["bleu", "chrf", "wer"]:
+            try:
+                metric_registry.get(name)
+                metrics.append(name)
+            except Exception:
+                continue
+        if len(metrics) == 0:
+            self.skipTest("the evaluate bleu, chrf and wer metrics cannot be loaded")
+        reference = DataLoader(path="wmt14_fr.txt").get_data()
+        for condition in ["p_homophone_0.35_p_letter_0.0_p_confusing_word_0.0", "p_homophone_0.0_p_letter_0.05_p_confusing_word_0.0",
+                          "p_homophone_0.0_p_letter_0.0_p_confusing_word_0.35"]:
+            path = f"output_data/v2/aws/fr.wmt14_en_{condition}.txt"
+            loader = DataLoader(path=path)
+            with self.subTest(path=path):
+                if "bleu" in metrics:
+                    native, expected = loader.get_bleue_score(reference, engine="native"), loader.get_bleue_score(reference)
+                    for key in ["bleu", "brevity_penalty", "length_ratio"]:
+                        self.assertLess(abs(native[key] - expected[key]), 1e-9)
+                    self.assertTrue(np.allclose(native["precisions"], expected["precisions"], rtol=0, atol=1e-9))
+                    self.assertEqual((native["translation_length"], native["reference_length"]), (expected["translation_length"], expected["reference_length"]))
+                if "chrf" in metrics:
+                    self.assertLess(abs(loader.get_chrf_score(reference, engine="native")["score"] - loader.get_chrf_score(reference)["score"]), 1e-9)
+                if "wer" in metrics:
+                    self.assertLess(abs(loader.get_wer(reference, engine="native") - loader.get_wer(reference)), 1e-9)
+
+    def test_significance_tester(self):
+        rng = np.random.default_rng(0)
+        clean = rng.normal(0.8, 0.1, size=(500, 2, 1))
+        #no change, a small drop and a large drop
+        scores = np.concatenate([clean, clean + rng.normal(0, 0.05, size=(500, 2, 1)), clean - 0.05 + rng.normal(0, 0.05, size=(500, 2, 1))], axis=2)
+        tester = SignificanceTester(scores, systems=["aws", "gpt"], conditions=["clean", "noise", "injected"], n_resamples=2000, chunk_size=300)
+        df = tester.run().set_index(["system", "condition"])
+        self.assertEqual(len(df), 4)
+        self.assertTrue((df.loc[(slice(None), "injected"), "ci_high"] < 0).all())
+        self.assertTrue((df.loc[(slice(None), "injected"), "p_randomization"] < 0.01).all())
+        self.assertTrue((df["ci_low"] <= df["delta"]).all() and (df["delta"] <= df["ci_high"]).all())
+        #the resamples do not depend on the chunk size and are the means over the drawn sentences
+        resamples = SignificanceTester(scores, n_resamples=700, chunk_size=700).bootstrap()
+        self.assertTrue(np.allclose(SignificanceTester(scores, n_resamples=700, chunk_size=64).bootstrap(), resamples))
+        indices = tester.get_indices(0, 700)
+        self.assertTrue(np.allclose((scores - scores[:, :, [0]])[indices].mean(axis=1), resamples))
+        frame = pd.DataFrame([{"sentence": i, "service": system, "condition": condition, "score": scores[i, s, c]}
+                              for i in range(500) for s, system in enumerate(["aws", "gpt"]) for c, condition in enumerate(["clean", "noise", "injected"])])
+        from_frame = SignificanceTester.from_frame(frame, "score", baseline="clean", n_resamples=2000, chunk_size=300).run()
+        self.assertTrue(np.allclose(from_frame.set_index(["system", "condition"]).loc[df.index, "ci_low"], df["ci_low"]))
+
+    def test_edit_log(self):
+        sentences = self.injector.load.get_data()[:500]
+        edit_log = EditLog()
+        out_sentences, results = self.injector.batch_injector(sentences, 0.2, 0.05, 0.2, rng=np.random.default_rng(3), edit_log=edit_log)
+        df = edit_log.to_frame()
+        self.assertEqual(len(df[["sentence", "token"]].drop_duplicates()), results[3])
+        self.assertEqual((df["edit_type"] == "homophone").sum(), results[0])
+        self.assertEqual((df["edit_type"] == "confusing_word").sum(), results[2])
+        self.assertEqual(df["letters"].apply(len).sum(), results[1])
+        #every edit points at its word in the original and the injected sentence
+        for row in df.itertuples():
+            self.assertEqual(sentences[row.sentence].split()[row.token], row.original)
+            self.assertEqual(out_sentences[row.sentence].split()[row.token], row.replacement)
+        #logging does not change the injection
+        self.assertEqual(self.injector.batch_injector(sentences, 0.2, 0.05, 0.2, rng=np.random.default_rng(3))[0], out_sentences)
+        #the sentence engine logs the same way
+        loader = DataLoader(data=sentences[:100], dataset_name="wmt14_en")
+        edit_log = EditLog()
+        loader, results = self.injector.injection_runner(loader, 0.2, 0.05, 0.2, engine="sentence", edit_log=edit_log)
+        self.assertEqual(len(set(zip(edit_log.sentences, edit_log.tokens))), results[3])
+        for sentence, token, replacement in zip(edit_log.sentences, edit_log.tokens, edit_log.replacements):
+            self.assertEqual(loader.get_data()[sentence].split()[token], replacement)
+        with self.assertRaises(Exception):
+            edit_log.add(0, 0, "typo", "a", "b")
+        small_injector = DyslexiaInjector(load=DataLoader(data=sentences[:50], dataset_name="wmt14_en"), seed=3)
+        with tempfile.TemporaryDirectory() as save_path:
+            small_injector.injection_swap(p_start=0, p_end=0.1, step_size=0.1, save_path=save_path+"/", save_format="txt", log_edits=True, coupled=True)
+            path = os.path.join(save_path, "wmt14_en_p_homophone_0.1_p_letter_0.1_p_confusing_word_0.1.edits.parquet")
+            saved = EditLog.load(path)
+            self.assertGreater(len(saved), 0)
+            self.assertEqual(list(saved.columns), ["sentence", "token", "edit_type", "original", "replacement", "letters"])
+            with open(os.path.join(save_path, "wmt14_en_p_homophone_0.1_p_letter_0.1_p_confusing_word_0.1.txt"), encoding="utf-8") as f:
+                injected = f.read().split("\n")
+            for row in saved.itertuples():
+                self.assertEqual(injected[row.sentence].split()[row.token], row.replacement)
+            #the clean cell has an empty log
+            self.assertEqual(len(EditLog.load(os.path.join(save_path, "wmt14_en_p_homophone_0.0_p_letter_0.0_p_confusing_word_0.0.edits.parquet"))), 0)
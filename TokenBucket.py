@@ -0,0 +1,72 @@
+import time
+import asyncio
+class TokenBucket:
+    """
+    Asyncio token bucket that limits the number of requests sent to a translation service (see TranslationProvider).
+    The bucket holds at most capacity tokens and gets rate tokens per second, every request takes one token and waits until
+    one is available, so short bursts of up to capacity requests are sent right away and longer runs are limited to rate requests per second.
+    ...
+    Attributes
+    ----------
+    rate: float
+        Number of tokens added per second, None for no limit
+    capacity: float
+        Maximum number of tokens in the bucket
+    tokens: float
+        Number of tokens in the bucket
+    updated: float
+        Time the tokens were last counted, it is in the future while the bucket is blocked by penalize
+    ...
+    Methods
+    -------
+    acquire(tokens=1)
+        Waits until there are enough tokens and takes them
+    penalize(seconds)
+        Empties the bucket and stops handing out tokens for some seconds, e.g. after a service answered with Retry-After.
+        Penalties of concurrent requests do not add up, the bucket is blocked until the latest of them ends
+
+    Usage
+    -------
+    >>> bucket = TokenBucket(rate=10, capacity=20)
+    >>> await bucket.acquire()
+    """
+    def __init__(self, rate=None, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate or 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = None
+        self.loop = None
+
+    def refill(self):
+        now = time.monotonic()
+        #no tokens are added while the bucket is blocked
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    async def acquire(self, tokens=1):
+        if self.rate is None:
+            return
+        if tokens > self.capacity:
+            raise Exception(f"Cannot take {tokens} tokens from a bucket with a capacity of {self.capacity}")
+        #the lock belongs to the event loop that uses it, so the bucket can be made outside of it and used by several asyncio.run
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            self.lock = asyncio.Lock()
+            self.loop = loop
+        #waiting requests are served in order, the lock is held while waiting so later requests cannot take the tokens first
+        async with self.lock:
+            self.refill()
+            while self.tokens < tokens:
+                await asyncio.sleep(max(0.0, self.updated - time.monotonic()) + (tokens - self.tokens) / self.rate)
+                self.refill()
+            self.tokens -= tokens
+
+    def penalize(self, seconds):
+        if self.rate is None:
+            return
+        #the bucket is empty until the penalty ends, a shorter penalty does not shorten a longer one
+        self.refill()
+        self.tokens = 0.0
+        self.updated = max(self.updated, time.monotonic() + seconds)
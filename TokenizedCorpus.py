@@ -0,0 +1,98 @@
+import re
+import numpy as np
+from ArrowCorpus import ArrowCorpus
+class TokenizedCorpus:
+    """
+    Tokenized version of a list of sentences. It is built once per DataLoader (see DataLoader.get_tokenized) and reused by
+    DyslexiaInjector.batch_injector for every cell of a sweep, so the words are only split, stripped and lower-cased once.
+    ...
+    Attributes
+    ----------
+    sentences: list
+        The sentences the corpus was built from, a copy that shares the buffers for an ArrowCorpus
+    tokens: list
+        All words of all sentences as split by str.split
+    sentence_offsets: np.ndarray
+        Index of the first token of every sentence, the last entry is the number of tokens
+    sentence_index: np.ndarray
+        Index of the sentence of every token
+    keys: list
+        Normalized key of every token (lower case with the punctuation stripped), used to look up the dictionaries
+    vocabulary: list
+        The unique keys
+    key_ids: np.ndarray
+        Index into vocabulary of every token
+    letter_offsets: np.ndarray
+        Index of the first letter of every key in letter_codes, the last entry is the number of letters
+    letter_codes: np.ndarray
+        Unicode code points of all keys one after the other
+    letter_token: np.ndarray
+        Index of the token of every letter in letter_codes
+    first_letter: np.ndarray
+        True for every letter in letter_codes that is the first letter of its key
+    punctuation_offsets: np.ndarray
+        Index of the first punctuation mark of every token in punctuation_index and punctuation_marks
+    punctuation_index: np.ndarray
+        Position of every punctuation mark within its token
+    punctuation_marks: list
+        Every punctuation mark
+    plain: np.ndarray
+        True for every token that is an ascii word optionally followed by one punctuation mark
+    ...
+    Methods
+    -------
+    get_punctuation(t)
+        Returns the punctuation of token t in the same format as DyslexiaInjector.get_punctuation
+    snapshot(sentences)
+        Returns a copy of sentences that later changes to sentences do not affect, an ArrowCorpus is not turned into python strings
+    matches(sentences)
+        Returns True if the corpus was built from these sentences, this compares every sentence
+    get_number_of_tokens()
+        Returns the number of tokens
+    """
+    punctuation_regex = re.compile(r"""["'.,?!:;()]""")
+
+    def __init__(self, sentences):
+        self.sentences = self.snapshot(sentences)
+        words = [sentence.split() for sentence in self.sentences]
+        self.tokens = [word for sentence_words in words for word in sentence_words]
+        n_tokens = len(self.tokens)
+        self.sentence_offsets = np.zeros(len(words)+1, dtype=np.int64)
+        np.cumsum([len(sentence_words) for sentence_words in words], out=self.sentence_offsets[1:])
+        self.sentence_index = np.repeat(np.arange(len(words)), np.diff(self.sentence_offsets))
+        #same normalization as DyslexiaInjector.word_injector
+        self.keys = [token.lower().strip('".,?!:;()').strip("'") for token in self.tokens]
+        self.vocabulary, key_ids = np.unique(np.array(self.keys, dtype=object), return_inverse=True)
+        self.vocabulary = self.vocabulary.tolist()
+        self.key_ids = key_ids.astype(np.int64)
+        key_lengths = np.fromiter((len(key) for key in self.keys), dtype=np.int64, count=n_tokens)
+        self.letter_offsets = np.zeros(n_tokens+1, dtype=np.int64)
+        np.cumsum(key_lengths, out=self.letter_offsets[1:])
+        self.letter_codes = np.frombuffer("".join(self.keys).encode("utf-32-le"), dtype=np.uint32)
+        self.letter_token = np.repeat(np.arange(n_tokens), key_lengths)
+        self.first_letter = np.zeros(self.letter_offsets[-1], dtype=bool)
+        self.first_letter[self.letter_offsets[:-1][key_lengths > 0]] = True
+        #punctuation of every token, flattened
+        punctuation = [[(match.start(), match.group()) for match in self.punctuation_regex.finditer(token)] for token in self.tokens]
+        self.punctuation_offsets = np.zeros(n_tokens+1, dtype=np.int64)
+        np.cumsum([len(token_punctuation) for token_punctuation in punctuation], out=self.punctuation_offsets[1:])
+        self.punctuation_index = np.array([index for token_punctuation in punctuation for index, _ in token_punctuation], dtype=np.int64)
+        self.punctuation_marks = [mark for token_punctuation in punctuation for _, mark in token_punctuation]
+        #tokens whose letters can be swapped in place, batch_injector copies the case of every swapped letter from the token
+        self.plain = np.fromiter((token.isascii() and token[:-1].isalpha() and (token[-1].isalpha() or token[-1] in '".,?!:;()')
+                                  for token in self.tokens), dtype=bool, count=n_tokens)
+
+    def get_punctuation(self, t):
+        start, end = self.punctuation_offsets[t], self.punctuation_offsets[t+1]
+        return [(int(self.punctuation_index[i]), self.punctuation_marks[i]) for i in range(start, end)]
+
+    @staticmethod
+    def snapshot(sentences):
+        return sentences.copy() if isinstance(sentences, ArrowCorpus) else list(sentences)
+
+    def matches(self, sentences):
+        #list comparison checks identity first, so this is fast for copies that share the same strings
+        return self.sentences == sentences
+
+    def get_number_of_tokens(self):
+        return len(self.tokens)
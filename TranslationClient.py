@@ -0,0 +1,301 @@
+import os
+import time
+import random
+import asyncio
+import argparse
+import aiohttp
+import pandas as pd
+from DataLoader import DataLoader
+from TranslationProvider import TranslationProvider
+from TranslationMemo import TranslationMemo
+class TranslationClient:
+    """
+    Translates injected files with one or more translation services (see TranslationProvider) and saves the translations in the layout of
+    output_data, e.g. "default files/wmt14_en_p_homophone_0.2_p_letter_0.0_p_confusing_word_0.0.txt" is saved as
+    azure/fr.wmt14_en_p_homophone_0.2_p_letter_0.0_p_confusing_word_0.0.txt.
+    Everything runs on one asyncio event loop: the sentences of a file are split into batches that fit in one request, all batches of all
+    files and services are sent concurrently over one pool of connections, and every service is limited by its own number of concurrent
+    requests and token bucket. Failed requests (connection errors, timeouts, 429 and 5xx) are retried with exponential backoff and jitter,
+    respecting Retry-After. With a TranslationMemo only sentences a service never translated are sent, and the files are assembled from
+    the memo. Translations are saved under a temporary name first so a stopped run never leaves half a file, and files
+    that are already translated are skipped, so a run can be resumed.
+    ...
+    Attributes
+    ----------
+    providers: dict
+        The providers by name
+    connections: int
+        Maximum number of open connections over all services
+    max_files: int
+        Maximum number of files that are loaded and translated at the same time
+    max_retries: int
+        Number of times a failed request is retried
+    backoff: float
+        Seconds to wait before the first retry, doubled for every retry up to max_backoff
+    timeout: float
+        Seconds a request may take
+    memo: TranslationMemo
+        Memo of translations, only sentences that are not in it are sent to a service, None to send all sentences
+    statistics: dict
+        Number of requests, retries, sentences and characters sent to every service and of sentences taken from the memo
+    ...
+    Methods
+    -------
+    get_batches(provider, sentences)
+        Returns the (indices, sentences) of the batches of a list of sentences, every batch is translated with one request
+    get_output_path(provider, path, out_folder)
+        Returns the path the translation of a file is saved to
+    translate(sentences, provider)
+        Returns the translations of a list of sentences
+    translate_files(paths, out_folder, overwrite=False)
+        Translates files with all providers and returns a DataFrame with one row per file and provider
+    run(paths, out_folder, overwrite=False)
+        Synchronous version of translate_files, paths can also be folders
+
+    Usage
+    -------
+    >>> client = TranslationClient([TranslationProvider.create("azure", requests_per_second=10), TranslationProvider.create("google")])
+    >>> client.run(["output_data/v2/default files"], "output_data/v3")
+    python TranslationClient.py --providers azure google --inputs "output_data/v2/default files" --out output_data/v3 --rate azure=10 --memo translation_memo.sqlite
+    """
+    retry_statuses = {408, 429, 500, 502, 503, 504}
+
+    def __init__(self, providers, connections=32, max_files=8, max_retries=5, backoff=0.5, max_backoff=30.0, timeout=120.0, memo=None):
+        self.providers = {provider.name: provider for provider in providers}
+        self.connections = connections
+        self.max_files = max_files
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.memo = memo
+        #futures of the sentences that are being translated, so files translated at the same time send a sentence only once
+        self.in_flight = {}
+        self.statistics = {name: {"requests": 0, "retries": 0, "sentences": 0, "characters": 0, "cached": 0} for name in self.providers}
+        self.session = None
+        self.semaphores = None
+
+    def get_batches(self, provider, sentences):
+        batches = []
+        indices, batch, characters = [], [], 0
+        for i, sentence in enumerate(sentences):
+            #empty lines are not sent, their translation is empty
+            if sentence.strip() == "":
+                continue
+            if batch and (len(batch) >= provider.max_sentences or characters + len(sentence) > provider.max_characters):
+                batches.append((indices, batch))
+                indices, batch, characters = [], [], 0
+            indices.append(i)
+            batch.append(sentence)
+            characters += len(sentence)
+        if batch:
+            batches.append((indices, batch))
+        return batches
+
+    @staticmethod
+    def get_output_path(provider, path, out_folder):
+        name = os.path.splitext(os.path.basename(path))[0]
+        return os.path.join(out_folder, provider.name, f"{provider.target}.{name}.txt")
+
+    @staticmethod
+    def get_retry_after(headers):
+        #seconds in the Retry-After header, dates are not used by translation services
+        try:
+            return max(0.0, float(headers.get("Retry-After", 0)))
+        except ValueError:
+            return 0.0
+
+    def get_delay(self, attempt, retry_after=0.0):
+        #jitter so retries of many batches do not all hit the service at the same time
+        return max(retry_after, random.uniform(0.5, 1.0) * min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    async def request(self, provider, sentences):
+        statistics = self.statistics[provider.name]
+        error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt > 0:
+                statistics["retries"] += 1
+            retry_after, status, body = 0.0, None, None
+            await provider.bucket.acquire()
+            async with self.semaphores[provider.name]:
+                request = provider.get_request(sentences)
+                statistics["requests"] += 1
+                try:
+                    async with self.session.request(request["method"], request["url"], params=request["params"], headers=request["headers"],
+                                                    json=request["json"]) as response:
+                        status = response.status
+                        if status == 200:
+                            body = await response.json(content_type=None)
+                        else:
+                            retry_after = self.get_retry_after(response.headers)
+                            error = f"{provider.name} answered {response.status}: {(await response.text())[:200]}"
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                    status, body = None, None
+                    error = f"{provider.name} request failed: {type(e).__name__} {e}"
+            if status == 200:
+                try:
+                    translations = provider.parse_response(body, sentences)
+                except Exception as e:
+                    translations = None
+                    error = f"{provider.name} sent an invalid response: {e}"
+                if translations is not None and len(translations) == len(sentences):
+                    statistics["sentences"] += len(sentences)
+                    statistics["characters"] += sum(len(sentence) for sentence in sentences)
+                    return translations
+                if translations is not None:
+                    error = f"{provider.name} returned {len(translations)} translations for {len(sentences)} sentences"
+            elif status is not None and status not in self.retry_statuses:
+                raise Exception(error)
+            if attempt < self.max_retries:
+                #the service asked to slow down, so the other requests to it wait as well
+                if retry_after > 0:
+                    provider.bucket.penalize(retry_after)
+                await asyncio.sleep(self.get_delay(attempt, retry_after))
+        raise Exception(f"{error}, gave up after {self.max_retries + 1} attempts")
+
+    async def send(self, sentences, provider):
+        translations = [""] * len(sentences)
+        batches = self.get_batches(provider, sentences)
+        tasks = [asyncio.ensure_future(self.request(provider, batch)) for _, batch in batches]
+        try:
+            results = await asyncio.gather(*tasks)
+        except BaseException:
+            #a batch failed for good, so the other batches of these sentences are not needed anymore
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        for (indices, _), batch_translations in zip(batches, results):
+            for i, translation in zip(indices, batch_translations):
+                #one translation per line
+                translations[i] = " ".join(translation.split("\n"))
+        return translations
+
+    async def translate_sentences(self, sentences, provider):
+        if self.memo is None:
+            return await self.send(sentences, provider)
+        keys = self.memo.get_keys(provider, sentences)
+        translations = self.memo.lookup(keys, default=self.memo.missing)
+        #sentences that are not in the memo, each sent once, and sentences another file is already waiting for
+        missing, waiting = {}, {}
+        for i, key in enumerate(keys):
+            if translations[i] is not self.memo.missing or key in missing or key in waiting:
+                continue
+            if key in self.in_flight:
+                waiting[key] = self.in_flight[key]
+            else:
+                missing[key] = i
+        loop = asyncio.get_running_loop()
+        for key in missing:
+            self.in_flight[key] = loop.create_future()
+        try:
+            missing_sentences = [sentences[i] for i in missing.values()]
+            sent = await self.send(missing_sentences, provider)
+            self.memo.put_many(provider, missing_sentences, sent)
+            translated = dict(zip(missing, sent))
+            for key, translation in translated.items():
+                self.in_flight[key].set_result(translation)
+        except BaseException as e:
+            for key in missing:
+                if not self.in_flight[key].done():
+                    self.in_flight[key].set_exception(e)
+                    #marks the exception as retrieved, it is raised here and in the files that wait for it
+                    self.in_flight[key].exception()
+            raise
+        finally:
+            for key in missing:
+                del self.in_flight[key]
+        for key, future in waiting.items():
+            translated[key] = await future
+        self.statistics[provider.name]["cached"] += len(sentences) - len(missing)
+        return [translated[keys[i]] if translation is self.memo.missing else translation for i, translation in enumerate(translations)]
+
+    async def open(self):
+        connector = aiohttp.TCPConnector(limit=self.connections)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout))
+        self.semaphores = {name: asyncio.Semaphore(provider.concurrency) for name, provider in self.providers.items()}
+
+    async def close(self):
+        await self.session.close()
+        self.session = None
+
+    async def translate_async(self, sentences, provider):
+        await self.open()
+        try:
+            return await self.translate_sentences(sentences, provider)
+        finally:
+            await self.close()
+
+    def translate(self, sentences, provider):
+        if isinstance(provider, str):
+            provider = self.providers[provider]
+        return asyncio.run(self.translate_async(list(sentences), provider))
+
+    async def translate_file(self, provider, path, out_folder, overwrite, files):
+        out_path = self.get_output_path(provider, path, out_folder)
+        row = {"provider": provider.name, "path": path, "out_path": out_path, "sentences": None, "seconds": None, "error": None}
+        if os.path.exists(out_path) and not overwrite:
+            row["error"] = "skipped, already translated"
+            return row
+        async with files:
+            start = time.perf_counter()
+            try:
+                sentences = DataLoader(path=path).get_data()
+                translations = await self.translate_sentences(sentences, provider)
+                os.makedirs(os.path.dirname(out_path), exist_ok=True)
+                temporary_path = f"{out_path}.{os.getpid()}.tmp"
+                DataLoader(data=translations, dataset_name=os.path.basename(out_path), fix_formatting=False).save_as_txt(temporary_path)
+                os.replace(temporary_path, out_path)
+                row["sentences"] = len(sentences)
+            except Exception as e:
+                row["error"] = str(e)
+                print(f"Could not translate {path} with {provider.name}: {e}")
+            row["seconds"] = time.perf_counter() - start
+        return row
+
+    async def translate_files(self, paths, out_folder, overwrite=False):
+        await self.open()
+        try:
+            files = asyncio.Semaphore(self.max_files)
+            rows = await asyncio.gather(*[self.translate_file(provider, path, out_folder, overwrite, files)
+                                          for path in paths for provider in self.providers.values()])
+        finally:
+            await self.close()
+        return pd.DataFrame(rows)
+
+    @staticmethod
+    def get_paths(inputs):
+        paths = []
+        for path in inputs:
+            if os.path.isdir(path):
+                paths.extend(os.path.join(path, filename) for filename in sorted(os.listdir(path)) if filename.split(".")[-1] in ("txt", "csv", "docx"))
+            else:
+                paths.append(path)
+        return paths
+
+    def run(self, paths, out_folder, overwrite=False):
+        paths = self.get_paths(paths)
+        start = time.perf_counter()
+        df = asyncio.run(self.translate_files(paths, out_folder, overwrite))
+        print(f"Translated {len(paths)} files with {len(self.providers)} services in {time.perf_counter() - start:.1f}s, {self.statistics}")
+        return df
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Translates injected files with translation services")
+    parser.add_argument("--providers", nargs="+", default=["stub"], help="services, one of stub, azure, google, gpt")
+    parser.add_argument("--url", nargs="*", default=[], help="url per service, e.g. stub=http://127.0.0.1:8080")
+    parser.add_argument("--rate", nargs="*", default=[], help="requests per second per service, e.g. azure=10")
+    parser.add_argument("--concurrency", nargs="*", default=[], help="requests at the same time per service, e.g. gpt=4")
+    parser.add_argument("--target", default="fr")
+    parser.add_argument("--inputs", nargs="+", default=["output_data/v2/default files"], help="files or folders to translate")
+    parser.add_argument("--out", default="output_data/v3")
+    parser.add_argument("--overwrite", action="store_true")
+    parser.add_argument("--memo", default=None, help="sqlite translation memo, e.g. translation_memo.sqlite")
+    args = parser.parse_args()
+    options = {}
+    for option, values in (("url", args.url), ("requests_per_second", args.rate), ("concurrency", args.concurrency)):
+        for name, value in (value.split("=", 1) for value in values):
+            options.setdefault(name, {})[option] = value if option == "url" else float(value) if option == "requests_per_second" else int(value)
+    memo = TranslationMemo(args.memo) if args.memo is not None else None
+    client = TranslationClient([TranslationProvider.create(name, target=args.target, **options.get(name, {})) for name in args.providers], memo=memo)
+    print(client.run(args.inputs, args.out, overwrite=args.overwrite))
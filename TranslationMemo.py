@@ -0,0 +1,96 @@
+import hashlib
+from CorpusReader import CorpusReader
+from SqliteStore import SqliteStore
+class TranslationMemo(SqliteStore):
+    """
+    Persistent memo of sentence translations keyed by the service, the model or version of the service, the source and target language
+    and the sha256 of the normalized source sentence (see CorpusReader.normalize). Most sentences of an injected file are the same as in
+    the clean file and in the files of the other injection levels, so only the sentences that were never translated by a service have to
+    be sent to it (see TranslationClient(memo=...)) and the rest of a file is assembled from the memo.
+    The memo is a SqliteStore, see there for concurrent access and max_entries.
+    ...
+    Attributes
+    ----------
+    path: str
+        Path of the sqlite database
+    max_entries: int
+        Maximum number of translations that are kept, None for no limit
+    connection: sqlite3.Connection
+        Connection to the database
+    ...
+    Methods
+    -------
+    hash(sentence)
+        Returns the sha256 of a normalized sentence
+    get_keys(provider, sentences)
+        Returns the memo key of every sentence, provider is a TranslationProvider or a (name, model, source, target) tuple
+    lookup(keys, default=None)
+        Returns the translation of every key, default for keys that are not in the memo
+    get_many(provider, sentences)
+        Returns the translation of every sentence, None for sentences that are not in the memo
+    put_many(provider, sentences, translations)
+        Adds the translations of sentences to the memo
+    translate(provider, sentences, translate)
+        Returns the translation of every sentence, only the sentences that are not in the memo are translated with translate
+    evict()
+        Removes the least recently used translations until there are at most max_entries
+    get_number_of_entries()
+        Returns the number of translations in the memo
+    close()
+        Closes the database
+
+    Usage
+    -------
+    >>> memo = TranslationMemo("translation_memo.sqlite")
+    >>> client = TranslationClient([TranslationProvider.create("azure")], memo=memo)
+    >>> client.run(["output_data/v2/default files"], "output_data/v3")
+    """
+    table = "translations"
+    columns = ["provider", "model", "source_language", "target_language", "source"]
+    value = "translation"
+
+    def __init__(self, path="translation_memo.sqlite", max_entries=None):
+        super().__init__(path, max_entries)
+
+    @staticmethod
+    def hash(sentence):
+        return hashlib.sha256(CorpusReader.normalize(sentence).encode("utf-8")).hexdigest()
+
+    def get_rows(self, provider, sentences):
+        name, model, source_language, target_language = provider if isinstance(provider, tuple) else provider.get_key()
+        rows = []
+        for sentence in sentences:
+            source = self.hash(sentence)
+            key = hashlib.sha256("\0".join([name, model, source_language, target_language, source]).encode("utf-8")).hexdigest()
+            rows.append((key, name, model, source_language, target_language, source))
+        return rows
+
+    def get_keys(self, provider, sentences):
+        return [row[0] for row in self.get_rows(provider, sentences)]
+
+    def get_many(self, provider, sentences):
+        return self.lookup(self.get_keys(provider, sentences))
+
+    def put_many(self, provider, sentences, translations):
+        if len(sentences) != len(translations):
+            raise Exception("sentences and translations should have the same length")
+        self.insert(self.get_rows(provider, sentences), translations)
+
+    def translate(self, provider, sentences, translate):
+        """
+        Returns the translation of every sentence. translate(sentences) is called once with the sentences that are missing from the memo,
+        each sentence only once, and has to return one translation per sentence.
+        """
+        keys = self.get_keys(provider, sentences)
+        translations = self.lookup(keys, default=self.missing)
+        missing = {}
+        for i, translation in enumerate(translations):
+            if translation is self.missing and keys[i] not in missing:
+                missing[keys[i]] = i
+        if len(missing) > 0:
+            missing_sentences = [sentences[i] for i in missing.values()]
+            translated = list(translate(missing_sentences))
+            self.put_many(provider, missing_sentences, translated)
+            translated = dict(zip(missing, translated))
+            translations = [translated[keys[i]] if translation is self.missing else translation for i, translation in enumerate(translations)]
+        return translations
@@ -0,0 +1,163 @@
+import os
+import json
+from TokenBucket import TokenBucket
+class TranslationProvider:
+    """
+    Interface of a translation service used by TranslationClient. A provider turns a batch of sentences into the payload of one
+    http request and the response back into one translation per sentence, the client does the batching, rate limiting, retries and saving.
+    New services are added by subclassing and overriding get_request and parse_response (see StubProvider, AzureProvider,
+    GoogleProvider and OpenAIProvider) and registering the subclass in providers.
+    ...
+    Attributes
+    ----------
+    name: str
+        Name of the service, it is also the folder the translations are saved in (e.g. output_data/v2/azure)
+    url: str
+        Url of the service
+    api_key: str
+        Key of the service, read from the environment variable in key_variable if not given
+    model: str
+        Model or version of the service, part of the key of cached translations
+    source: str
+        Language of the sentences
+    target: str
+        Language of the translations, also the prefix of the saved files (e.g. fr.wmt14_en_p_homophone_0.2_p_letter_0.0_p_confusing_word_0.0.txt)
+    max_sentences: int
+        Maximum number of sentences in one request
+    max_characters: int
+        Maximum number of characters in one request
+    concurrency: int
+        Maximum number of requests to the service at the same time
+    bucket: TokenBucket
+        Limits the number of requests per second
+    ...
+    Methods
+    -------
+    get_request(sentences)
+        Returns the method, url, params, headers and json body of the request that translates a batch of sentences
+    parse_response(body, sentences)
+        Returns the translations in the json body of a response, in the order of the sentences
+    get_key()
+        Returns (name, model, source, target), which identifies the translations of this provider
+
+    Usage
+    -------
+    >>> provider = TranslationProvider.create("azure", requests_per_second=5)
+    >>> client = TranslationClient([provider])
+    """
+    name = "provider"
+    key_variable = None
+    default_url = None
+
+    def __init__(self, url=None, api_key=None, model="", source="en", target="fr", max_sentences=50, max_characters=5000, concurrency=8,
+                 requests_per_second=None, burst=None):
+        self.url = url or self.default_url
+        if self.url is None:
+            raise Exception(f"{self.name} needs the url of the service")
+        self.api_key = api_key if api_key is not None or self.key_variable is None else os.environ.get(self.key_variable)
+        self.model = model
+        self.source = source
+        self.target = target
+        self.max_sentences = max_sentences
+        self.max_characters = max_characters
+        self.concurrency = concurrency
+        self.bucket = TokenBucket(requests_per_second, burst)
+
+    @staticmethod
+    def create(name, **kwargs):
+        if name not in providers:
+            raise Exception(f"Unknown provider {name}, please use one of {', '.join(providers)}")
+        return providers[name](**kwargs)
+
+    def get_request(self, sentences):
+        raise NotImplementedError
+
+    def parse_response(self, body, sentences):
+        raise NotImplementedError
+
+    def get_key(self):
+        return self.name, self.model, self.source, self.target
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.url}, {self.source}->{self.target})"
+
+class StubProvider(TranslationProvider):
+    #see TranslationStubServer
+    name = "stub"
+
+    def __init__(self, url=None, model="stub", **kwargs):
+        super().__init__(url=url, model=model, **kwargs)
+
+    def get_request(self, sentences):
+        return {"method": "POST", "url": f"{self.url}/translate", "params": None, "headers": None,
+                "json": {"source": self.source, "target": self.target, "texts": sentences}}
+
+    def parse_response(self, body, sentences):
+        return body["translations"]
+
+class AzureProvider(TranslationProvider):
+    #Azure AI Translator v3, at most 1000 sentences and 50000 characters per request
+    name = "azure"
+    key_variable = "AZURE_TRANSLATOR_KEY"
+    default_url = "https://api.cognitive.microsofttranslator.com"
+
+    def __init__(self, region=None, max_sentences=1000, max_characters=50000, **kwargs):
+        super().__init__(max_sentences=max_sentences, max_characters=max_characters, **kwargs)
+        self.region = region if region is not None else os.environ.get("AZURE_TRANSLATOR_REGION")
+
+    def get_request(self, sentences):
+        headers = {"Ocp-Apim-Subscription-Key": self.api_key}
+        if self.region is not None:
+            headers["Ocp-Apim-Subscription-Region"] = self.region
+        params = {"api-version": "3.0", "from": self.source, "to": self.target}
+        if self.model:
+            params["category"] = self.model
+        return {"method": "POST", "url": f"{self.url}/translate", "params": params, "headers": headers,
+                "json": [{"Text": sentence} for sentence in sentences]}
+
+    def parse_response(self, body, sentences):
+        return [item["translations"][0]["text"] for item in body]
+
+class GoogleProvider(TranslationProvider):
+    #Cloud Translation basic (v2), at most 128 sentences per request
+    name = "google"
+    key_variable = "GOOGLE_API_KEY"
+    default_url = "https://translation.googleapis.com/language/translate/v2"
+
+    def __init__(self, max_sentences=128, max_characters=30000, **kwargs):
+        super().__init__(max_sentences=max_sentences, max_characters=max_characters, **kwargs)
+
+    def get_request(self, sentences):
+        body = {"q": sentences, "source": self.source, "target": self.target, "format": "text"}
+        if self.model:
+            body["model"] = self.model
+        return {"method": "POST", "url": self.url, "params": {"key": self.api_key}, "headers": None, "json": body}
+
+    def parse_response(self, body, sentences):
+        return [item["translatedText"] for item in body["data"]["translations"]]
+
+class OpenAIProvider(TranslationProvider):
+    #chat completions, the sentences are sent and returned as a json list so one request can translate several sentences
+    name = "gpt"
+    key_variable = "OPENAI_API_KEY"
+    default_url = "https://api.openai.com/v1/chat/completions"
+    languages = {"en": "English", "fr": "French", "de": "German", "es": "Spanish"}
+
+    def __init__(self, model="gpt-3.5-turbo", max_sentences=20, max_characters=6000, concurrency=4, **kwargs):
+        super().__init__(model=model, max_sentences=max_sentences, max_characters=max_characters, concurrency=concurrency, **kwargs)
+
+    def get_request(self, sentences):
+        source = self.languages.get(self.source, self.source)
+        target = self.languages.get(self.target, self.target)
+        prompt = (f"Translate every {source} sentence in the following json list to {target}. "
+                  f"Answer with a json list of the {len(sentences)} translations in the same order and nothing else.\n{json.dumps(sentences, ensure_ascii=False)}")
+        return {"method": "POST", "url": self.url, "params": None, "headers": {"Authorization": f"Bearer {self.api_key}"},
+                "json": {"model": self.model, "temperature": 0, "messages": [{"role": "user", "content": prompt}]}}
+
+    def parse_response(self, body, sentences):
+        translations = json.loads(body["choices"][0]["message"]["content"])
+        if not isinstance(translations, list) or not all(isinstance(translation, str) for translation in translations):
+            raise Exception("The model did not answer with a json list of translations")
+        return translations
+
+providers = {"stub": StubProvider, "azure": AzureProvider, "google": GoogleProvider, "gpt": OpenAIProvider}
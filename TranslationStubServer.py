@@ -0,0 +1,140 @@
+import time
+import random
+import asyncio
+import argparse
+import threading
+from aiohttp import web
+class TranslationStubServer:
+    """
+    Local http translation service with the api of StubProvider, so TranslationClient can be tested and load tested offline.
+    It "translates" every sentence with translate (by default it prefixes the target language) and can add latency, fail a part of
+    the requests with 503 and answer 429 when too many requests are sent at the same time, like the real services.
+    ...
+    Attributes
+    ----------
+    host: str
+        Host the server listens on
+    port: int
+        Port the server listens on, 0 picks a free port
+    latency: float
+        Seconds every request takes, plus latency_per_sentence for every sentence in it
+    failure_rate: float
+        Probability that a request fails with 503
+    max_concurrent: int
+        Requests beyond this number of requests at the same time get 429, None for no limit
+    max_sentences: int
+        Requests with more sentences get 413, None for no limit
+    translate: function
+        Function (sentence, source, target) that returns the translation
+    statistics: dict
+        Number of requests, sentences, failed and rejected requests and the highest number of requests at the same time
+    ...
+    Methods
+    -------
+    start()
+        Starts the server in a background thread and returns its url
+    stop()
+        Stops a server started with start
+    serve_forever()
+        Runs the server until it is interrupted
+
+    Usage
+    -------
+    >>> server = TranslationStubServer(latency=0.05, failure_rate=0.1)
+    >>> url = server.start()
+    >>> client = TranslationClient([StubProvider(url=url)])
+    >>> server.stop()
+    python TranslationStubServer.py --port 8080 --latency 0.05 --failure-rate 0.1
+    """
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, latency_per_sentence=0.0, failure_rate=0.0, max_concurrent=None,
+                 max_sentences=None, translate=None, seed=0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.latency_per_sentence = latency_per_sentence
+        self.failure_rate = failure_rate
+        self.max_concurrent = max_concurrent
+        self.max_sentences = max_sentences
+        self.translate = translate or (lambda sentence, source, target: f"[{target}] {sentence}")
+        self.rng = random.Random(seed)
+        self.statistics = {"requests": 0, "sentences": 0, "failed": 0, "rejected": 0, "max_concurrent": 0}
+        self.concurrent = 0
+        self.loop = None
+        self.runner = None
+        self.thread = None
+
+    def get_app(self):
+        app = web.Application(client_max_size=1 << 26)
+        app.router.add_post("/translate", self.handle)
+        return app
+
+    async def handle(self, request):
+        self.statistics["requests"] += 1
+        if self.max_concurrent is not None and self.concurrent >= self.max_concurrent:
+            self.statistics["rejected"] += 1
+            return web.json_response({"error": "too many requests"}, status=429, headers={"Retry-After": "0.05"})
+        self.concurrent += 1
+        self.statistics["max_concurrent"] = max(self.statistics["max_concurrent"], self.concurrent)
+        try:
+            body = await request.json()
+            texts = body["texts"]
+            if self.max_sentences is not None and len(texts) > self.max_sentences:
+                self.statistics["rejected"] += 1
+                return web.json_response({"error": f"at most {self.max_sentences} sentences per request"}, status=413)
+            await asyncio.sleep(self.latency + self.latency_per_sentence * len(texts))
+            if self.rng.random() < self.failure_rate:
+                self.statistics["failed"] += 1
+                return web.json_response({"error": "service unavailable"}, status=503, headers={"Retry-After": "0"})
+            self.statistics["sentences"] += len(texts)
+            return web.json_response({"translations": [self.translate(text, body["source"], body["target"]) for text in texts]})
+        finally:
+            self.concurrent -= 1
+
+    async def open(self):
+        self.runner = web.AppRunner(self.get_app())
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.host, self.port)
+        await site.start()
+        #the port the os picked if port is 0
+        self.port = self.runner.addresses[0][1]
+        return f"http://{self.host}:{self.port}"
+
+    def start(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        return asyncio.run_coroutine_threadsafe(self.open(), self.loop).result()
+
+    def stop(self):
+        if self.loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.runner.cleanup(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.loop = None
+
+    def serve_forever(self):
+        url = self.start()
+        print(f"Serving stub translations on {url}/translate")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+            print(f"Stopped, {self.statistics}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stub translation service for TranslationClient")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per request")
+    parser.add_argument("--latency-per-sentence", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="probability that a request fails with 503")
+    parser.add_argument("--max-concurrent", type=int, default=None)
+    parser.add_argument("--max-sentences", type=int, default=None)
+    args = parser.parse_args()
+    TranslationStubServer(args.host, args.port, args.latency, args.latency_per_sentence, args.failure_rate, args.max_concurrent,
+                          args.max_sentences).serve_forever()
@@ -0,0 +1,161 @@
+import re
+class WordAligner:
+    """
+    Word level Levenshtein alignment with a bit-parallel algorithm (Myers 1999, in the form of Hyyrö 2003). Every column of the distance
+    matrix is computed with a handful of operations on python integers used as bit vectors, one bit per word of the reference, and
+    every word of the reference has the bit mask of its positions. Words that are not in the reference match nothing, so there is no
+    vocabulary shared between references and the memory used only depends on the cached references. The vertical differences of every
+    column are kept, so any cell of the matrix can be read back with two popcounts and the backtrack gives exactly the same substitutions,
+    insertions and deletions as DataLoader.edit_distance(engine="matrix").
+    The tokens and bit masks of reference sentences are cached, since the same references are aligned against many translations.
+    ...
+    Attributes
+    ----------
+    cache_size: int
+        Maximum number of reference sentences whose tokens and bit masks are cached
+    tokenize: function
+        Splits a sentence into words, tokenize below unless another tokenizer is given
+    references: dict
+        The cached (words, masks) of every reference sentence
+    ...
+    Methods
+    -------
+    tokenize(sentence)
+        Removes punctuation, lower-cases and splits a sentence into words
+    get_reference(reference_sentence)
+        Returns the cached words and bit mask of every word of a reference sentence
+    popcount(bits)
+        Returns the number of set bits of an integer
+    align(reference_sentence, sentence)
+        Returns substitutions, insertions, deletions, their dicts and the distance, same as DataLoader.edit_distance
+    distance(reference_sentence, sentence, max_distance=None)
+        Returns only the distance, stopping early once it is certain to be larger than max_distance
+
+    Usage
+    -------
+    >>> aligner = WordAligner()
+    >>> aligner.align("the cat sat on the mat", "the cat sat on a mat")
+    (1, 0, 0, {'the': {'a': 1}}, {}, {}, 1)
+    >>> aligner.distance("the cat sat on the mat", "a dog", max_distance=2)
+    3
+    """
+    def __init__(self, cache_size=100000, tokenizer=None):
+        self.cache_size = cache_size
+        self.references = {}
+        if tokenizer is not None:
+            self.tokenize = tokenizer
+
+    @staticmethod
+    def tokenize(sentence):
+        return re.sub(r'[^\w\s]','',sentence).lower().split()
+
+    def get_reference(self, reference_sentence):
+        reference = self.references.get(reference_sentence)
+        if reference is None:
+            words = self.tokenize(reference_sentence)
+            #bit i of masks[word] is set if word i of the reference is word
+            masks = {}
+            for i, word in enumerate(words):
+                masks[word] = masks.get(word, 0) | (1 << i)
+            reference = (words, masks)
+            if len(self.references) >= self.cache_size:
+                self.references.clear()
+            self.references[reference_sentence] = reference
+        return reference
+
+    @staticmethod
+    def popcount(bits):
+        #int.bit_count needs python 3.10
+        return bin(bits).count("1")
+
+    def columns(self, masks, m, words, max_distance=None):
+        #yields the vertical +1 and -1 bit vectors of every column of the distance matrix, column 0 first
+        full = (1 << m) - 1
+        high = 1 << (m - 1) if m > 0 else 0
+        positive = full
+        negative = 0
+        score = m
+        yield positive, negative
+        for j, word in enumerate(words):
+            equal = masks.get(word, 0)
+            xv = equal | negative
+            xh = (((equal & positive) + positive) ^ positive) | equal
+            horizontal_positive = negative | (~(xh | positive) & full)
+            horizontal_negative = positive & xh
+            if horizontal_positive & high:
+                score += 1
+            elif horizontal_negative & high:
+                score -= 1
+            #the first row of the matrix goes up by one in every column
+            horizontal_positive = ((horizontal_positive << 1) | 1) & full
+            horizontal_negative = (horizontal_negative << 1) & full
+            positive = horizontal_negative | (~(xv | horizontal_positive) & full)
+            negative = horizontal_positive & xv
+            #the distance can go down by at most one per remaining word
+            if max_distance is not None and score - (len(words) - j - 1) > max_distance:
+                yield None
+                return
+            yield positive, negative
+
+    def distance(self, reference_sentence, sentence, max_distance=None):
+        reference_words, masks = self.get_reference(reference_sentence)
+        m = len(reference_words)
+        words = self.tokenize(sentence)
+        if max_distance is not None and abs(m - len(words)) > max_distance:
+            return max_distance + 1
+        if m == 0:
+            return len(words)
+        for column in self.columns(masks, m, words, max_distance):
+            if column is None:
+                return max_distance + 1
+        positive, negative = column
+        return len(words) + self.popcount(positive) - self.popcount(negative)
+
+    def align(self, reference_sentence, sentence):
+        reference_sentence, masks = self.get_reference(reference_sentence)
+        sentence = self.tokenize(sentence)
+        columns = list(self.columns(masks, len(reference_sentence), sentence))
+        def matrix(i, j):
+            #cell i, j of the distance matrix from the vertical differences of column j
+            positive, negative = columns[j]
+            below = (1 << i) - 1
+            return j + self.popcount(positive & below) - self.popcount(negative & below)
+        substitutions = 0
+        insertions = 0
+        deletions = 0
+        substitution_dict = {}
+        insertion_dict = {}
+        deletion_dict = {}
+        #backtrack to find edits, in the same order as DataLoader.edit_distance so the dicts are the same
+        i = len(reference_sentence)
+        j = len(sentence)
+        while i > 0 and j > 0:
+            if sentence[j-1] == reference_sentence[i-1]:
+                i -= 1
+                j -= 1
+            else:
+                current = matrix(i, j)
+                if current == matrix(i-1, j-1)+1:
+                    substitutions += 1
+                    options = substitution_dict.setdefault(reference_sentence[i-1], {})
+                    options[sentence[j-1]] = options.get(sentence[j-1], 0) + 1
+                    i -= 1
+                    j -= 1
+                elif current == matrix(i-1, j)+1:
+                    deletions += 1
+                    deletion_dict[reference_sentence[i-1]] = deletion_dict.get(reference_sentence[i-1], 0) + 1
+                    i -= 1
+                else:
+                    insertions += 1
+                    insertion_dict[sentence[j-1]] = insertion_dict.get(sentence[j-1], 0) + 1
+                    j -= 1
+        while i > 0:
+            deletions += 1
+            deletion_dict[reference_sentence[i-1]] = deletion_dict.get(reference_sentence[i-1], 0) + 1
+            i -= 1
+        while j > 0:
+            insertions += 1
+            insertion_dict[sentence[j-1]] = insertion_dict.get(sentence[j-1], 0) + 1
+            j -= 1
+        distance = substitutions+insertions+deletions
+        return substitutions, insertions, deletions, substitution_dict, insertion_dict, deletion_dict, distance